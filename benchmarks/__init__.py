@@ -0,0 +1,7 @@
+""" benchmarks
+
+Run individual benchmarks from the repository root, e.g. ``python -m benchmarks.bench_task_queue``. The end to end
+load test, ``python -m benchmarks.load_test``, writes JSON results to compare across commits with ``--output`` and
+``--baseline``.
+
+"""
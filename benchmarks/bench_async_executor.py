@@ -0,0 +1,111 @@
+"""
+Asynchronous Executor Benchmark
+===============================
+
+Compares the throughput of I/O bound pipelines, a switch fanning out to four sinks that each wait 5 ms, between
+process based Executors and a single AsyncExecutor. The sinks wait either by blocking, as synchronous nodes do, or by
+awaiting, as asynchronous nodes do.
+
+"""
+
+import time
+import asyncio
+import multiprocessing
+
+from mycellium.pipelining import AsyncExecutor, Executor
+from mycellium.pipelining import nodes
+from mycellium.pipelining.message import Message, Payload
+from mycellium.pipelining.task import Task
+from mycellium.storage import create_pipeline
+
+_WAIT = 0.005
+
+
+class _BlockingSinkNode(nodes.Node):
+    def __init__(self, output_ports: list[str], config: dict) -> None:
+        super().__init__(output_ports)
+
+    def process(self, message: Message) -> tuple[set[str], Payload]:
+        time.sleep(_WAIT)
+        return self.children, message.payload
+
+
+class _AsyncSinkNode(nodes.AsyncNode):
+    def __init__(self, output_ports: list[str], config: dict) -> None:
+        super().__init__(output_ports)
+
+    async def process_async(self, message: Message) -> tuple[set[str], Payload]:
+        await asyncio.sleep(_WAIT)
+        return self.children, message.payload
+
+
+def _fan_out_structure(sink_type: str, width: int) -> dict:
+    structure = {
+        "starting_nodes": ["switch0"],
+        "nodes": {
+            "switch0": {
+                "output_ports": ["out"],
+                "type": "switch",
+                "config": {"conditions": {"out": {"comparison": "eq", "value": "1"}}}
+            }
+        },
+        "connections": []
+    }
+    for position in range(width):
+        structure["nodes"][f"sink{position}"] = {"output_ports": [], "type": sink_type, "config": {}}
+        structure["connections"].append({"parent": "switch0", "child": f"sink{position}", "port": "out"})
+    return structure
+
+
+def _throughput(consumers: list[multiprocessing.Process], task_queue: multiprocessing.JoinableQueue,
+                stop_event: multiprocessing.Event, pipeline_id: int, num_tasks: int) -> float:
+    for consumer in consumers:
+        consumer.start()
+    # Warm the pipeline caches before timing.
+    for _ in consumers:
+        task_queue.put(Task(pipeline_id=pipeline_id, pipeline_version=0, topic="bench", payload=b"1",
+                            timestamp=time.time()))
+    task_queue.join()
+
+    start_time = time.perf_counter()
+    for _ in range(num_tasks):
+        task_queue.put(Task(pipeline_id=pipeline_id, pipeline_version=0, topic="bench", payload=b"1",
+                            timestamp=time.time()))
+    task_queue.join()
+    elapsed = time.perf_counter() - start_time
+    stop_event.set()
+    for consumer in consumers:
+        consumer.join()
+    return num_tasks / elapsed
+
+
+def main() -> None:
+    nodes._types["blocking_sink"] = _BlockingSinkNode
+    nodes._types["async_sink"] = _AsyncSinkNode
+    blocking_pipeline = create_pipeline(_fan_out_structure("blocking_sink", width=4))
+    async_pipeline = create_pipeline(_fan_out_structure("async_sink", width=4))
+
+    def executors(count: int):
+        return lambda stop_event, task_queue: [Executor(stop_event, task_queue) for _ in range(count)]
+
+    def async_executor(**options):
+        return lambda stop_event, task_queue: [AsyncExecutor(stop_event, task_queue, **options)]
+
+    cases = [
+        ("3 Executors", "blocking", blocking_pipeline.id, executors(3), 300),
+        ("AsyncExecutor", "blocking", blocking_pipeline.id, async_executor(node_threads=64), 3_000),
+        ("AsyncExecutor", "async", async_pipeline.id, async_executor(), 10_000),
+        ("AsyncExecutor, 10/pipeline", "async", async_pipeline.id, async_executor(max_concurrency_per_pipeline=10),
+         3_000)
+    ]
+    print(f"{'runtime':<28}{'sinks':<10}{'processes':>10}{'msg/s':>10}")
+    for name, sink_type, pipeline_id, build, num_tasks in cases:
+        task_queue = multiprocessing.JoinableQueue()
+        stop_event = multiprocessing.Event()
+        consumers = build(stop_event, task_queue)
+        throughput = _throughput(consumers, task_queue, stop_event, pipeline_id, num_tasks)
+        print(f"{name:<28}{sink_type:<10}{len(consumers):>10}{throughput:>10,.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+"""
+Deduplication Benchmark
+=======================
+
+Measures the cost per message of the LRU and Bloom duplicate filters, the memory they report against what they
+allocate, and the false positive rate of the Bloom filter. Then replays a duplicate storm, every message delivered
+three times, through a fake broker into an ``MQTTIngestor`` and an ``Executor`` with and without a filter, and
+reports how many pipeline executions each run took. The fake broker delivers at QoS 0 and never sets the DUP flag,
+so the filters of this run check every QoS and key messages by their id field.
+
+"""
+
+import json
+import time
+import tracemalloc
+import multiprocessing
+
+from mycellium import storage
+from mycellium.ingestion import MQTTIngestor, DuplicateFilter, LRUDuplicateFilter, BloomDuplicateFilter
+from mycellium.metrics import MetricsStore, configure_metrics
+from mycellium.pipelining import Executor
+
+from .fake_broker import FakeBroker
+from .pipelines import register_nodes
+
+_TOPIC = "bench/dedup"
+_NUM_KEYS = 100_000
+_NUM_MESSAGES = 10_000
+_REDELIVERIES = 3
+
+
+def _payloads(num_messages: int) -> list[bytes]:
+    return [json.dumps({"id": sequence, "value": sequence % 100}).encode() for sequence in range(num_messages)]
+
+
+def _nanoseconds_per_message(duplicate_filter: DuplicateFilter, payloads: list[bytes], dup: bool) -> float:
+    start_time = time.perf_counter()
+    for payload in payloads:
+        duplicate_filter.is_duplicate(_TOPIC, payload, dup=dup)
+    return (time.perf_counter() - start_time) / len(payloads) * 1e9
+
+
+def _allocated_bytes(filter_class, payloads: list[bytes]) -> tuple[int, int]:
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    duplicate_filter = filter_class(capacity=_NUM_KEYS)
+    for payload in payloads:
+        duplicate_filter.is_duplicate(_TOPIC, payload, now=0.0)
+    allocated = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return duplicate_filter.memory_bytes, allocated
+
+
+def _storm(broker: FakeBroker, duplicate_filter: None | DuplicateFilter) -> tuple[int, float]:
+    pipeline = storage.create_pipeline({"starting_nodes": ["n0"], "connections": [],
+                                        "nodes": {"n0": {"output_ports": ["out"], "type": "forward", "config": {}}}})
+    name = "none" if duplicate_filter is None else type(duplicate_filter).__name__
+    workspace = storage.create_workspace(name=f"dedup-{name}")
+    client = storage.create_client(workspace_id=workspace.id, broker_host=broker.host, broker_port=broker.port)
+    storage.create_subscription(client_id=client.id, topic=_TOPIC, qos=0, pipeline_id=pipeline.id)
+
+    store = MetricsStore(max_processes=2, publish_interval=0.05)
+    configure_metrics(store)
+    stop_event = multiprocessing.Event()
+    task_queue = multiprocessing.JoinableQueue()
+    ingestor = MQTTIngestor(stop_event, task_queue, clients=[client], duplicate_filter=duplicate_filter)
+    executor = Executor(stop_event, task_queue)
+    ingestor.start()
+    executor.start()
+    broker.wait_for_subscriber(_TOPIC)
+    time.sleep(0.5)
+
+    # Each message is redelivered straight after itself, as a reconnecting broker would resend unacknowledged ones.
+    payloads = [payload for payload in _payloads(_NUM_MESSAGES) for _ in range(_REDELIVERIES)]
+    start_time = time.perf_counter()
+    broker.inject(_TOPIC, payloads)
+    while True:
+        time.sleep(0.05)
+        summary = store.summary()
+        received = summary.get(f"mycellium_received_messages_total{{client=\"{client.id}\"}}", 0)
+        enqueued = summary.get(f"mycellium_enqueued_tasks_total{{client=\"{client.id}\"}}", 0)
+        executed = summary.get(f"mycellium_pipeline_seconds{{pipeline=\"{pipeline.id}\"}}", {"count": 0})["count"]
+        if received >= len(payloads) and executed >= enqueued:
+            break
+    elapsed = time.perf_counter() - start_time
+
+    stop_event.set()
+    ingestor.join()
+    executor.join()
+    configure_metrics(None)
+    store.close()
+    store.unlink()
+    return executed, elapsed
+
+
+def main() -> None:
+    payloads = _payloads(_NUM_KEYS)
+    cases = [("lru", LRUDuplicateFilter(capacity=_NUM_KEYS)),
+             ("lru, id field", LRUDuplicateFilter(field="payload.id", capacity=_NUM_KEYS)),
+             ("bloom", BloomDuplicateFilter(capacity=_NUM_KEYS)),
+             ("bloom, id field", BloomDuplicateFilter(field="payload.id", capacity=_NUM_KEYS))]
+    print(f"{'filter':<18}{'new ns':>9}{'dup ns':>9}")
+    for name, duplicate_filter in cases:
+        new = _nanoseconds_per_message(duplicate_filter, payloads, dup=False)
+        duplicate = _nanoseconds_per_message(duplicate_filter, payloads, dup=True)
+        print(f"{name:<18}{new:>9,.0f}{duplicate:>9,.0f}")
+
+    for filter_class in (LRUDuplicateFilter, BloomDuplicateFilter):
+        reported, allocated = _allocated_bytes(filter_class, payloads)
+        print(f"{filter_class.__name__} with {_NUM_KEYS:,} keys: reports {reported / 2 ** 20:.1f} MiB, "
+              f"allocated {allocated / 2 ** 20:.1f} MiB")
+
+    bloom = BloomDuplicateFilter(capacity=_NUM_KEYS, error_rate=0.001)
+    for payload in payloads:
+        bloom.is_duplicate(_TOPIC, payload, now=0.0)
+    false_positives = sum(bloom.is_duplicate("bench/other", payload, dup=True, now=0.0) for payload in payloads)
+    print(f"bloom false positive rate at capacity: {false_positives / len(payloads):.4%} (configured 0.1000%)")
+
+    register_nodes()
+    broker = FakeBroker().start()
+    print(f"{_NUM_MESSAGES:,} messages delivered {_REDELIVERIES} times each:")
+    for name, duplicate_filter in [("none", None), ("lru", LRUDuplicateFilter(field="payload.id", min_qos=0)),
+                                   ("bloom", BloomDuplicateFilter(field="payload.id", min_qos=0))]:
+        executed, elapsed = _storm(broker, duplicate_filter)
+        print(f"  filter {name:<6} {executed:>7,} pipeline executions in {elapsed:.2f} s")
+    broker.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+"""
+Executor Batching Benchmark
+===========================
+
+Runs an Executor process with several batch sizes over a pipeline that parses numeric payloads and routes them
+through a 32 port range switch. Throughput is measured by draining a prefilled queue, latency (from task creation to
+the end of the pipeline) by feeding tasks at a steady rate.
+
+"""
+
+import time
+import queue
+import threading
+import multiprocessing
+
+from mycellium.pipelining import Executor
+from mycellium.pipelining import nodes
+from mycellium.pipelining.message import Message, Payload
+from mycellium.pipelining.task import Task
+from mycellium.storage import create_pipeline
+
+# Inherited by the Executor processes, which report the latency of every executed message through it.
+_latencies = multiprocessing.Queue()
+
+
+class _ParseNode(nodes.Node):
+    def __init__(self, output_ports: list[str], config: dict) -> None:
+        super().__init__(output_ports)
+
+    def process(self, message: Message) -> tuple[set[str], Payload]:
+        return self.children, int(message.payload)
+
+
+class _ReportingNode(nodes.Node):
+    def __init__(self, output_ports: list[str], config: dict) -> None:
+        super().__init__(output_ports)
+        self.__report = config["report"]
+
+    def process(self, message: Message) -> tuple[set[str], Payload]:
+        if self.__report:
+            _latencies.put(time.time() - message.timestamp)
+        return self.children, message.payload
+
+
+def _structure(num_ports: int, report: bool) -> dict:
+    conditions = {f"p{port}": {"comparison": "ge", "value": port * 100 // num_ports} for port in range(num_ports)}
+    conditions["all"] = {"comparison": "ge", "value": -1}
+    structure = {
+        "starting_nodes": ["parse"],
+        "nodes": {
+            "parse": {"output_ports": ["out"], "type": "parse", "config": {}},
+            "switch": {"output_ports": list(conditions), "type": "switch", "config": {"conditions": conditions}},
+            "report": {"output_ports": [], "type": "reporting", "config": {"report": report}}
+        },
+        "connections": [
+            {"parent": "parse", "child": "switch", "port": "out"},
+            {"parent": "switch", "child": "report", "port": "all"}
+        ]
+    }
+    for port in range(0, num_ports, 4):
+        structure["nodes"][f"sink{port}"] = {"output_ports": [], "type": "reporting", "config": {"report": False}}
+        structure["connections"].append({"parent": "switch", "child": f"sink{port}", "port": f"p{port}"})
+    return structure
+
+
+def _task(pipeline_id: int, sequence: int) -> Task:
+    return Task(pipeline_id=pipeline_id, pipeline_version=0, topic="bench", payload=str(sequence % 100).encode(),
+                timestamp=time.time())
+
+
+def _throughput(pipeline_id: int, batch_size: int, num_tasks: int) -> float:
+    # The queue is filled before the Executor starts, so that it does not compete with the producer for the CPU.
+    task_queue = multiprocessing.JoinableQueue()
+    stop_event = multiprocessing.Event()
+    for sequence in range(num_tasks):
+        task_queue.put(_task(pipeline_id, sequence))
+    time.sleep(0.5)
+
+    start_time = time.perf_counter()
+    executor = Executor(stop_event, task_queue, batch_size=batch_size, batch_timeout_ms=1.0)
+    executor.start()
+    task_queue.join()
+    elapsed = time.perf_counter() - start_time
+    stop_event.set()
+    executor.join()
+    return num_tasks / elapsed
+
+
+def _latency(pipeline_id: int, batch_size: int, rate: float, duration: float) -> tuple[float, float]:
+    task_queue = multiprocessing.JoinableQueue()
+    stop_event = multiprocessing.Event()
+    executor = Executor(stop_event, task_queue, batch_size=batch_size, batch_timeout_ms=1.0)
+    executor.start()
+
+    latencies = []
+    collecting = threading.Event()
+    collector = threading.Thread(target=_collect, args=(latencies, collecting), daemon=True)
+    collector.start()
+
+    sent = 0
+    start_time = time.monotonic()
+    while time.monotonic() < start_time + duration:
+        task_queue.put(_task(pipeline_id, sent))
+        sent += 1
+        time.sleep(max(start_time + sent / rate - time.monotonic(), 0))
+    task_queue.join()
+    stop_event.set()
+    executor.join()
+    collecting.set()
+    collector.join()
+
+    latencies.sort()
+    return latencies[len(latencies) // 2], latencies[min(int(len(latencies) * 0.99), len(latencies) - 1)]
+
+
+def _collect(latencies: list[float], stop: threading.Event) -> None:
+    while True:
+        try:
+            latencies.append(_latencies.get(timeout=0.2))
+        except queue.Empty:
+            if stop.is_set():
+                return
+
+
+def main() -> None:
+    nodes._types["parse"] = _ParseNode
+    nodes._types["reporting"] = _ReportingNode
+    throughput_pipeline = create_pipeline(_structure(num_ports=32, report=False))
+    latency_pipeline = create_pipeline(_structure(num_ports=32, report=True))
+
+    print(f"{'batch size':<12}{'msg/s':>10}{'p50 ms':>10}{'p99 ms':>10}")
+    for batch_size in (1, 8, 32, 128):
+        throughput = _throughput(throughput_pipeline.id, batch_size, num_tasks=30_000)
+        p50, p99 = _latency(latency_pipeline.id, batch_size, rate=2_000, duration=3.0)
+        print(f"{batch_size:<12}{throughput:>10,.0f}{p50 * 1_000:>10.2f}{p99 * 1_000:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
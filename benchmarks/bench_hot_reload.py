@@ -0,0 +1,130 @@
+"""
+Hot Reload Benchmark
+====================
+
+Streams tasks through an Executor while a pipeline is updated every second through a cached SQLite repository, and
+reports whether every message was executed, which version executed it, and the end-to-end latency right after each
+reload compared to the rest of the run.
+
+"""
+
+import os
+import time
+import queue
+import tempfile
+import threading
+import multiprocessing
+
+from mycellium.pipelining import Executor
+from mycellium.pipelining import nodes
+from mycellium.pipelining.message import Message, Payload
+from mycellium.pipelining.task import Task
+from mycellium.storage import CachedRepository, SQLiteRepository, configure_storage, fetch_pipeline, update_pipeline
+
+from .pipelines import layered_structure
+
+# Inherited by the Executor process, which reports every executed message through it.
+_executions = multiprocessing.Queue()
+
+
+class _PassNode(nodes.Node):
+    def __init__(self, output_ports: list[str], config: dict) -> None:
+        super().__init__(output_ports)
+
+    def process(self, message: Message) -> tuple[set[str], Payload]:
+        return self.children, message.payload
+
+
+class _ReportingNode(nodes.Node):
+    def __init__(self, output_ports: list[str], config: dict) -> None:
+        super().__init__(output_ports)
+        self.__version = config["version"]
+
+    def process(self, message: Message) -> tuple[set[str], Payload]:
+        _executions.put((self.__version, message.timestamp, time.time()))
+        return self.children, message.payload
+
+
+def _structure(version: int) -> dict:
+    # A pipeline with some compilation cost, reporting which version executed the message.
+    structure = layered_structure(width=10, depth=10)
+    for node in structure["nodes"].values():
+        node["type"], node["config"] = "pass", {}
+    structure["nodes"]["report"] = {"output_ports": [], "type": "reporting", "config": {"version": version}}
+    structure["connections"].append({"parent": "root", "child": "report", "port": "out"})
+    return structure
+
+
+def _percentile(samples: list[float], percentile: float) -> float:
+    if not samples:
+        return float("nan")
+    return sorted(samples)[min(int(len(samples) * percentile), len(samples) - 1)]
+
+
+def _collect(executions: list, stop_event: multiprocessing.Event) -> None:
+    while True:
+        try:
+            executions.append(_executions.get(timeout=0.5))
+        except queue.Empty:
+            if stop_event.is_set():
+                return
+
+
+def main() -> None:
+    rate, duration, reload_interval, reload_window = 1_000, 6.0, 1.0, 0.1
+    nodes._types["pass"] = _PassNode
+    nodes._types["reporting"] = _ReportingNode
+
+    with tempfile.TemporaryDirectory() as directory:
+        configure_storage(CachedRepository(SQLiteRepository(os.path.join(directory, "mycellium.sqlite"))))
+        pipeline_id = fetch_pipeline(0).id
+        update_pipeline(pipeline_id, _structure(version=1))
+
+        task_queue = multiprocessing.JoinableQueue()
+        stop_event = multiprocessing.Event()
+        executor = Executor(stop_event, task_queue)
+        executor.start()
+
+        # Drain the reports while running, so that the Executor never waits on a full pipe.
+        executions = []
+        collector = threading.Thread(target=_collect, args=(executions, stop_event), daemon=True)
+        collector.start()
+
+        sent, reloads = 0, []
+        start_time = time.monotonic()
+        next_reload = start_time + reload_interval
+        while (now := time.monotonic()) < start_time + duration:
+            if now >= next_reload:
+                record = update_pipeline(pipeline_id, _structure(version=fetch_pipeline(pipeline_id).version + 1))
+                reloads.append((time.time(), record.version))
+                next_reload += reload_interval
+            # Tasks are stamped with the version current at ingestion, like the ingestion processes do.
+            record = fetch_pipeline(pipeline_id)
+            task_queue.put(Task(pipeline_id=record.id, pipeline_version=record.version, topic="bench",
+                                payload=b"1", timestamp=time.time()))
+            sent += 1
+            time.sleep(max(start_time + sent / rate - time.monotonic(), 0))
+
+        task_queue.join()
+        stop_event.set()
+        collector.join()
+        executor.join()
+
+    latencies = [finished - ingested for _, ingested, finished in executions]
+    after_reload = [finished - ingested for _, ingested, finished in executions
+                    if any(0 <= ingested - reloaded < reload_window for reloaded, _ in reloads)]
+    versions = {}
+    for version, _, _ in executions:
+        versions[version] = versions.get(version, 0) + 1
+
+    print(f"sent {sent:,}, executed {len(executions):,}, reloads {len(reloads)}")
+    print(f"messages per version: {dict(sorted(versions.items()))}")
+    print(f"{'window':<22}{'messages':>10}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for name, samples in (("all", latencies), (f"{reload_window * 1_000:.0f} ms after reload", after_reload)):
+        print(f"{name:<22}{len(samples):>10,}{_percentile(samples, 0.5) * 1_000:>10.2f}"
+              f"{_percentile(samples, 0.99) * 1_000:>10.2f}{max(samples, default=float('nan')) * 1_000:>10.2f}")
+    print(f"pipeline cache: {executor.pipeline_cache.stats}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""
+Ingestion Benchmark
+===================
+
+Measures how many tasks per second an ``MQTTIngestor`` process enqueues while an in-process fake broker injects
+messages on a subscribed topic at configurable rates.
+
+"""
+
+import os
+import sys
+import time
+import queue
+import resource
+import multiprocessing
+
+from mycellium.ingestion import MQTTIngestor
+from mycellium.storage import ClientRecord
+
+from .fake_broker import FakeBroker
+
+_TOPIC = "topic/hello"
+
+
+def _children_cpu_seconds() -> float:
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def measure(broker: FakeBroker, rate: None | float, num_messages: int) -> tuple[float, float, int, float]:
+    # Returns the achieved injection rate, the ingestion rate, how many messages were enqueued and the CPU time the
+    # ingestor process used, including one idle second before the messages are injected.
+    cpu_seconds = _children_cpu_seconds()
+    stop_event = multiprocessing.Event()
+    task_queue = multiprocessing.JoinableQueue()
+    client = ClientRecord(id=0, workspace_id=0, broker_host=broker.host, broker_port=broker.port)
+    ingestor = MQTTIngestor(stop_event, task_queue, clients=[client])
+    ingestor.start()
+    broker.wait_for_subscriber(_TOPIC)
+    time.sleep(1)
+
+    injected_rate = broker.inject(_TOPIC, [b"21.5"] * num_messages, rate=rate)
+    received = 0
+    start_time = None
+    end_time = time.perf_counter()
+    while received < num_messages:
+        try:
+            task = task_queue.get(timeout=2)
+        except queue.Empty:
+            break
+        if start_time is None:
+            start_time = task.timestamp
+        end_time = task.timestamp
+        received += 1
+        task_queue.task_done()
+
+    stop_event.set()
+    ingestor.join()
+    ingested_rate = received / max(end_time - start_time, 1e-9) if start_time is not None else 0.0
+    return injected_rate, ingested_rate, received, _children_cpu_seconds() - cpu_seconds
+
+
+def main() -> None:
+    broker = FakeBroker().start()
+    rates = [1_000.0, 10_000.0, None]
+    print(f"{'target msg/s':>14}{'injected msg/s':>16}{'ingested msg/s':>16}{'received':>12}{'cpu s':>8}")
+    for rate in rates:
+        num_messages = 5_000 if rate is None or rate > 1_000 else 2_000
+        # The ingestor prints every message it ingests, keep that out of the results.
+        sys.stdout.flush()
+        stdout = os.dup(1)
+        with open(os.devnull, "w") as devnull:
+            os.dup2(devnull.fileno(), 1)
+            try:
+                injected_rate, ingested_rate, received, cpu_seconds = measure(broker, rate, num_messages)
+            finally:
+                os.dup2(stdout, 1)
+        target = "unlimited" if rate is None else f"{rate:,.0f}"
+        print(f"{target:>14}{injected_rate:>16,.0f}{ingested_rate:>16,.0f}{f'{received}/{num_messages}':>12}{cpu_seconds:>8.2f}")
+    broker.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""
+Ingestion Supervisor Benchmark
+==============================
+
+Connects many MQTT clients through an ``IngestionSupervisor`` with a small number of processes, then reports the
+process count, their combined resident memory, the ingest rate when every client receives a stream of messages, and
+whether a killed ingestion process is restarted.
+
+"""
+
+import os
+import time
+import queue
+import signal
+import multiprocessing
+
+from mycellium import storage
+from mycellium.ingestion import IngestionSupervisor
+
+from .fake_broker import FakeBroker
+
+_TOPIC = "bench/in"
+
+
+def _rss_kib(pid: int) -> int:
+    with open(f"/proc/{pid}/status") as status:
+        for line in status:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return 0
+
+
+def _register_clients(broker: FakeBroker, num_clients: int) -> int:
+    workspace = storage.create_workspace(name=f"bench-{num_clients}")
+    for _ in range(num_clients):
+        client = storage.create_client(workspace_id=workspace.id, broker_host=broker.host, broker_port=broker.port)
+        storage.create_subscription(client_id=client.id, topic=_TOPIC, qos=0, pipeline_id=0)
+    return workspace.id
+
+
+def measure(broker: FakeBroker, num_clients: int, num_processes: int) -> dict:
+    workspace_id = _register_clients(broker, num_clients)
+    stop_event = multiprocessing.Event()
+    task_queue = multiprocessing.JoinableQueue()
+    supervisor = IngestionSupervisor(stop_event, task_queue, workspace_id=workspace_id, num_processes=num_processes,
+                                     check_interval=0.2)
+    supervisor.start()
+
+    deadline = time.monotonic() + 30
+    while broker.subscribers(_TOPIC) < num_clients and time.monotonic() < deadline:
+        time.sleep(0.05)
+    connected = broker.subscribers(_TOPIC)
+    rss_kib = sum(_rss_kib(ingestor.pid) for ingestor in supervisor.ingestors)
+
+    num_messages = 20
+    expected = num_messages * connected
+    broker.inject(_TOPIC, [b"21.5"] * num_messages)
+    received = 0
+    start_time = time.perf_counter()
+    while received < expected:
+        try:
+            task_queue.get(timeout=2)
+        except queue.Empty:
+            break
+        received += 1
+        task_queue.task_done()
+    ingest_rate = received / (time.perf_counter() - start_time)
+
+    # Kill one ingestion process and wait for the supervisor to replace it and for its clients to come back
+    os.kill(supervisor.ingestors[0].pid, signal.SIGKILL)
+    deadline = time.monotonic() + 30
+    while (supervisor.restarts == 0 or broker.subscribers(_TOPIC) < connected) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    recovered = broker.subscribers(_TOPIC) >= connected
+
+    stop_event.set()
+    supervisor.join()
+    return {
+        "clients": num_clients,
+        "processes": len(supervisor.ingestors),
+        "connected": connected,
+        "rss_mib": rss_kib / 1024,
+        "ingest_rate": ingest_rate,
+        "received": f"{received}/{expected}",
+        "restarted": supervisor.restarts > 0 and recovered
+    }
+
+
+def main() -> None:
+    broker = FakeBroker().start()
+    print(f"{'clients':>8}{'processes':>11}{'connected':>11}{'rss MiB':>10}{'tasks/s':>10}{'received':>14}"
+          f"{'restarted':>11}")
+    for num_clients, num_processes in [(10, 2), (100, 2), (500, 2)]:
+        result = measure(broker, num_clients, num_processes)
+        print(f"{result['clients']:>8}{result['processes']:>11}{result['connected']:>11}{result['rss_mib']:>10.1f}"
+              f"{result['ingest_rate']:>10,.0f}{result['received']:>14}{str(result['restarted']):>11}")
+    broker.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""
+Lazy Decoding Benchmark
+=======================
+
+Compares messages that decode their payload when built and are rebuilt around the payload by every node, as before,
+with messages that keep the ingested bytes, decode them on first access and are passed on unchanged by nodes that
+only forward them. Reports the memory per message and the throughput of a four node pipeline that only forwards
+JSON payloads, and of one that routes them through a switch on a field, which has to decode them.
+
+"""
+
+import json
+import time
+import tracemalloc
+from dataclasses import dataclass
+
+from mycellium.pipelining import Pipeline
+from mycellium.pipelining import nodes
+from mycellium.pipelining.message import Message, Payload
+
+
+@dataclass(frozen=True)
+class _EagerMessage:
+    # The message model before payloads were decoded lazily.
+    timestamp: float
+    payload: Payload
+
+
+class _ForwardingNode(nodes.Node):
+    def __init__(self, output_ports: list[str], config: dict) -> None:
+        super().__init__(output_ports)
+
+    def process(self, message: Message) -> tuple[set[str], Message]:
+        return self.children, message
+
+
+class _EagerForwardingNode(nodes.Node):
+    # Passes the payload on, which rebuilds a message around it for the next node.
+    def __init__(self, output_ports: list[str], config: dict) -> None:
+        super().__init__(output_ports)
+
+    def process(self, message: Message) -> tuple[set[str], Payload]:
+        return self.children, message.payload
+
+
+def _structure(node_type: str, switch: bool) -> dict:
+    labels = ["n0", "n1", "n2", "n3"]
+    structure = {
+        "starting_nodes": ["n0"],
+        "nodes": {label: {"output_ports": ["out"], "type": node_type, "config": {}} for label in labels},
+        "connections": [{"parent": parent, "child": child, "port": "out"} for parent, child in zip(labels, labels[1:])]
+    }
+    if switch:
+        structure["nodes"]["n1"] = {"output_ports": ["out"], "type": "switch", "config": {"conditions": {
+            "out": {"comparison": "ge", "value": 0, "field": "payload.reading.value"}}}}
+    return structure
+
+
+def _payload(size: int) -> bytes:
+    return json.dumps({"reading": {"value": 21.5, "unit": "C"}, "padding": "x" * size}).encode()
+
+
+def _bytes_per_message(make_message, raw: bytes) -> float:
+    tracemalloc.start()
+    messages = [make_message(raw) for _ in range(100_000)]
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return size / len(messages)
+
+
+def _messages_per_second(pipeline: Pipeline, make_message, raw: bytes, num_messages: int) -> float:
+    start_time = time.perf_counter()
+    for _ in range(num_messages):
+        pipeline.execute(make_message(raw))
+    return num_messages / (time.perf_counter() - start_time)
+
+
+def main() -> None:
+    nodes._types["forward"] = _ForwardingNode
+    nodes._types["eager"] = _EagerForwardingNode
+
+    def eager_message(raw: bytes) -> Message:
+        # Decoded up front into text, as executors did before.
+        return Message(timestamp=time.time(), payload=json.loads(str(raw, "utf-8")))
+
+    def lazy_message(raw: bytes) -> Message:
+        return Message(timestamp=time.time(), topic="sensors/1", raw=raw, encoding="json")
+
+    raw = _payload(16)
+    eager_size = _bytes_per_message(lambda payload: _EagerMessage(timestamp=time.time(), payload=payload), raw)
+    lazy_size = _bytes_per_message(lazy_message, raw)
+    print(f"memory per message: frozen dataclass {eager_size:.0f} B, slots {lazy_size:.0f} B")
+
+    print(f"{'pipeline':<12}{'payload':>9}{'eager msg/s':>14}{'lazy msg/s':>13}{'speedup':>10}")
+    for switch in (False, True):
+        eager_pipeline = Pipeline.from_dict(_structure("eager", switch))
+        lazy_pipeline = Pipeline.from_dict(_structure("forward", switch))
+        for size in (16, 4_096):
+            raw = _payload(size)
+            eager = _messages_per_second(eager_pipeline, eager_message, raw, 50_000)
+            lazy = _messages_per_second(lazy_pipeline, lazy_message, raw, 50_000)
+            name = "switch" if switch else "forwarding"
+            print(f"{name:<12}{len(raw):>9,}{eager:>14,.0f}{lazy:>13,.0f}{lazy / eager:>9.1f}x")
+
+
+if __name__ == '__main__':
+    main()
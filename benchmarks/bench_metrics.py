@@ -0,0 +1,89 @@
+"""
+Metrics Benchmark
+=================
+
+Measures the cost of recording a sample, of timing every node of a four node pipeline, and of publishing a
+snapshot of a process's metrics into shared memory and rendering them for a scrape.
+
+"""
+
+import time
+
+from mycellium.metrics import MetricsStore, Histogram, Counter
+from mycellium.pipelining import Pipeline
+from mycellium.pipelining import nodes
+from mycellium.pipelining.message import Message
+
+
+class _ForwardingNode(nodes.Node):
+    def __init__(self, output_ports: list[str], config: dict) -> None:
+        super().__init__(output_ports)
+
+    def process(self, message: Message) -> tuple[set[str], Message]:
+        return self.children, message
+
+
+def _structure() -> dict:
+    labels = ["n0", "n1", "n2", "n3"]
+    return {
+        "starting_nodes": ["n0"],
+        "nodes": {label: {"output_ports": ["out"], "type": "forward", "config": {}} for label in labels},
+        "connections": [{"parent": parent, "child": child, "port": "out"} for parent, child in zip(labels, labels[1:])]
+    }
+
+
+def _nanoseconds_per_call(function, argument, num_calls: int = 1_000_000) -> float:
+    start_time = time.perf_counter_ns()
+    for _ in range(num_calls):
+        function(argument)
+    return (time.perf_counter_ns() - start_time) / num_calls
+
+
+def _messages_per_second(pipeline: Pipeline, num_messages: int = 200_000) -> float:
+    message = Message(timestamp=time.time(), topic="sensors/1", raw=b"21.5")
+    start_time = time.perf_counter()
+    for _ in range(num_messages):
+        pipeline.execute(message)
+    return num_messages / (time.perf_counter() - start_time)
+
+
+def main() -> None:
+    nodes._types["forward"] = _ForwardingNode
+    store = MetricsStore(publish_interval=3_600)
+    recorder = store.recorder()
+    try:
+        histogram = Histogram()
+        counter = Counter()
+        print(f"counter add:         {_nanoseconds_per_call(lambda _: counter.add(), None):6.0f} ns")
+        print(f"histogram record_ns: {_nanoseconds_per_call(histogram.record_ns, 123_456):6.0f} ns")
+        print(f"histogram record:    {_nanoseconds_per_call(histogram.record, 0.000_123_456):6.0f} ns")
+        timed = _nanoseconds_per_call(lambda start: histogram.record_ns(time.perf_counter_ns() - start), 0)
+        print(f"timed sample:        {timed:6.0f} ns")
+
+        plain = _messages_per_second(Pipeline.from_dict(_structure()))
+        instrumented_pipeline = Pipeline.from_dict(_structure())
+        instrumented_pipeline.instrument(lambda label: recorder.node_histogram(0, label))
+        instrumented = _messages_per_second(instrumented_pipeline)
+        overhead = (1 / instrumented - 1 / plain) * 1e9 / 4
+        print(f"pipeline: plain {plain:,.0f} msg/s, timed nodes {instrumented:,.0f} msg/s "
+              f"({overhead:.0f} ns per node)")
+
+        for pipeline_id in range(100):
+            metrics = recorder.pipeline(pipeline_id)
+            for value in range(1, 10_000, 7):
+                metrics.duration.record_ns(value * 1_000)
+        start_time = time.perf_counter()
+        recorder.flush()
+        publish = time.perf_counter() - start_time
+        start_time = time.perf_counter()
+        text = store.render()
+        render = time.perf_counter() - start_time
+        print(f"100 pipelines: publish {publish * 1_000:.2f} ms, render {render * 1_000:.2f} ms "
+              f"({len(text):,} bytes)")
+    finally:
+        store.close()
+        store.unlink()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+"""
+Asynchronous MQTT Publish Benchmark
+===================================
+
+Compares how long ``MQTTPublisherNode.process`` blocks the caller in synchronous and asynchronous mode, and the
+outcome counters of each backpressure policy when the outbound buffer is small.
+
+"""
+
+import time
+
+from mycellium.pipelining.message import Message
+from mycellium.pipelining.nodes import MQTTPublisherNode
+
+from .fake_broker import FakeBroker
+
+
+def measure(broker: FakeBroker, config: dict, num_messages: int) -> tuple[float, float, dict]:
+    node = MQTTPublisherNode([], {"broker_host": broker.host, "broker_port": broker.port, "topic": "bench/out",
+                                  "qos": 1, **config})
+    message = Message(timestamp=time.time(), payload=b"21.5")
+    node.process(message)
+
+    start_time = time.perf_counter()
+    for _ in range(num_messages):
+        node.process(message)
+    caller_seconds = time.perf_counter() - start_time
+    stats = node.stats
+    node.close()
+    total_seconds = time.perf_counter() - start_time
+    return num_messages / caller_seconds, num_messages / total_seconds, stats
+
+
+def main() -> None:
+    broker = FakeBroker().start()
+    cases = {
+        "sync": {},
+        "async block": {"async": True, "max_inflight": 100, "flush_interval_ms": 5, "backpressure": "block"},
+        "async drop_oldest": {"async": True, "max_inflight": 100, "flush_interval_ms": 5,
+                              "backpressure": "drop_oldest"},
+        "async drop_newest": {"async": True, "max_inflight": 100, "flush_interval_ms": 5,
+                              "backpressure": "drop_newest"}
+    }
+    print(f"{'mode':<20}{'caller msg/s':>14}{'end to end msg/s':>18}  counters")
+    for name, config in cases.items():
+        caller_rate, total_rate, stats = measure(broker, config, 20_000)
+        print(f"{name:<20}{caller_rate:>14,.0f}{total_rate:>18,.0f}  {stats}")
+    broker.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""
+MQTT Publish Benchmark
+======================
+
+Measures messages per second published by ``MQTTPublisherNode`` to an in-process fake broker, compared with the
+previous connect, publish and disconnect per message approach.
+
+"""
+
+import time
+
+import paho.mqtt.client as mqtt
+
+from mycellium.pipelining.connections import mqtt_connection_pool
+from mycellium.pipelining.message import Message
+from mycellium.pipelining.nodes import MQTTPublisherNode
+
+from .fake_broker import FakeBroker
+
+
+def measure_reconnecting(broker: FakeBroker, qos: int, num_messages: int) -> tuple[float, int]:
+    # Returns the publish call rate and how many of the messages actually reached the broker, since disconnecting
+    # straight after publishing loses messages.
+    client = mqtt.Client()
+    start_count = broker.received
+    start_time = time.perf_counter()
+    for _ in range(num_messages):
+        client.connect(broker.host, broker.port)
+        client.publish("bench/out", b"21.5", qos=qos)
+        client.disconnect()
+    rate = num_messages / (time.perf_counter() - start_time)
+    broker.wait_for_received(start_count + num_messages, timeout=2)
+    return rate, broker.received - start_count
+
+
+def measure_pooled(broker: FakeBroker, qos: int, num_messages: int) -> float:
+    node = MQTTPublisherNode([], {"broker_host": broker.host, "broker_port": broker.port, "topic": "bench/out",
+                                  "qos": qos})
+    message = Message(timestamp=time.time(), payload=b"21.5")
+    node.process(message)
+    broker.wait_for_received(broker.received + 1)
+
+    start_count = broker.received
+    start_time = time.perf_counter()
+    for _ in range(num_messages):
+        node.process(message)
+    broker.wait_for_received(start_count + num_messages)
+    rate = (broker.received - start_count) / (time.perf_counter() - start_time)
+    node.close()
+    return rate
+
+
+def main() -> None:
+    broker = FakeBroker().start()
+    num_reconnecting = 300
+    print(f"{'qos':<6}{'connect per message msg/s':>28}{'delivered':>12}{'pooled msg/s':>16}")
+    for qos in (0, 1, 2):
+        reconnecting_rate, delivered = measure_reconnecting(broker, qos, num_reconnecting)
+        pooled_rate = measure_pooled(broker, qos, 20_000)
+        print(f"{qos:<6}{reconnecting_rate:>28,.0f}{f'{delivered}/{num_reconnecting}':>12}{pooled_rate:>16,.0f}")
+    print(f"pool clients after close: {len(mqtt_connection_pool())}")
+    broker.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+"""
+Overload Benchmark
+==================
+
+Bursts messages through a fake broker into an ``MQTTIngestor`` much faster than a single ``Executor`` running a slow
+pipeline can process them, with an unbounded queue as before and with a bounded queue under each overflow policy.
+Reports the peak resident memory of the ingestor, which holds the tasks an unbounded queue has not flushed to its
+pipe yet, how many messages were processed and shed, and their latency from ingestion to the end of the pipeline.
+
+"""
+
+import json
+import time
+import threading
+import multiprocessing
+
+from mycellium import storage
+from mycellium.ingestion import MQTTIngestor
+from mycellium.metrics import MetricsStore, configure_metrics
+from mycellium.pipelining import Dispatcher, Executor, OverflowPolicy
+from mycellium.pipelining import nodes
+from mycellium.pipelining.message import Message
+
+from .fake_broker import FakeBroker
+
+_TOPIC = "bench/burst"
+_NUM_MESSAGES = 20_000
+_PROCESSING_TIME = 0.000_2
+
+
+class _SlowNode(nodes.Node):
+    def __init__(self, output_ports: list[str], config: dict) -> None:
+        super().__init__(output_ports)
+
+    def process(self, message: Message) -> tuple[set[str], Message]:
+        deadline = time.perf_counter() + _PROCESSING_TIME
+        while time.perf_counter() < deadline:
+            pass
+        return self.children, message
+
+
+def _peak_rss_mib(pid: int) -> float:
+    with open(f"/proc/{pid}/status") as status:
+        for line in status:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def measure(broker: FakeBroker, maxsize: int, policy: OverflowPolicy) -> dict:
+    pipeline = storage.create_pipeline({"starting_nodes": ["slow"], "connections": [],
+                                        "nodes": {"slow": {"output_ports": ["out"], "type": "slow", "config": {}}}})
+    workspace = storage.create_workspace(name=f"overload-{maxsize}-{policy.value}")
+    client = storage.create_client(workspace_id=workspace.id, broker_host=broker.host, broker_port=broker.port)
+    storage.create_subscription(client_id=client.id, topic=_TOPIC, qos=0, pipeline_id=pipeline.id)
+
+    store = MetricsStore(max_processes=2, publish_interval=0.05)
+    configure_metrics(store)
+    stop_event = multiprocessing.Event()
+    dispatcher = Dispatcher(1, maxsize=maxsize, overflow={0: policy})
+    ingestor = MQTTIngestor(stop_event, dispatcher, clients=[client])
+    executor = Executor(stop_event, dispatcher.queues[0])
+    ingestor.start()
+    executor.start()
+    broker.wait_for_subscriber(_TOPIC)
+    time.sleep(0.5)
+
+    # The broker blocks on a full socket while a paused ingestor is not reading, so it injects from a thread.
+    payload = json.dumps({"value": 21.5, "padding": "x" * 1_024}).encode()
+    start_time = time.perf_counter()
+    injector = threading.Thread(target=broker.inject, args=(_TOPIC, [payload] * _NUM_MESSAGES))
+    injector.start()
+    injector.join()
+    # Wait until every enqueued task has been executed.
+    peak_rss = _peak_rss_mib(ingestor.pid)
+    while True:
+        time.sleep(0.1)
+        summary = store.summary()
+        enqueued = summary.get(f"mycellium_enqueued_tasks_total{{client=\"{client.id}\"}}", 0)
+        latency = summary.get(f"mycellium_end_to_end_seconds{{pipeline=\"{pipeline.id}\"}}", {"count": 0})
+        shed = sum(value for key, value in dispatcher.stats.items() if key != "depths")
+        if enqueued >= _NUM_MESSAGES and latency["count"] + shed >= _NUM_MESSAGES:
+            break
+    elapsed = time.perf_counter() - start_time
+    peak_rss = max(peak_rss, _peak_rss_mib(ingestor.pid))
+
+    stop_event.set()
+    ingestor.join()
+    executor.join()
+    dispatcher.close()
+    configure_metrics(None)
+    store.close()
+    store.unlink()
+    return {
+        "queue": f"{maxsize:,}" if maxsize else "unbounded",
+        "policy": policy.value if maxsize else "-",
+        "peak_rss_mib": peak_rss,
+        "processed": latency["count"],
+        "shed": shed,
+        "seconds": elapsed,
+        "p50_ms": latency["p50"] * 1_000,
+        "p99_ms": latency["p99"] * 1_000
+    }
+
+
+def main() -> None:
+    nodes._types["slow"] = _SlowNode
+    broker = FakeBroker().start()
+    print(f"{'queue':>10}{'policy':>13}{'ingestor MiB':>14}{'processed':>11}{'shed':>8}{'seconds':>9}{'p50 ms':>9}"
+          f"{'p99 ms':>9}")
+    cases = [(0, OverflowPolicy.BLOCK)] + [(1_000, policy) for policy in OverflowPolicy]
+    for maxsize, policy in cases:
+        result = measure(broker, maxsize, policy)
+        print(f"{result['queue']:>10}{result['policy']:>13}{result['peak_rss_mib']:>14.1f}{result['processed']:>11,}"
+              f"{result['shed']:>8,}{result['seconds']:>9.1f}{result['p50_ms']:>9.1f}{result['p99_ms']:>9.1f}")
+    broker.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""
+Parallel Branches Benchmark
+===========================
+
+Measures the latency of a pipeline in which a switch fans out to sinks that each block for 2 ms, as a publish or a
+request to a remote service would, executed serially and with the sinks of a generation executed concurrently on a
+thread pool.
+
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from mycellium.pipelining import nodes
+from mycellium.pipelining.message import Message, Payload
+from mycellium.pipelining.pipeline import Pipeline
+
+
+class _BlockingNode(nodes.Node):
+    def __init__(self, output_ports: list[str], config: dict) -> None:
+        super().__init__(output_ports)
+        self.__duration = config["duration"]
+
+    def process(self, message: Message) -> tuple[set[str], Payload]:
+        time.sleep(self.__duration)
+        return self.children, message.payload
+
+
+def _fan_out_structure(width: int, duration: float) -> dict:
+    structure = {
+        "starting_nodes": ["switch0"],
+        "nodes": {
+            "switch0": {
+                "output_ports": ["out"],
+                "type": "switch",
+                "config": {"conditions": {"out": {"comparison": "ge", "value": 0}}}
+            }
+        },
+        "connections": []
+    }
+    for position in range(width):
+        structure["nodes"][f"sink{position}"] = {"output_ports": [], "type": "blocking",
+                                                 "config": {"duration": duration}}
+        structure["connections"].append({"parent": "switch0", "child": f"sink{position}", "port": "out"})
+    return structure
+
+
+def _ms_per_execute(pipeline: Pipeline, repeats: int, pool: None | ThreadPoolExecutor = None) -> float:
+    message = Message(timestamp=time.time(), payload=1)
+    start_time = time.perf_counter()
+    for _ in range(repeats):
+        pipeline.execute(message, pool=pool)
+    return (time.perf_counter() - start_time) / repeats * 1_000
+
+
+def main() -> None:
+    nodes._types["blocking"] = _BlockingNode
+    print(f"{'sinks':<8}{'serial ms':>12}{'threads ms':>12}{'speedup':>10}")
+    with ThreadPoolExecutor(16, "pipeline-node") as pool:
+        for width in (1, 2, 4, 8, 16):
+            pipeline = Pipeline.from_dict(_fan_out_structure(width, duration=0.002))
+            serial = _ms_per_execute(pipeline, repeats=50)
+            concurrent = _ms_per_execute(pipeline, repeats=50, pool=pool)
+            print(f"{width:<8}{serial:>12.2f}{concurrent:>12.2f}{serial / concurrent:>9.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+"""
+Pipeline Execution Benchmark
+============================
+
+Measures ``Pipeline.from_dict`` and ``Pipeline.execute`` over generated wide (one node fanning out to many children)
+and deep (a single long chain) pipelines.
+
+"""
+
+import time
+
+from mycellium.pipelining.message import Message
+from mycellium.pipelining.pipeline import Pipeline
+
+from .pipelines import deep_structure, wide_structure
+
+
+def measure(pipeline: Pipeline, repeats: int) -> float:
+    message = Message(timestamp=time.time(), payload=1)
+    start_time = time.perf_counter()
+    for _ in range(repeats):
+        pipeline.execute(message)
+    return (time.perf_counter() - start_time) / repeats
+
+
+def measure_from_dict(structure: dict, repeats: int) -> float:
+    start_time = time.perf_counter()
+    for _ in range(repeats):
+        Pipeline.from_dict(structure)
+    return (time.perf_counter() - start_time) / repeats
+
+
+def main() -> None:
+    cases = {
+        "wide 10": (wide_structure(10), 20_000),
+        "wide 100": (wide_structure(100), 2_000),
+        "wide 1000": (wide_structure(1_000), 200),
+        "deep 10": (deep_structure(10), 20_000),
+        "deep 100": (deep_structure(100), 2_000),
+        "deep 1000": (deep_structure(1_000), 200)
+    }
+    print(f"{'pipeline':<12}{'us/from_dict':>14}{'us/execute':>14}{'ns/node':>12}")
+    for name, (structure, repeats) in cases.items():
+        build_seconds = measure_from_dict(structure, max(repeats // 20, 10))
+        pipeline = Pipeline.from_dict(structure)
+        seconds = measure(pipeline, repeats)
+        num_nodes = len(structure["nodes"])
+        print(f"{name:<12}{build_seconds * 1e6:>14,.1f}{seconds * 1e6:>14,.1f}{seconds * 1e9 / num_nodes:>12,.0f}")
+
+
+if __name__ == '__main__':
+    main()
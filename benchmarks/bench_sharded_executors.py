@@ -0,0 +1,158 @@
+"""
+Sharded Executors Benchmark
+===========================
+
+Runs 1 to N Executor processes (N defaults to the number of CPUs, at least 4) over tasks of 64 pipelines, either
+all consuming one shared queue or each consuming its own queue of a ``Dispatcher`` sharding by pipeline. Every
+pipeline parses numeric payloads and routes them through a 32 port range switch.
+
+For each setup it reports the throughput of draining prefilled queues, the number of pipelines compiled over all
+Executors, and how many tasks were executed before a task of the same pipeline that was queued ahead of them.
+
+Usage: python -m benchmarks.bench_sharded_executors [max executors]
+
+"""
+
+import os
+import sys
+import time
+import queue
+import threading
+import multiprocessing
+
+from mycellium.pipelining import Dispatcher, Executor
+from mycellium.pipelining import nodes
+from mycellium.pipelining.message import Message, Payload
+from mycellium.pipelining.task import Task
+from mycellium.storage import create_pipeline
+
+# Inherited by the Executor processes, which report the pipeline and sequence number of executed tasks through it.
+_executed = multiprocessing.Queue()
+
+
+class _ParseNode(nodes.Node):
+    def __init__(self, output_ports: list[str], config: dict) -> None:
+        super().__init__(output_ports)
+
+    def process(self, message: Message) -> tuple[set[str], Payload]:
+        sequence = int(message.payload)
+        return self.children, {"sequence": sequence, "value": sequence % 100}
+
+
+class _ReportingNode(nodes.Node):
+    def __init__(self, output_ports: list[str], config: dict) -> None:
+        super().__init__(output_ports)
+        self.__report = config["report"]
+
+    def process(self, message: Message) -> tuple[set[str], Payload]:
+        if self.__report:
+            _executed.put(message.payload["sequence"])
+        return self.children, message.payload
+
+
+def _structure(report: bool, num_ports: int = 32) -> dict:
+    conditions = {f"p{port}": {"comparison": "ge", "value": port * 100 // num_ports, "field": "payload.value"}
+                  for port in range(num_ports)}
+    structure = {
+        "starting_nodes": ["parse"],
+        "nodes": {
+            "parse": {"output_ports": ["out"], "type": "parse", "config": {}},
+            "switch": {"output_ports": list(conditions), "type": "switch", "config": {"conditions": conditions}},
+            "report": {"output_ports": [], "type": "reporting", "config": {"report": report}}
+        },
+        "connections": [
+            {"parent": "parse", "child": "switch", "port": "out"},
+            {"parent": "switch", "child": "report", "port": "p0"}
+        ]
+    }
+    for port in range(1, num_ports, 4):
+        structure["nodes"][f"sink{port}"] = {"output_ports": [], "type": "reporting", "config": {"report": False}}
+        structure["connections"].append({"parent": "switch", "child": f"sink{port}", "port": f"p{port}"})
+    return structure
+
+
+def _tasks(pipeline_ids: list[int], num_tasks: int) -> list[Task]:
+    # The payload of a task is its sequence number, which identifies it in reports.
+    return [Task(pipeline_id=pipeline_ids[sequence % len(pipeline_ids)], pipeline_version=0,
+                 topic=f"sensors/{sequence % len(pipeline_ids)}", payload=f"{sequence}".encode(), timestamp=time.time())
+            for sequence in range(num_tasks)]
+
+
+def _run(num_executors: int, sharded: bool, tasks: list[Task]) -> tuple[float, int]:
+    # Queues are filled before the Executors start, so that they do not compete with the producer for the CPU.
+    stop_event = multiprocessing.Event()
+    if sharded:
+        dispatcher = Dispatcher(num_executors, key="pipeline")
+        task_queues = dispatcher.queues
+    else:
+        dispatcher = multiprocessing.JoinableQueue()
+        task_queues = [dispatcher] * num_executors
+    for task in tasks:
+        dispatcher.put(task)
+    time.sleep(0.5)
+
+    start_time = time.perf_counter()
+    executors = [Executor(stop_event, task_queue) for task_queue in task_queues]
+    for executor in executors:
+        executor.start()
+    dispatcher.join()
+    elapsed = time.perf_counter() - start_time
+    stop_event.set()
+    for executor in executors:
+        executor.join()
+    return len(tasks) / elapsed, sum(executor.pipeline_cache.stats["misses"] for executor in executors)
+
+
+def _reordered(num_executors: int, sharded: bool, tasks: list[Task], num_pipelines: int) -> int:
+    # Reports are collected while the Executors run, as they cannot exit before their reports have been read.
+    sequences = []
+    collecting = threading.Event()
+    collector = threading.Thread(target=_collect, args=(sequences, collecting), daemon=True)
+    collector.start()
+    _run(num_executors, sharded, tasks)
+    collecting.set()
+    collector.join()
+    if len(sequences) != len(tasks):
+        raise RuntimeError(f"{len(sequences)} of {len(tasks)} tasks were reported.")
+
+    latest: dict[int, int] = {}
+    reordered = 0
+    for sequence in sequences:
+        pipeline = sequence % num_pipelines
+        if sequence < latest.get(pipeline, -1):
+            reordered += 1
+        latest[pipeline] = max(sequence, latest.get(pipeline, -1))
+    return reordered
+
+
+def _collect(sequences: list[int], stop: threading.Event) -> None:
+    while True:
+        try:
+            sequences.append(_executed.get(timeout=0.2))
+        except queue.Empty:
+            if stop.is_set():
+                return
+
+
+def main() -> None:
+    max_executors = int(sys.argv[1]) if len(sys.argv) > 1 else max(os.cpu_count() or 1, 4)
+    nodes._types["parse"] = _ParseNode
+    nodes._types["reporting"] = _ReportingNode
+    num_pipelines = 64
+    quiet_ids = [create_pipeline(_structure(report=False)).id for _ in range(num_pipelines)]
+    reporting_ids = [create_pipeline(_structure(report=True)).id for _ in range(num_pipelines)]
+    tasks = _tasks(quiet_ids, 40_000)
+    reporting_tasks = _tasks(reporting_ids, 10_000)
+
+    print(f"{os.cpu_count()} CPUs")
+    print(f"{'executors':<11}{'queues':<9}{'msg/s':>10}{'compiled':>10}{'reordered':>11}")
+    for num_executors in range(1, max_executors + 1):
+        for sharded in (False, True):
+            throughput, compiled = _run(num_executors, sharded, tasks)
+            reordered = _reordered(num_executors, sharded, reporting_tasks, num_pipelines)
+            print(f"{num_executors:<11}{'sharded' if sharded else 'shared':<9}{throughput:>10,.0f}{compiled:>10}"
+                  f"{reordered:>11}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""
+Shared Memory Queue Benchmark
+=============================
+
+Measures how many tasks per second a producer process hands to a consumer process through a
+``multiprocessing.JoinableQueue`` and through a ``SharedMemoryQueue``, for payloads of several sizes. The consumer
+reads every payload once. The last rows feed an Executor running a two node pipeline while the producer puts
+tasks, and include the time until the Executor has executed them all.
+
+"""
+
+import time
+import multiprocessing
+
+from mycellium.pipelining import Executor, SharedMemoryQueue
+from mycellium.pipelining import nodes
+from mycellium.pipelining.message import Message, Payload
+from mycellium.pipelining.task import Task
+from mycellium.storage import create_pipeline
+
+
+class _PassNode(nodes.Node):
+    def __init__(self, output_ports: list[str], config: dict) -> None:
+        super().__init__(output_ports)
+
+    def process(self, message: Message) -> tuple[set[str], Payload]:
+        return self.children, message.payload
+
+
+def _structure() -> dict:
+    return {
+        "starting_nodes": ["first"],
+        "nodes": {
+            "first": {"output_ports": ["out"], "type": "pass", "config": {}},
+            "second": {"output_ports": [], "type": "pass", "config": {}}
+        },
+        "connections": [{"parent": "first", "child": "second", "port": "out"}]
+    }
+
+
+def _produce(task_queue, payload: bytes, pipeline_id: int, num_tasks: int) -> None:
+    for _ in range(num_tasks):
+        task_queue.put(Task(pipeline_id=pipeline_id, pipeline_version=0, topic="bench/topic", payload=payload,
+                            timestamp=time.time()))
+
+
+def _consume(task_queue, num_tasks: int) -> None:
+    read = 0
+    for _ in range(num_tasks):
+        task = task_queue.get()
+        read += task.payload[-1]
+        task_queue.task_done()
+
+
+def _queues() -> dict:
+    return {
+        "JoinableQueue": multiprocessing.JoinableQueue,
+        "SharedMemoryQueue": SharedMemoryQueue
+    }
+
+
+def _measure(task_queue, consumer: multiprocessing.Process, payload: bytes, pipeline_id: int, num_tasks: int) -> float:
+    producer = multiprocessing.Process(target=_produce, args=(task_queue, payload, pipeline_id, num_tasks))
+    start_time = time.perf_counter()
+    consumer.start()
+    producer.start()
+    producer.join()
+    task_queue.join()
+    return num_tasks / (time.perf_counter() - start_time)
+
+
+def main() -> None:
+    num_tasks = 50_000
+    payload_sizes = {"16 B": 16, "1 KiB": 1_024, "16 KiB": 16 * 1_024}
+    print(f"{'consumer':<10}{'payload':<9}{'queue':<20}{'tasks/s':>10}{'us/task':>10}")
+    for name, size in payload_sizes.items():
+        payload = b"x" * size
+        for queue_name, make_queue in _queues().items():
+            task_queue = make_queue()
+            consumer = multiprocessing.Process(target=_consume, args=(task_queue, num_tasks))
+            rate = _measure(task_queue, consumer, payload, 0, num_tasks)
+            consumer.join()
+            print(f"{'process':<10}{name:<9}{queue_name:<20}{rate:>10,.0f}{1e6 / rate:>10.1f}")
+            if isinstance(task_queue, SharedMemoryQueue):
+                task_queue.close()
+                task_queue.unlink()
+
+    nodes._types["pass"] = _PassNode
+    pipeline_id = create_pipeline(_structure()).id
+    for queue_name, make_queue in _queues().items():
+        task_queue = make_queue()
+        stop_event = multiprocessing.Event()
+        executor = Executor(stop_event, task_queue)
+        rate = _measure(task_queue, executor, b"21.5", pipeline_id, num_tasks)
+        stop_event.set()
+        executor.join()
+        print(f"{'Executor':<10}{'4 B':<9}{queue_name:<20}{rate:>10,.0f}{1e6 / rate:>10.1f}")
+        if isinstance(task_queue, SharedMemoryQueue):
+            task_queue.close()
+            task_queue.unlink()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""
+Storage Benchmark
+=================
+
+Compares lookups against the indexed ``InMemoryRepository`` with the linear scans over record lists that storage
+used before, with 100k subscriptions spread over 1k clients in 10 workspaces.
+
+"""
+
+import time
+import random
+
+from mycellium.storage import InMemoryRepository
+
+
+def _per_second(function, arguments: list[tuple]) -> float:
+    start_time = time.perf_counter()
+    for argument in arguments:
+        function(*argument)
+    return len(arguments) / (time.perf_counter() - start_time)
+
+
+def main() -> None:
+    num_workspaces, num_clients, num_subscriptions, num_pipelines = 10, 1_000, 100_000, 1_000
+    repository = InMemoryRepository()
+    workspaces = [repository.create_workspace() for _ in range(num_workspaces)]
+    clients = [repository.create_client(workspace_id=workspaces[position % num_workspaces].id,
+                                        broker_host="localhost", broker_port=1883) for position in range(num_clients)]
+    pipelines = [repository.create_pipeline(structure={}) for _ in range(num_pipelines)]
+    subscriptions = [repository.create_subscription(client_id=clients[position % num_clients].id,
+                                                    topic=f"sensors/{position}/temperature", qos=0,
+                                                    pipeline_id=pipelines[position % num_pipelines].id)
+                     for position in range(num_subscriptions)]
+
+    # The record lists that the previous, scanning implementation kept
+    client_list = list(clients)
+    subscription_list = list(subscriptions)
+    pipeline_list = list(pipelines)
+
+    def scan_subscription(client_id: int, topic: str):
+        for subscription in subscription_list:
+            if subscription.client_id == client_id and subscription.topic == topic:
+                return subscription
+        return None
+
+    def scan_subscriptions(client_id: int):
+        return list(filter(lambda record: record.client_id == client_id, subscription_list))
+
+    def scan_clients(workspace_id: int):
+        return list(filter(lambda record: record.workspace_id == workspace_id, client_list))
+
+    def scan_pipeline(pipeline_id: int):
+        for pipeline in pipeline_list:
+            if pipeline.id == pipeline_id:
+                return pipeline
+        return None
+
+    random.seed(0)
+    sampled = random.sample(subscriptions, 200)
+    cases = {
+        "fetch_subscription": (repository.fetch_subscription, scan_subscription,
+                               [(record.client_id, record.topic) for record in sampled]),
+        "fetch_subscriptions": (repository.fetch_subscriptions, scan_subscriptions,
+                                [(record.client_id,) for record in sampled]),
+        "fetch_clients": (repository.fetch_clients, scan_clients,
+                          [(workspaces[position % num_workspaces].id,) for position in range(200)]),
+        "fetch_pipeline": (repository.fetch_pipeline, scan_pipeline,
+                           [(pipelines[-1 - position].id,) for position in range(200)])
+    }
+    print(f"{'lookup':<22}{'linear scan /s':>16}{'indexed /s':>14}{'speedup':>10}")
+    for name, (indexed, scan, arguments) in cases.items():
+        scan_rate = _per_second(scan, arguments)
+        indexed_rate = _per_second(indexed, arguments * 100)
+        print(f"{name:<22}{scan_rate:>16,.0f}{indexed_rate:>14,.0f}{indexed_rate / scan_rate:>9,.0f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""
+Storage Backends Benchmark
+==========================
+
+Compares the lookups of the message path (`match_subscriptions`, `fetch_subscription_pipeline` and `fetch_pipeline`)
+against the in-memory repository, a SQLite database on disk and the same database behind a ``CachedRepository``,
+with 10k subscriptions spread over 100 clients.
+
+"""
+
+import os
+import time
+import random
+import tempfile
+
+from mycellium.storage import CachedRepository, InMemoryRepository, Repository, SQLiteRepository
+
+
+def _populate(repository: Repository, num_clients: int, num_subscriptions: int, num_pipelines: int) -> None:
+    workspace = repository.create_workspace()
+    clients = [repository.create_client(workspace_id=workspace.id, broker_host="localhost", broker_port=1883)
+               for _ in range(num_clients)]
+    pipelines = [repository.create_pipeline(structure={"starting_nodes": [], "nodes": {}, "connections": []})
+                 for _ in range(num_pipelines)]
+    for position in range(num_subscriptions):
+        repository.create_subscription(client_id=clients[position % num_clients].id,
+                                       topic=f"sensors/{position}/temperature", qos=0,
+                                       pipeline_id=pipelines[position % num_pipelines].id)
+
+
+def _lookups_per_second(repository: Repository, lookups: list[tuple[int, str]]) -> float:
+    start_time = time.perf_counter()
+    for client_id, topic in lookups:
+        for subscription in repository.match_subscriptions(client_id, topic):
+            pipeline = repository.fetch_subscription_pipeline(subscription.id)
+            repository.fetch_pipeline(pipeline.id)
+    return len(lookups) / (time.perf_counter() - start_time)
+
+
+def main() -> None:
+    num_clients, num_subscriptions, num_pipelines = 100, 10_000, 100
+    random.seed(0)
+    positions = [random.randrange(num_subscriptions) for _ in range(2_000)]
+    lookups = [(position % num_clients, f"sensors/{position}/temperature") for position in positions]
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "mycellium.sqlite")
+        start_time = time.perf_counter()
+        sqlite = SQLiteRepository(path)
+        _populate(sqlite, num_clients, num_subscriptions, num_pipelines)
+        print(f"sqlite: {num_subscriptions + num_clients + num_pipelines + 1:,} writes in "
+              f"{time.perf_counter() - start_time:.2f} s")
+
+        memory = InMemoryRepository()
+        _populate(memory, num_clients, num_subscriptions, num_pipelines)
+        cached = CachedRepository(sqlite)
+        # Warm the cache, as the ingestion processes would after their first messages.
+        _lookups_per_second(cached, lookups)
+
+        print(f"{'backend':<18}{'messages /s':>14}")
+        for name, repository in (("in-memory", memory), ("sqlite", sqlite), ("cached sqlite", cached)):
+            print(f"{name:<18}{_lookups_per_second(repository, lookups):>14,.0f}")
+        print(f"cache: {cached.stats}")
+        sqlite.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""
+Switch Node Benchmark
+=====================
+
+Measures ``SwitchNode.process`` for switches of 1 to 1000 ports against the previous implementation, which
+interpreted every condition per message and rebuilt the set of children port by port. Equality switches route each
+payload to one port, range switches let a payload through half of their ports, and field switches compare a field
+of dict payloads through ranges.
+
+"""
+
+import time
+import random
+
+from mycellium.pipelining.message import Message, Payload
+from mycellium.pipelining.nodes.node import Node
+from mycellium.pipelining.nodes.switch import SwitchNode
+
+
+class _InterpretedSwitchNode(Node):
+    # The condition evaluation SwitchNode used before conditions were compiled.
+    def __init__(self, output_ports: list[str], config: dict) -> None:
+        super().__init__(output_ports)
+        self.__output_conditions: dict[str, tuple[str, object]] = {
+            output_port: (condition["comparison"], condition["value"])
+            for output_port, condition in config["conditions"].items()
+        }
+
+    def process(self, message: Message) -> tuple[set[str], Payload]:
+        survived_children = frozenset()
+        for output_port, condition in self.__output_conditions.items():
+            if self.__conditions_is_met(condition, message.payload):
+                survived_children = survived_children.union(self.port_children(output_port))
+        return survived_children, message.payload
+
+    @staticmethod
+    def __conditions_is_met(condition: tuple[str, object], payload: Payload) -> bool:
+        comparison, right_value = condition
+        match comparison:
+            case "eq":
+                return payload == right_value
+            case "ge":
+                return payload >= right_value
+            case _:
+                raise ValueError(f"Unknown condition comparison provided: '{comparison}'")
+
+
+def _config(num_ports: int, comparison: str, field: None | str = None) -> dict:
+    conditions = {}
+    for port in range(num_ports):
+        conditions[str(port)] = {"comparison": comparison, "value": port}
+        if field is not None:
+            conditions[str(port)]["field"] = field
+    return {"conditions": conditions}
+
+
+def _build(node_type: type, num_ports: int, config: dict) -> Node:
+    node = node_type([str(port) for port in range(num_ports)], config)
+    for port in range(num_ports):
+        node.add_child(str(port), f"child{port}")
+    return node
+
+
+def _us_per_message(node: Node, messages: list[Message]) -> float:
+    node.process(messages[0])
+    start_time = time.perf_counter()
+    for message in messages:
+        node.process(message)
+    return (time.perf_counter() - start_time) / len(messages) * 1e6
+
+
+def main() -> None:
+    random.seed(0)
+    print(f"{'switch':<10}{'ports':>7}{'before us':>12}{'after us':>11}{'speedup':>10}")
+    for num_ports in (1, 10, 100, 1_000):
+        repeats = max(200_000 // num_ports, 200)
+        values = [random.randrange(num_ports) for _ in range(repeats)]
+        # Few distinct payloads, as with readings of a sensor, so that passed port combinations recur.
+        ranged = [min(num_ports // 2 + random.randrange(4), num_ports - 1) for _ in range(repeats)]
+        cases = {
+            "eq": ("eq", None, [Message(timestamp=0.0, payload=value) for value in values]),
+            "ge": ("ge", None, [Message(timestamp=0.0, payload=value) for value in ranged]),
+            "field ge": ("ge", "payload.temperature",
+                         [Message(timestamp=0.0, payload={"temperature": value}) for value in ranged])
+        }
+        for name, (comparison, field, messages) in cases.items():
+            compiled = _us_per_message(_build(SwitchNode, num_ports, _config(num_ports, comparison, field)), messages)
+            if field is None:
+                interpreted = _us_per_message(
+                    _build(_InterpretedSwitchNode, num_ports, _config(num_ports, comparison)), messages)
+                print(f"{name:<10}{num_ports:>7}{interpreted:>12,.2f}{compiled:>11,.2f}"
+                      f"{interpreted / compiled:>9,.1f}x")
+            else:
+                print(f"{name:<10}{num_ports:>7}{'-':>12}{compiled:>11,.2f}{'-':>10}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""
+Task Queue Benchmark
+====================
+
+Measures how many tasks per second pass through a ``multiprocessing.JoinableQueue`` from a producer process to a
+consumer process, comparing the legacy task dictionaries that embed the whole pipeline structure with the compact
+``Task`` envelope that only references the pipeline.
+
+"""
+
+import time
+import multiprocessing
+
+from mycellium.pipelining.task import Task
+
+from .pipelines import layered_structure
+
+
+def _legacy_task(structure: dict, payload: bytes) -> dict:
+    return {
+        "message": {
+            "timestamp": time.time(),
+            "payload": payload.decode()
+        },
+        "structure": structure
+    }
+
+
+def _envelope_task(structure: dict, payload: bytes) -> Task:
+    return Task(pipeline_id=0, pipeline_version=0, topic="bench/topic", payload=payload, timestamp=time.time())
+
+
+def _produce(task_queue: multiprocessing.JoinableQueue, make_task, structure: dict, num_tasks: int) -> None:
+    payload = b"21.5"
+    for _ in range(num_tasks):
+        task_queue.put(make_task(structure, payload))
+
+
+def _consume(task_queue: multiprocessing.JoinableQueue, num_tasks: int) -> None:
+    for _ in range(num_tasks):
+        task_queue.get()
+        task_queue.task_done()
+
+
+def measure(make_task, structure: dict, num_tasks: int) -> float:
+    task_queue = multiprocessing.JoinableQueue()
+    producer = multiprocessing.Process(target=_produce, args=(task_queue, make_task, structure, num_tasks))
+    consumer = multiprocessing.Process(target=_consume, args=(task_queue, num_tasks))
+
+    start_time = time.perf_counter()
+    consumer.start()
+    producer.start()
+    producer.join()
+    consumer.join()
+    return num_tasks / (time.perf_counter() - start_time)
+
+
+def main() -> None:
+    num_tasks = 20_000
+    cases = {
+        "small (4 nodes)": layered_structure(width=3, depth=1),
+        "large (501 nodes)": layered_structure(width=50, depth=10)
+    }
+    print(f"{'pipeline':<20}{'legacy dict tasks/s':>22}{'envelope tasks/s':>20}{'speedup':>10}")
+    for name, structure in cases.items():
+        legacy_rate = measure(_legacy_task, structure, num_tasks)
+        envelope_rate = measure(_envelope_task, structure, num_tasks)
+        print(f"{name:<20}{legacy_rate:>22,.0f}{envelope_rate:>20,.0f}{envelope_rate / legacy_rate:>9.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""
+Topic Matching Benchmark
+========================
+
+Compares resolving concrete topics against a ``TopicTrie`` of subscription filters with scanning every filter, for
+10k to 1M filters. Most filters are exact topics, the rest use the ``+`` and ``#`` wildcards.
+
+"""
+
+import time
+import random
+
+from mycellium.topics import TopicTrie, topic_matches
+
+
+def generate_filters(num_filters: int) -> list[str]:
+    filters = []
+    for position in range(num_filters):
+        site, device = divmod(position, 1_000)
+        match position % 20:
+            case 0:
+                filters.append(f"site/{site}/device/+/temperature")
+            case 1:
+                filters.append(f"site/{site}/device/{device}/#")
+            case _:
+                filters.append(f"site/{site}/device/{device}/temperature")
+    return filters
+
+
+def main() -> None:
+    random.seed(0)
+    print(f"{'filters':>10}{'build s':>10}{'scan lookups/s':>16}{'trie lookups/s':>16}{'speedup':>10}{'matches':>9}")
+    for num_filters, num_scans in [(10_000, 100), (100_000, 10), (1_000_000, 3)]:
+        filters = generate_filters(num_filters)
+        start_time = time.perf_counter()
+        trie = TopicTrie()
+        for position, topic_filter in enumerate(filters):
+            trie.insert(topic_filter, position)
+        build_seconds = time.perf_counter() - start_time
+
+        num_sites = max(num_filters // 1_000, 1)
+        topics = [f"site/{random.randrange(num_sites)}/device/{random.randrange(1_000)}/temperature"
+                  for _ in range(10_000)]
+
+        start_time = time.perf_counter()
+        for topic in topics[:num_scans]:
+            scanned = [position for position, topic_filter in enumerate(filters) if topic_matches(topic_filter, topic)]
+        scan_rate = num_scans / (time.perf_counter() - start_time)
+
+        start_time = time.perf_counter()
+        for topic in topics:
+            matched = trie.match(topic)
+        trie_rate = len(topics) / (time.perf_counter() - start_time)
+
+        assert sorted(trie.match(topics[num_scans - 1])) == scanned
+        print(f"{num_filters:>10,}{build_seconds:>10.2f}{scan_rate:>16,.1f}{trie_rate:>16,.0f}"
+              f"{trie_rate / scan_rate:>9,.0f}x{len(matched):>9}")
+
+
+if __name__ == '__main__':
+    main()
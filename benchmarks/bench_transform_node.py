@@ -0,0 +1,81 @@
+"""
+Transform Node Benchmark
+========================
+
+Measures the cost per message of extracting typed fields from JSON sensor readings ingested as UTF-8, with three
+transform nodes reading the same message and sharing its parse, against each node parsing the decoded string with
+the json module on its own, and compares parsing with orjson, when it is installed, to the json module.
+
+"""
+
+import json
+import time
+
+from mycellium import encodings
+from mycellium.pipelining.message import Message
+from mycellium.pipelining.nodes import TransformNode
+
+_NUM_MESSAGES = 100_000
+
+_CONFIGS = [
+    {"expression": "payload.sensor.id", "type": "int"},
+    {"expression": "float(payload.reading.value) * 1.8 + 32"},
+    {"fields": {"unit": "payload.reading.unit", "ok": {"expression": "payload.status", "type": "bool"},
+                "first": {"expression": "payload.history[0]", "default": None}}}
+]
+
+
+def _raw_payloads() -> list[bytes]:
+    return [json.dumps({"sensor": {"id": str(sequence % 64), "site": "plant-1"},
+                        "reading": {"value": f"{sequence % 400 / 10}", "unit": "C"},
+                        "status": "true", "history": [sequence % 7, 1.5, 2.5, 3.5]}).encode()
+            for sequence in range(_NUM_MESSAGES)]
+
+
+def _separate_parses(raw_payloads: list[bytes]) -> float:
+    # What each node had to do before: parse the decoded string itself, and look fields up by hand.
+    start_time = time.perf_counter()
+    for raw in raw_payloads:
+        message = Message(timestamp=0.0, raw=raw)
+        int(json.loads(message.payload)["sensor"]["id"])
+        float(json.loads(message.payload)["reading"]["value"]) * 1.8 + 32
+        document = json.loads(message.payload)
+        {"unit": document["reading"]["unit"], "ok": document["status"] == "true", "first": document["history"][0]}
+    return (time.perf_counter() - start_time) / len(raw_payloads) * 1e9
+
+
+def _shared_parse(raw_payloads: list[bytes]) -> float:
+    transform_nodes = [TransformNode(["out"], config) for config in _CONFIGS]
+    start_time = time.perf_counter()
+    for raw in raw_payloads:
+        message = Message(timestamp=0.0, raw=raw)
+        for node in transform_nodes:
+            node.process(message)
+    return (time.perf_counter() - start_time) / len(raw_payloads) * 1e9
+
+
+def _parse(raw_payloads: list[bytes], parse) -> float:
+    start_time = time.perf_counter()
+    for raw in raw_payloads:
+        parse(raw)
+    return (time.perf_counter() - start_time) / len(raw_payloads) * 1e9
+
+
+def main() -> None:
+    raw_payloads = _raw_payloads()
+    print(f"parse json module:                {_parse(raw_payloads, json.loads):7,.0f} ns")
+    if encodings.orjson is not None:
+        print(f"parse orjson:                     {_parse(raw_payloads, encodings.orjson.loads):7,.0f} ns")
+    print(f"3 nodes parsing separately:       {_separate_parses(raw_payloads):7,.0f} ns/msg")
+    print(f"3 transform nodes, shared parse:  {_shared_parse(raw_payloads):7,.0f} ns/msg")
+    node = TransformNode(["out"], _CONFIGS[1])
+    message = Message(timestamp=0.0, raw=raw_payloads[0])
+    message.json
+    start_time = time.perf_counter()
+    for _ in range(_NUM_MESSAGES):
+        node.process(message)
+    print(f"expression on a parsed message:   {(time.perf_counter() - start_time) / _NUM_MESSAGES * 1e9:7,.0f} ns")
+
+
+if __name__ == '__main__':
+    main()
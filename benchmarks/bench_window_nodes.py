@@ -0,0 +1,125 @@
+"""
+Window Nodes Benchmark
+======================
+
+Measures the cost per message of throttle and window nodes over a 10 kHz stream of readings from 16 sensors, how
+many messages a 1 Hz throttle passes on, and the memory a window node keeps per key. It also checks that the
+aggregates of a window reach a broker as JSON when published by an MQTT publisher node.
+
+"""
+
+import json
+import time
+import tracemalloc
+
+from mycellium.pipelining.message import Message
+from mycellium.pipelining.nodes import ThrottleNode, WindowNode
+from mycellium.pipelining.pipeline import Pipeline
+
+from .fake_broker import FakeBroker
+
+_RATE = 10_000
+_NUM_MESSAGES = 200_000
+_NUM_SENSORS = 16
+
+
+def _messages() -> list[Message]:
+    start = time.time()
+    messages = []
+    for sequence in range(_NUM_MESSAGES):
+        message = Message(timestamp=start + sequence / _RATE, payload={"sensor": sequence % _NUM_SENSORS,
+                                                                        "value": sequence % 100 + 0.5})
+        message.payload
+        messages.append(message)
+    return messages
+
+
+def _measure(node, messages: list[Message]) -> tuple[float, int]:
+    passed = 0
+    start_time = time.perf_counter()
+    for message in messages:
+        children, _ = node.process(message)
+        if children:
+            passed += 1
+    return (time.perf_counter() - start_time) / len(messages) * 1e9, passed
+
+
+def _bytes_per_key(config: dict, num_keys: int = 10_000) -> float:
+    node = WindowNode(["out"], config)
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for key in range(num_keys):
+        node.process(Message(timestamp=0.0, payload={"sensor": key, "value": 1.0}))
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return used / num_keys
+
+
+def _published_windows(messages: list[Message]) -> list[dict]:
+    # Executes the first 3 s of the stream through a pipeline publishing the aggregates of 1 s tumbling windows, and
+    # returns the windows the broker received, decoded.
+    broker = FakeBroker().start()
+    pipeline = Pipeline.from_dict({
+        "starting_nodes": ["window"],
+        "nodes": {
+            "window": {"output_ports": ["out"], "type": "window",
+                       "config": {"window": "tumbling", "size": 1_024, "duration_ms": 1_000, "field": "payload.value",
+                                  "key": "payload.sensor"}},
+            "publish": {"output_ports": [], "type": "mqtt",
+                        "config": {"broker_host": broker.host, "broker_port": broker.port, "topic": "bench/windows",
+                                   "qos": 1}}
+        },
+        "connections": [{"parent": "window", "child": "publish", "port": "out"}]
+    })
+    for message in messages[:3 * _RATE]:
+        pipeline.execute(message)
+    # Windows are aligned to whole seconds, so at least the windows of 2 s are closed by the messages of the third.
+    expected = 2 * _NUM_SENSORS
+    broker.wait_for_received(expected, timeout=5)
+    pipeline.close()
+    windows = [json.loads(payload) for payload in broker.payloads("bench/windows")]
+    broker.stop()
+    if len(windows) < expected or any(not isinstance(window, dict) or "count" not in window for window in windows):
+        raise AssertionError(f"Expected at least {expected} windows to be published, the broker received "
+                             f"{len(windows)}.")
+    return windows
+
+
+def main() -> None:
+    messages = _messages()
+    cases = [
+        ("throttle 1 Hz", ThrottleNode, {"interval_ms": 1_000}),
+        ("throttle 1 Hz per sensor", ThrottleNode, {"interval_ms": 1_000, "key": "payload.sensor"}),
+        ("debounce 10 ms per sensor", ThrottleNode, {"interval_ms": 10, "mode": "debounce", "key": "payload.sensor"}),
+        ("tumbling 1 s per sensor", WindowNode, {"window": "tumbling", "size": 1_024, "duration_ms": 1_000,
+                                                 "field": "payload.value", "key": "payload.sensor"}),
+        ("tumbling 1 s, p50 p99", WindowNode, {"window": "tumbling", "size": 1_024, "duration_ms": 1_000,
+                                               "field": "payload.value", "key": "payload.sensor",
+                                               "percentiles": [50, 99]}),
+        ("sliding 100 samples", WindowNode, {"window": "sliding", "size": 100, "field": "payload.value",
+                                             "key": "payload.sensor"}),
+        ("sliding 100, p50 p99", WindowNode, {"window": "sliding", "size": 100, "field": "payload.value",
+                                              "key": "payload.sensor", "percentiles": [50, 99]}),
+        ("sliding 1 s, mean", WindowNode, {"window": "sliding", "size": 1_024, "duration_ms": 1_000,
+                                           "field": "payload.value", "key": "payload.sensor", "aggregates": ["mean"]})
+    ]
+    seconds = _NUM_MESSAGES / _RATE
+    print(f"{_NUM_MESSAGES:,} messages at {_RATE:,} Hz over {seconds:.0f} s from {_NUM_SENSORS} sensors")
+    print(f"{'node':<28}{'ns/msg':>9}{'passed':>9}{'out Hz':>9}")
+    for name, node_class, config in cases:
+        node = node_class(["out"], config)
+        node.add_child("out", "sink")
+        nanoseconds, passed = _measure(node, messages)
+        print(f"{name:<28}{nanoseconds:>9,.0f}{passed:>9,}{passed / seconds:>9,.1f}")
+
+    for size in (100, 1_024):
+        config = {"window": "sliding", "size": size, "field": "payload.value", "key": "payload.sensor"}
+        print(f"window of {size:,} samples: {_bytes_per_key(config):,.0f} bytes per key")
+
+    windows = _published_windows(messages)
+    counts = sum(window["count"] for window in windows)
+    print(f"published {len(windows)} windows as JSON, aggregating {counts:,} messages")
+
+
+if __name__ == '__main__':
+    main()
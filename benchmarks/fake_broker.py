@@ -0,0 +1,240 @@
+"""
+Fake Broker Module
+==================
+
+A minimal in-process MQTT 3.1.1 broker for benchmarks. It accepts connections, acknowledges publishes at QoS 0, 1
+and 2, forwards them to matching subscribers (delivered at QoS 0) and counts what it received, keeping the latest
+payloads for checks of what was published. It can also inject messages itself at a fixed rate. It is not a
+conforming broker: there are no sessions, retained messages or wills.
+
+"""
+
+import time
+import socket
+import collections
+import struct
+import threading
+import socketserver
+
+from mycellium.topics import topic_matches
+
+_CONNECT = 1
+_CONNACK = 2
+_PUBLISH = 3
+_PUBACK = 4
+_PUBREC = 5
+_PUBREL = 6
+_PUBCOMP = 7
+_SUBSCRIBE = 8
+_SUBACK = 9
+_UNSUBSCRIBE = 10
+_UNSUBACK = 11
+_PINGREQ = 12
+_PINGRESP = 13
+_DISCONNECT = 14
+
+
+def _encode_length(length: int) -> bytes:
+    encoded = bytearray()
+    while True:
+        byte = length % 128
+        length //= 128
+        encoded.append(byte | 0x80 if length > 0 else byte)
+        if length == 0:
+            return bytes(encoded)
+
+
+def _encode_string(value: str) -> bytes:
+    encoded = value.encode()
+    return struct.pack("!H", len(encoded)) + encoded
+
+
+def _packet(packet_type: int, flags: int, body: bytes) -> bytes:
+    return bytes((packet_type << 4 | flags,)) + _encode_length(len(body)) + body
+
+
+def publish_packet(topic: str, payload: bytes) -> bytes:
+    return _packet(_PUBLISH, 0, _encode_string(topic) + payload)
+
+
+class _Session(socketserver.BaseRequestHandler):
+    server: "_Server"
+
+    def setup(self) -> None:
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.__send_lock = threading.Lock()
+        self.__filters: list[str] = []
+
+    def send(self, data: bytes) -> None:
+        with self.__send_lock:
+            self.request.sendall(data)
+
+    def wants(self, topic: str) -> bool:
+        return any(topic_matches(topic_filter, topic) for topic_filter in self.__filters)
+
+    def handle(self) -> None:
+        reader = self.request.makefile("rb")
+        try:
+            while True:
+                header = reader.read(1)
+                if not header:
+                    return
+                length, multiplier = 0, 1
+                while True:
+                    byte = reader.read(1)[0]
+                    length += (byte & 0x7F) * multiplier
+                    multiplier *= 128
+                    if byte & 0x80 == 0:
+                        break
+                body = reader.read(length)
+                if not self.__dispatch(header[0] >> 4, header[0] & 0x0F, body):
+                    return
+        except (ConnectionError, OSError, IndexError):
+            return
+        finally:
+            self.server.detach(self)
+
+    def __dispatch(self, packet_type: int, flags: int, body: bytes) -> bool:
+        match packet_type:
+            case 1:  # CONNECT
+                self.server.attach(self)
+                self.send(_packet(_CONNACK, 0, b"\x00\x00"))
+            case 3:  # PUBLISH
+                qos = (flags >> 1) & 0x03
+                topic_length = struct.unpack_from("!H", body)[0]
+                topic = body[2:2 + topic_length].decode()
+                offset = 2 + topic_length
+                if qos > 0:
+                    packet_id = body[offset:offset + 2]
+                    offset += 2
+                    self.send(_packet(_PUBACK if qos == 1 else _PUBREC, 0, packet_id))
+                self.server.route(topic, body[offset:])
+            case 6:  # PUBREL
+                self.send(_packet(_PUBCOMP, 0, body[:2]))
+            case 8:  # SUBSCRIBE
+                offset, granted = 2, bytearray()
+                while offset < len(body):
+                    topic_length = struct.unpack_from("!H", body, offset)[0]
+                    self.__filters.append(body[offset + 2:offset + 2 + topic_length].decode())
+                    offset += 3 + topic_length
+                    granted.append(0)
+                self.send(_packet(_SUBACK, 0, body[:2] + bytes(granted)))
+            case 10:  # UNSUBSCRIBE
+                offset = 2
+                while offset < len(body):
+                    topic_length = struct.unpack_from("!H", body, offset)[0]
+                    topic_filter = body[offset + 2:offset + 2 + topic_length].decode()
+                    if topic_filter in self.__filters:
+                        self.__filters.remove(topic_filter)
+                    offset += 2 + topic_length
+                self.send(_packet(_UNSUBACK, 0, body[:2]))
+            case 12:  # PINGREQ
+                self.send(_packet(_PINGRESP, 0, b""))
+            case 14:  # DISCONNECT
+                return False
+        return True
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    request_queue_size = 1024
+
+    def __init__(self, address: tuple[str, int]) -> None:
+        super().__init__(address, _Session)
+        self.sessions: list[_Session] = []
+        self.sessions_lock = threading.Lock()
+        self.received = 0
+        self.received_lock = threading.Lock()
+        self.payloads: collections.deque[tuple[str, bytes]] = collections.deque(maxlen=1_024)
+
+    def attach(self, session: _Session) -> None:
+        with self.sessions_lock:
+            self.sessions.append(session)
+
+    def detach(self, session: _Session) -> None:
+        with self.sessions_lock:
+            if session in self.sessions:
+                self.sessions.remove(session)
+
+    def route(self, topic: str, payload: bytes) -> None:
+        with self.received_lock:
+            self.received += 1
+            self.payloads.append((topic, payload))
+        self.deliver(topic, payload)
+
+    def deliver(self, topic: str, payload: bytes) -> int:
+        with self.sessions_lock:
+            subscribers = [session for session in self.sessions if session.wants(topic)]
+        if not subscribers:
+            return 0
+        packet = publish_packet(topic, payload)
+        for session in subscribers:
+            try:
+                session.send(packet)
+            except OSError:
+                pass
+        return len(subscribers)
+
+
+class FakeBroker:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0) -> None:
+        self.__server = _Server((host, port))
+        self.__thread = threading.Thread(target=self.__server.serve_forever, daemon=True)
+
+    @property
+    def host(self) -> str:
+        return self.__server.server_address[0]
+
+    @property
+    def port(self) -> int:
+        return self.__server.server_address[1]
+
+    @property
+    def received(self) -> int:
+        return self.__server.received
+
+    def payloads(self, topic: str) -> list[bytes]:
+        # The latest payloads received on the topic, up to the last 1,024 received on any topic.
+        with self.__server.received_lock:
+            return [payload for received_topic, payload in self.__server.payloads if received_topic == topic]
+
+    def start(self) -> "FakeBroker":
+        self.__thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.__server.shutdown()
+        self.__server.server_close()
+
+    def subscribers(self, topic: str) -> int:
+        with self.__server.sessions_lock:
+            return sum(1 for session in self.__server.sessions if session.wants(topic))
+
+    def wait_for_subscriber(self, topic: str, timeout: float = 5.0) -> bool:
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            with self.__server.sessions_lock:
+                if any(session.wants(topic) for session in self.__server.sessions):
+                    return True
+            time.sleep(0.01)
+        return False
+
+    def wait_for_received(self, count: int, timeout: float = 30.0) -> bool:
+        deadline = time.monotonic() + timeout
+        while self.__server.received < count and time.monotonic() < deadline:
+            time.sleep(0.001)
+        return self.__server.received >= count
+
+    def inject(self, topic: str, payloads: list[bytes], rate: None | float = None) -> float:
+        # Deliver payloads to the subscribers of the topic, paced at `rate` messages per second if given, and
+        # return the achieved injection rate.
+        interval = 0.0 if rate is None else 1.0 / rate
+        start_time = time.perf_counter()
+        for position, payload in enumerate(payloads):
+            if interval:
+                delay = start_time + position * interval - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            self.__server.deliver(topic, payload)
+        return len(payloads) / max(time.perf_counter() - start_time, 1e-9)
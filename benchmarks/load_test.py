@@ -0,0 +1,251 @@
+"""
+Load Test
+=========
+
+Drives the whole ingest to execute path: an in-process fake broker publishes a scripted payload stream to an
+``MQTTIngestor`` process, which dispatches tasks to ``Executor`` processes that run a generated pipeline of
+configurable width, depth and node mix. Reports per scenario the throughput, the p50, p99 and p99.9 latency from
+ingestion to the end of the pipeline, the CPU time per message of the ingestor and executors, and their resident
+memory, and writes the results as JSON so that runs of different commits can be compared.
+
+Latencies come from the end-to-end histograms of ``mycellium.metrics``, whose buckets overestimate a percentile by
+at most 12.5%. CPU time and memory are read from ``/proc`` and therefore require Linux.
+
+    python -m benchmarks.load_test --output before.json
+    python -m benchmarks.load_test --output after.json --baseline before.json
+    python -m benchmarks.load_test --width 8 --depth 2 --mix switch=3,forward=1 --payload reading --messages 50000
+
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import subprocess
+import multiprocessing
+from dataclasses import dataclass, asdict
+
+from mycellium import storage
+from mycellium.ingestion import MQTTIngestor
+from mycellium.metrics import MetricsStore, configure_metrics
+from mycellium.pipelining import Dispatcher, Executor
+
+from .fake_broker import FakeBroker
+from .pipelines import mixed_structure, register_nodes
+
+_TOPIC = "bench/load"
+
+
+def _number_stream(num_messages: int) -> list[bytes]:
+    return [str(sequence % 100).encode() for sequence in range(num_messages)]
+
+
+def _reading_stream(num_messages: int) -> list[bytes]:
+    return [json.dumps({"sensor": sequence % 16, "value": sequence % 100, "unit": "C"}).encode()
+            for sequence in range(num_messages)]
+
+
+def _large_stream(num_messages: int) -> list[bytes]:
+    padding = "x" * 4_096
+    return [json.dumps({"sensor": sequence % 16, "value": sequence % 100, "padding": padding}).encode()
+            for sequence in range(num_messages)]
+
+
+# Payload streams by name, with the payload field switches compare. Payloads are decoded as JSON.
+_STREAMS = {
+    "number": (_number_stream, None),
+    "reading": (_reading_stream, "payload.value"),
+    "large": (_large_stream, "payload.value")
+}
+
+
+@dataclass(frozen=True)
+class Scenario:
+    name: str
+    width: int = 4
+    depth: int = 4
+    mix: str = "switch=1"
+    payload: str = "number"
+    messages: int = 20_000
+    # Messages per second injected by the broker, as fast as it can when 0.
+    rate: float = 0.0
+    executors: int = 2
+    transport: str = "queue"
+    batch_size: int = 1
+
+    def node_mix(self) -> dict[str, int]:
+        mix = {}
+        for entry in self.mix.split(","):
+            kind, _, weight = entry.partition("=")
+            mix[kind.strip()] = int(weight or 1)
+        return mix
+
+
+_SUITE = [
+    Scenario("forward chain", width=1, depth=8, mix="forward=1", payload="number"),
+    Scenario("switch fan-out", width=8, depth=1, mix="switch=1", payload="reading"),
+    Scenario("mixed", width=4, depth=4, mix="switch=2,forward=1,debug=1", payload="reading"),
+    Scenario("large payloads", width=2, depth=2, mix="switch=1,forward=1", payload="large", messages=10_000),
+    # Paced well below saturation, so that latencies are those of an idle system rather than of a queue backlog.
+    Scenario("mixed paced", width=4, depth=4, mix="switch=2,forward=1,debug=1", payload="reading", messages=10_000,
+             rate=2_000),
+    Scenario("shared memory", width=4, depth=4, mix="switch=2,forward=1,debug=1", payload="reading",
+             transport="shared_memory")
+]
+
+
+def _cpu_seconds(pid: int) -> float:
+    # User and system time from /proc/<pid>/stat, whose fields after the command name start with the state.
+    with open(f"/proc/{pid}/stat") as stat:
+        fields = stat.read().rpartition(")")[2].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+def _rss_mib(pid: int) -> float:
+    with open(f"/proc/{pid}/status") as status:
+        for line in status:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def _completed(store: MetricsStore, pipeline_id: int) -> int:
+    series = store.summary().get(f"mycellium_pipeline_seconds{{pipeline=\"{pipeline_id}\"}}")
+    return 0 if series is None else series["count"]
+
+
+def run(broker: FakeBroker, scenario: Scenario, timeout: float = 120.0) -> dict:
+    stream, field = _STREAMS[scenario.payload]
+    payloads = stream(scenario.messages)
+    structure = mixed_structure(scenario.width, scenario.depth, scenario.node_mix(), field=field)
+    pipeline = storage.create_pipeline(structure)
+    workspace = storage.create_workspace(name=scenario.name)
+    client = storage.create_client(workspace_id=workspace.id, broker_host=broker.host, broker_port=broker.port)
+    storage.create_subscription(client_id=client.id, topic=_TOPIC, qos=0, pipeline_id=pipeline.id, encoding="json")
+
+    # Metrics are published often, so that the end of the run is noticed soon after it happens.
+    store = MetricsStore(max_processes=scenario.executors + 1, publish_interval=0.05)
+    configure_metrics(store)
+    stop_event = multiprocessing.Event()
+    buffer_size = 16 * 1024 * 1024 if scenario.transport == "shared_memory" else 0
+    dispatcher = Dispatcher(scenario.executors, buffer_size=buffer_size)
+    ingestor = MQTTIngestor(stop_event, dispatcher, clients=[client])
+    executors = [Executor(stop_event, task_queue, batch_size=scenario.batch_size) for task_queue in dispatcher.queues]
+    processes = [ingestor, *executors]
+    try:
+        for process in processes:
+            process.start()
+        broker.wait_for_subscriber(_TOPIC)
+        # Let the executors compile the pipeline before timing, as they would in a long running deployment.
+        time.sleep(0.5)
+
+        cpu_seconds = sum(_cpu_seconds(process.pid) for process in processes)
+        start_time = time.perf_counter()
+        injected_rate = broker.inject(_TOPIC, payloads, rate=scenario.rate or None)
+        deadline = time.monotonic() + timeout
+        completed = 0
+        while completed < scenario.messages and time.monotonic() < deadline:
+            time.sleep(0.01)
+            completed = _completed(store, pipeline.id)
+        elapsed = time.perf_counter() - start_time
+        cpu_seconds = sum(_cpu_seconds(process.pid) for process in processes) - cpu_seconds
+        rss_mib = sum(_rss_mib(process.pid) for process in processes)
+        latency = store.summary().get(f"mycellium_end_to_end_seconds{{pipeline=\"{pipeline.id}\"}}", {})
+    finally:
+        stop_event.set()
+        for process in processes:
+            process.join()
+        dispatcher.close()
+        configure_metrics(None)
+        store.close()
+        store.unlink()
+
+    return {
+        "scenario": asdict(scenario),
+        "nodes": len(structure["nodes"]),
+        "completed": completed,
+        "injected_per_second": injected_rate,
+        "messages_per_second": completed / elapsed,
+        "p50_ms": latency.get("p50", 0.0) * 1_000,
+        "p99_ms": latency.get("p99", 0.0) * 1_000,
+        "p999_ms": latency.get("p99.9", 0.0) * 1_000,
+        "cpu_us_per_message": cpu_seconds / max(completed, 1) * 1e6,
+        "rss_mib": rss_mib
+    }
+
+
+def _environment() -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "timestamp": time.time()
+    }
+
+
+def _print_results(results: list[dict], baseline: dict[str, dict]) -> None:
+    print(f"{'scenario':<16}{'nodes':>6}{'msg/s':>10}{'p50 ms':>9}{'p99 ms':>9}{'p99.9 ms':>10}{'cpu us/msg':>12}"
+          f"{'rss MiB':>9}{'vs baseline':>13}")
+    for result in results:
+        name = result["scenario"]["name"]
+        comparison = ""
+        if name in baseline:
+            comparison = f"{result['messages_per_second'] / baseline[name]['messages_per_second']:.2f}x"
+        print(f"{name:<16}{result['nodes']:>6}{result['messages_per_second']:>10,.0f}{result['p50_ms']:>9.2f}"
+              f"{result['p99_ms']:>9.2f}{result['p999_ms']:>10.2f}{result['cpu_us_per_message']:>12.1f}"
+              f"{result['rss_mib']:>9.1f}{comparison:>13}")
+        if result["completed"] < result["scenario"]["messages"]:
+            print(f"  only {result['completed']} of {result['scenario']['messages']} messages completed")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Load test of the ingest to execute path.")
+    parser.add_argument("--width", type=int, help="chains the root node fans out to, runs the suite when omitted")
+    parser.add_argument("--depth", type=int, default=4, help="nodes per chain")
+    parser.add_argument("--mix", default="switch=1", help="weighted node kinds, e.g. switch=2,forward=1,debug=1")
+    parser.add_argument("--payload", default="number", choices=sorted(_STREAMS))
+    parser.add_argument("--messages", type=int, default=20_000)
+    parser.add_argument("--rate", type=float, default=0.0, help="messages per second, unpaced when 0")
+    parser.add_argument("--executors", type=int, default=2)
+    parser.add_argument("--transport", default="queue", choices=["queue", "shared_memory"])
+    parser.add_argument("--batch-size", type=int, default=1)
+    parser.add_argument("--output", help="file to write the results to as JSON")
+    parser.add_argument("--baseline", help="results of an earlier run to compare throughput with")
+    arguments = parser.parse_args()
+
+    if arguments.width is None:
+        scenarios = _SUITE
+    else:
+        scenarios = [Scenario("custom", width=arguments.width, depth=arguments.depth, mix=arguments.mix,
+                              payload=arguments.payload, messages=arguments.messages, rate=arguments.rate,
+                              executors=arguments.executors, transport=arguments.transport,
+                              batch_size=arguments.batch_size)]
+    baseline = {}
+    if arguments.baseline:
+        with open(arguments.baseline) as file:
+            baseline = {result["scenario"]["name"]: result for result in json.load(file)["results"]}
+
+    register_nodes()
+    broker = FakeBroker().start()
+    try:
+        results = [run(broker, scenario) for scenario in scenarios]
+    finally:
+        broker.stop()
+    _print_results(results, baseline)
+
+    if arguments.output:
+        with open(arguments.output, "w") as file:
+            json.dump({"environment": _environment(), "results": results}, file, indent=2)
+        print(f"Results written to {arguments.output}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
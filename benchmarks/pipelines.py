@@ -0,0 +1,97 @@
+"""
+Synthetic Pipelines Module
+==========================
+
+Generators for pipeline structures of configurable shape. Every node of the layered structures is a single port
+switch that lets numeric payloads through, so they exercise graph traversal rather than node side effects. Mixed
+structures draw their nodes from a weighted mix of switches, forwarding nodes and debug nodes instead.
+
+"""
+
+import random
+
+from mycellium.pipelining import nodes
+from mycellium.pipelining.message import Message
+
+# Node kinds of mixed structures.
+NODE_KINDS = ("switch", "forward", "debug")
+
+
+class ForwardingNode(nodes.Node):
+    # Passes its input on unchanged, without decoding it.
+    blocking = False
+
+    def __init__(self, output_ports: list[str], config: dict) -> None:
+        super().__init__(output_ports)
+
+    def process(self, message: Message) -> tuple[set[str], Message]:
+        return self.children, message
+
+
+def register_nodes() -> None:
+    # Makes the forwarding node buildable from structures, in this process and the processes it forks afterwards.
+    nodes._types["forward"] = ForwardingNode
+
+
+def _pass_node(field: None | str = None) -> dict:
+    condition = {"comparison": "ge", "value": 0}
+    if field is not None:
+        condition["field"] = field
+    return {
+        "output_ports": ["out"],
+        "type": "switch",
+        "config": {
+            "conditions": {
+                "out": condition
+            }
+        }
+    }
+
+
+def _mixed_node(kind: str, field: None | str) -> dict:
+    if kind == "switch":
+        return _pass_node(field)
+    if kind == "forward":
+        return {"output_ports": ["out"], "type": "forward", "config": {}}
+    if kind == "debug":
+        return {"output_ports": ["out"], "type": "debug", "config": {"output": "bench", "show_payload": False}}
+    raise ValueError(f"Unknown node kind '{kind}', expected one of {', '.join(NODE_KINDS)}.")
+
+
+def layered_structure(width: int, depth: int) -> dict:
+    # A root node fans out to `width` chains of `depth` nodes each.
+    nodes = {"root": _pass_node()}
+    connections = []
+    for chain in range(width):
+        parent_label = "root"
+        for level in range(depth):
+            node_label = f"n{chain}_{level}"
+            nodes[node_label] = _pass_node()
+            connections.append({"parent": parent_label, "child": node_label, "port": "out"})
+            parent_label = node_label
+    return {
+        "starting_nodes": ["root"],
+        "nodes": nodes,
+        "connections": connections
+    }
+
+
+def wide_structure(width: int) -> dict:
+    return layered_structure(width=width, depth=1)
+
+
+def deep_structure(depth: int) -> dict:
+    return layered_structure(width=1, depth=depth)
+
+
+def mixed_structure(width: int, depth: int, mix: dict[str, int], field: None | str = None, seed: int = 0) -> dict:
+    # The shape of `layered_structure`, with every node drawn from the node kinds of `mix` in proportion to their
+    # weights. Switches compare `field` of the payload, or the payload itself, and let non-negative values through.
+    # The same seed always draws the same nodes.
+    generator = random.Random(seed)
+    kinds = list(mix)
+    weights = [mix[kind] for kind in kinds]
+    structure = layered_structure(width, depth)
+    for label in structure["nodes"]:
+        structure["nodes"][label] = _mixed_node(generator.choices(kinds, weights)[0], field)
+    return structure
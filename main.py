@@ -3,7 +3,12 @@
 """
 
 
+import os
+import logging
+
 from mycellium import *
+from mycellium.metrics import MetricsStore, configure_metrics, serve_metrics
+from mycellium.storage import configure_storage, CachedRepository, SQLiteRepository
 
 
 def main() -> None:
@@ -11,29 +16,98 @@ def main() -> None:
     # pipeline = build_pipeline(pipeline_structure.structure)
     # message = NodeMessage(payload=3)
     # pipeline.execute(message)
+    logging.basicConfig(level=os.environ.get("MYCELLIUM_LOG_LEVEL", "INFO"),
+                        format="%(asctime)s %(processName)s %(name)s %(levelname)s %(message)s")
+
+    # Persist records in a SQLite database when one is configured, otherwise they only live in memory.
+    database_path = os.environ.get("MYCELLIUM_DATABASE")
+    if database_path is not None:
+        configure_storage(CachedRepository(SQLiteRepository(database_path)))
+
+    # Metrics of all processes are collected in shared memory, and served in the Prometheus text format on a local port
+    # and/or dumped to a JSON file every second when configured.
+    metrics_port = os.environ.get("MYCELLIUM_METRICS_PORT")
+    metrics_file = os.environ.get("MYCELLIUM_METRICS_FILE")
+    metrics_store = MetricsStore() if metrics_port or metrics_file else None
+    configure_metrics(metrics_store)
+    if metrics_port:
+        serve_metrics(metrics_store, int(metrics_port))
+
     num_consumers = 3
+    num_ingestion_processes = 1
 
-    task_queue = multiprocessing.JoinableQueue()
     stop_event = multiprocessing.Event()
 
-    producer = MQTTIngestor(stop_event, task_queue, client_id=0, broker_host="localhost", broker_port=1883)
-    consumers = [Executor(stop_event, task_queue) for _ in range(num_consumers)]
+    # Pipelines dominated by I/O are cheaper to run as coroutines of a single asynchronous executor.
+    asynchronous = os.environ.get("MYCELLIUM_EXECUTOR", "process") == "async"
+    # Every executor consumes a queue of its own, fed with the tasks of the topics, pipelines or payload field values
+    # hashed to it, so that tasks with the same key are executed in order by the same executor.
+    # Tasks are handed over through shared memory ring buffers rather than pickled through pipes unless configured
+    # otherwise. Executors that die are only restarted on ring buffers, which know which tasks each executor got.
+    transport = os.environ.get("MYCELLIUM_TRANSPORT", "shared_memory")
+    buffer_size = 16 * 1024 * 1024 if transport == "shared_memory" else 0
+    # Queues are bounded, by a number of tasks or by the size of their ring buffer, so that memory stays flat when
+    # executors fall behind. Overflow policies are set per QoS level as e.g. "0=sample,1=drop_oldest", QoS levels
+    # without one block ingestion until there is room.
+    overflow = {int(qos): OverflowPolicy(policy.strip()) for qos, _, policy in
+                (entry.partition("=") for entry in os.environ.get("MYCELLIUM_OVERFLOW", "").split(",") if entry)}
+    dispatcher = Dispatcher(1 if asynchronous else num_consumers, key=os.environ.get("MYCELLIUM_SHARD_KEY", "topic"),
+                            field=os.environ.get("MYCELLIUM_SHARD_FIELD"),
+                            maxsize=int(os.environ.get("MYCELLIUM_QUEUE_SIZE", 10_000)), buffer_size=buffer_size,
+                            overflow=overflow, sample_every=int(os.environ.get("MYCELLIUM_SAMPLE_EVERY", 10)))
+    if metrics_store is not None:
+        metrics_store.register_collector(dispatcher.collect_metrics)
+
+    # Messages delivered again, such as QoS 1 redeliveries after a reconnect, are dropped before they are enqueued when
+    # a duplicate filter is configured: "lru" remembers recent messages exactly, "bloom" in a fixed amount of memory.
+    # Messages are keyed by a payload field, such as a message id, when one is set. Messages keyed by their whole payload
+    # are only dropped when the broker flags them as redelivered, so that repeated readings are not.
+    dedup = os.environ.get("MYCELLIUM_DEDUP")
+    duplicate_filter = None
+    if dedup:
+        if dedup not in ("lru", "bloom"):
+            raise ValueError(f"Unknown duplicate filter provided: '{dedup}', expected one of lru, bloom.")
+        filter_class = LRUDuplicateFilter if dedup == "lru" else BloomDuplicateFilter
+        duplicate_filter = filter_class(field=os.environ.get("MYCELLIUM_DEDUP_FIELD"),
+                                        ttl=float(os.environ.get("MYCELLIUM_DEDUP_TTL", 60)),
+                                        capacity=int(os.environ.get("MYCELLIUM_DEDUP_CAPACITY", 100_000)))
+
+    producer = IngestionSupervisor(stop_event, dispatcher, workspace_id=0, num_processes=num_ingestion_processes,
+                                   duplicate_filter=duplicate_filter)
+    # Executors that die are restarted on their queue, which no other executor consumes, or stop every process when
+    # their queue is not a ring buffer.
+    # Process executors take up to a batch of tasks off their queue at once, waiting up to the batch timeout for more,
+    # the asynchronous executor runs up to a number of tasks concurrently.
+    if asynchronous:
+        executor_options = {"max_inflight": int(os.environ.get("MYCELLIUM_MAX_INFLIGHT", 1_000))}
+    else:
+        executor_options = {"batch_size": int(os.environ.get("MYCELLIUM_BATCH_SIZE", 1)),
+                            "batch_timeout_ms": float(os.environ.get("MYCELLIUM_BATCH_TIMEOUT_MS", 0))}
+    consumers = ExecutionSupervisor(stop_event, dispatcher.queues,
+                                    executor_class=AsyncExecutor if asynchronous else Executor,
+                                    executor_options=executor_options)
 
     producer.start()
-    for consumer in consumers:
-        consumer.start()
+    consumers.start()
 
     try:
         while True:
             time.sleep(1)  # Keep the main process running
+            if metrics_file:
+                metrics_store.dump(metrics_file)
     except KeyboardInterrupt:
         print("Stopping processes...")
         stop_event.set()
 
     producer.join()
 
-    for consumer in consumers:
-        consumer.join()
+    consumers.join()
+    dispatcher.close()
+    if metrics_store is not None:
+        if metrics_file:
+            metrics_store.dump(metrics_file)
+        metrics_store.close()
+        metrics_store.unlink()
 
     print("All processes have completed.")
 
@@ -0,0 +1,83 @@
+"""
+Encodings Module
+================
+
+Decoding of raw message payloads according to the encoding configured for the subscription they arrived through.
+MessagePack is supported when the ``msgpack`` package is installed, and JSON is parsed with ``orjson`` when it is.
+
+"""
+
+import json
+from typing import Any, Callable
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+UTF8 = "utf-8"
+JSON = "json"
+MSGPACK = "msgpack"
+
+# The position of an encoding identifies it where payloads are stored in binary form.
+PAYLOAD_ENCODINGS = (UTF8, JSON, MSGPACK)
+
+
+def _decode_utf8(raw: bytes | memoryview) -> str:
+    return str(raw, "utf-8")
+
+
+def parse_json(text: str | bytes | memoryview) -> Any:
+    # orjson parses several times faster than the json module, and views without copying them. What it rejects but
+    # the json module accepts, such as NaN or integers beyond 64 bits, is parsed again by the latter, so that both
+    # accept the same documents. Invalid documents raise a `ValueError`.
+    if orjson is not None:
+        try:
+            return orjson.loads(text)
+        except orjson.JSONDecodeError:
+            pass
+    # The json module only parses bytes and strings, not views.
+    return json.loads(bytes(text) if isinstance(text, memoryview) else text)
+
+
+def dump_json(value: Any) -> bytes:
+    # The counterpart of `parse_json`. What orjson rejects, such as integers beyond 64 bits or dicts with keys that
+    # are not strings, is serialised by the json module instead. orjson writes NaN and infinities as null.
+    if orjson is not None:
+        try:
+            return orjson.dumps(value)
+        except TypeError:
+            pass
+    return json.dumps(value).encode()
+
+
+def _decode_json(raw: bytes | memoryview) -> Any:
+    return parse_json(raw)
+
+
+def _decode_msgpack(raw: bytes | memoryview) -> Any:
+    return msgpack.unpackb(raw)
+
+
+_decoders: dict[str, Callable[[bytes | memoryview], Any]] = {
+    UTF8: _decode_utf8,
+    JSON: _decode_json,
+    MSGPACK: _decode_msgpack
+}
+
+
+def validate_encoding(encoding: str) -> str:
+    if encoding not in _decoders:
+        raise ValueError(f"Unknown payload encoding '{encoding}', expected one of {', '.join(PAYLOAD_ENCODINGS)}.")
+    if encoding == MSGPACK and msgpack is None:
+        raise ValueError("Payload encoding 'msgpack' requires the msgpack package to be installed.")
+    return encoding
+
+
+def payload_decoder(encoding: str) -> Callable[[bytes | memoryview], Any]:
+    return _decoders[validate_encoding(encoding)]
@@ -0,0 +1,34 @@
+"""
+Fields Module
+=============
+
+Lookup of values within decoded payloads by dotted field paths, such as ``payload.sensor.temperature``, shared by the
+nodes, dispatchers and duplicate filters configured with such a path.
+
+"""
+
+from typing import Any, Callable
+
+# What looking up a field a payload does not have yields, as `None` is a value payloads can hold.
+MISSING = object()
+
+
+def field_getter(field: None | str) -> None | Callable[[Any], Any]:
+    # A leading 'payload' level refers to the payload itself, which there is no getter for. Payloads without the
+    # field yield `MISSING`.
+    keys = [] if field is None else field.split(".")
+    if keys and keys[0] == "payload":
+        keys = keys[1:]
+    if not keys:
+        return None
+
+    def get(payload: Any) -> Any:
+        for key in keys:
+            if not isinstance(payload, dict):
+                return MISSING
+            payload = payload.get(key, MISSING)
+            if payload is MISSING:
+                return MISSING
+        return payload
+
+    return get
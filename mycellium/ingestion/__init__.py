@@ -2,4 +2,6 @@
 
 """
 
+from .dedup import *
 from .mqtt import *
+from .supervisor import *
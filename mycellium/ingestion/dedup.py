@@ -0,0 +1,240 @@
+""" dedup.py
+
+"""
+
+import sys
+import json
+import math
+import time
+import hashlib
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+from ..encodings import parse_json
+from ..fields import MISSING, field_getter
+
+
+# Messages are remembered by a digest of this many bytes, so that every entry of a filter takes the same memory.
+_KEY_SIZE = 16
+
+# Memory of an entry of an LRU filter besides what the ordered dict reports for its table and link nodes: its key and
+# its expiry.
+_LRU_ENTRY_SIZE = sys.getsizeof(bytes(_KEY_SIZE)) + sys.getsizeof(0.0)
+
+
+class DuplicateFilter(ABC):
+    # Recognizes messages delivered more than once, such as QoS 1 messages a broker redelivers after a reconnect, so
+    # that ingestors drop them before they are enqueued rather than run their pipelines, and their publishes, again.
+    # Messages are keyed by a digest of their topic and either a field of their JSON payload, such as a message id,
+    # or their whole payload, which also keys the messages whose payload lacks the field.
+    #
+    # Only messages received with at least `min_qos` are remembered, as brokers never redeliver QoS 0 messages. Of
+    # those, a message is only dropped as a duplicate of a remembered one when the broker flagged it as redelivered,
+    # or when it is keyed by the field, which identifies it. Otherwise identical payloads are more likely repeated
+    # readings, such as a sensor publishing the same value twice, and are passed on. Keys are remembered for `ttl`
+    # seconds after they are first seen, and for at most `capacity` messages, so that memory stays bounded. Every
+    # ingestion process filters the messages of its own clients, which their redeliveries arrive through.
+    def __init__(self, field: None | str = None, ttl: float = 60.0, capacity: int = 100_000,
+                 min_qos: int = 1) -> None:
+        if ttl <= 0:
+            raise ValueError(f"Duplicate filter TTL must be positive, got {ttl} s.")
+        if capacity < 1:
+            raise ValueError(f"Duplicate filter capacity must be at least 1 message, got {capacity}.")
+        if min_qos not in (0, 1, 2):
+            raise ValueError(f"Unknown QoS level provided: {min_qos}, expected 0, 1 or 2.")
+        self.__get_field = field_getter(field)
+        self.__ttl = ttl
+        self.__capacity = capacity
+        self.__min_qos = min_qos
+        self.__duplicates = 0
+
+    @property
+    def ttl(self) -> float:
+        return self.__ttl
+
+    @property
+    def capacity(self) -> int:
+        return self.__capacity
+
+    @property
+    def duplicates(self) -> int:
+        return self.__duplicates
+
+    @property
+    @abstractmethod
+    def entries(self) -> int:
+        pass
+
+    @property
+    @abstractmethod
+    def memory_bytes(self) -> int:
+        pass
+
+    @property
+    def stats(self) -> dict[str, int]:
+        return {"duplicates": self.__duplicates, "entries": self.entries, "memory_bytes": self.memory_bytes}
+
+    def is_duplicate(self, topic: str, payload: bytes, qos: int = 1, dup: bool = False,
+                     now: None | float = None) -> bool:
+        # Remembers the message, returning whether it is a duplicate of one remembered already. `dup` is the DUP flag
+        # the message was received with.
+        if qos < self.__min_qos:
+            return False
+        key, identified = self.__key(topic, payload)
+        remembered = self.remember(key, time.monotonic() if now is None else now)
+        if not remembered or not (dup or identified):
+            return False
+        self.__duplicates += 1
+        return True
+
+    def key(self, topic: str, payload: bytes) -> bytes:
+        return self.__key(topic, payload)[0]
+
+    def __key(self, topic: str, payload: bytes) -> tuple[bytes, bool]:
+        # The key of the message, and whether it was keyed by the field.
+        digest = hashlib.blake2b(topic.encode(), digest_size=_KEY_SIZE)
+        if self.__get_field is not None:
+            try:
+                value = self.__get_field(parse_json(payload))
+            except ValueError:
+                value = MISSING
+            if value is not MISSING:
+                # Marked apart from whole payloads, and strings apart from other values, whose text they could equal.
+                # Keys only need to be stable within a process, so scalars are keyed by their representation, which is
+                # cheaper to get than their JSON.
+                if isinstance(value, str):
+                    digest.update(b"\x01")
+                    digest.update(value.encode())
+                else:
+                    digest.update(b"\x02")
+                    digest.update((json.dumps(value, sort_keys=True) if isinstance(value, (dict, list))
+                                   else repr(value)).encode())
+                return digest.digest(), True
+        digest.update(b"\x00")
+        digest.update(payload)
+        return digest.digest(), False
+
+    @abstractmethod
+    def remember(self, key: bytes, now: float) -> bool:
+        # Remembers a key at a monotonic time, returning whether it was remembered already. Remembering a key again
+        # does not extend how long it is remembered for.
+        pass
+
+
+class LRUDuplicateFilter(DuplicateFilter):
+    # Remembers the keys of the latest `capacity` messages exactly, each until `ttl` seconds after it was first seen.
+    # Keys are kept in the order they expire in, which is the order they were first seen in, so expired and oldest
+    # keys are both evicted from the front.
+    def __init__(self, field: None | str = None, ttl: float = 60.0, capacity: int = 100_000,
+                 min_qos: int = 1) -> None:
+        super().__init__(field=field, ttl=ttl, capacity=capacity, min_qos=min_qos)
+        self.__expiries: OrderedDict[bytes, float] = OrderedDict()
+        self.__evicted = 0
+
+    @property
+    def entries(self) -> int:
+        return len(self.__expiries)
+
+    @property
+    def memory_bytes(self) -> int:
+        return sys.getsizeof(self.__expiries) + len(self.__expiries) * _LRU_ENTRY_SIZE
+
+    @property
+    def evicted(self) -> int:
+        # Keys evicted before they expired, which duplicates of would pass the filter.
+        return self.__evicted
+
+    def remember(self, key: bytes, now: float) -> bool:
+        expiries = self.__expiries
+        while expiries:
+            oldest_key = next(iter(expiries))
+            if expiries[oldest_key] > now:
+                break
+            del expiries[oldest_key]
+
+        if key in expiries:
+            return True
+        expiries[key] = now + self.ttl
+        if len(expiries) > self.capacity:
+            expiries.popitem(last=False)
+            self.__evicted += 1
+        return False
+
+
+class BloomDuplicateFilter(DuplicateFilter):
+    # Remembers keys in two Bloom filters of a fixed size, sized for `capacity` keys each at the given false
+    # positive rate, so that memory stays the same however many distinct messages arrive. Keys are added to the
+    # current filter and looked up in both. The current filter becomes the previous one, and a cleared filter the
+    # current one, every `ttl` seconds or once it holds `capacity` keys, so keys are remembered for between one and
+    # two TTLs. A false positive drops a message that is not a duplicate, which happens at up to twice the given
+    # rate while both filters are full.
+    def __init__(self, field: None | str = None, ttl: float = 60.0, capacity: int = 1_000_000,
+                 error_rate: float = 0.001, min_qos: int = 1) -> None:
+        super().__init__(field=field, ttl=ttl, capacity=capacity, min_qos=min_qos)
+        if not 0 < error_rate < 1:
+            raise ValueError(f"Bloom filter error rate must be within (0, 1), got {error_rate}.")
+        self.__bits = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.__num_hashes = max(1, round(self.__bits / capacity * math.log(2)))
+        self.__current = bytearray((self.__bits + 7) // 8)
+        self.__previous = bytearray((self.__bits + 7) // 8)
+        self.__added = 0
+        self.__previously_added = 0
+        self.__rotation: None | float = None
+
+    @property
+    def entries(self) -> int:
+        return self.__added + self.__previously_added
+
+    @property
+    def memory_bytes(self) -> int:
+        return sys.getsizeof(self.__current) + sys.getsizeof(self.__previous)
+
+    def remember(self, key: bytes, now: float) -> bool:
+        if self.__rotation is None:
+            self.__rotation = now + self.ttl
+        elif now >= self.__rotation or self.__added >= self.capacity:
+            self.__rotate(now)
+
+        # Positions by double hashing, with the halves of the digest as the two hashes, stepped through without
+        # reducing a growing multiple of the step. Keys found in either filter are not added to the current one, which
+        # would remember them for longer.
+        bits = self.__bits
+        start = int.from_bytes(key[:_KEY_SIZE // 2], "little") % bits
+        step = int.from_bytes(key[_KEY_SIZE // 2:], "little") % bits or 1
+        current = self.__current
+        previous = self.__previous
+        in_current = True
+        in_previous = True
+        position = start
+        for _ in range(self.__num_hashes):
+            index = position >> 3
+            bit = 1 << (position & 7)
+            if in_current and not current[index] & bit:
+                in_current = False
+            if in_previous and not previous[index] & bit:
+                in_previous = False
+            if not in_current and not in_previous:
+                break
+            position += step
+            if position >= bits:
+                position -= bits
+        if in_current or in_previous:
+            return True
+
+        position = start
+        for _ in range(self.__num_hashes):
+            current[position >> 3] |= 1 << (position & 7)
+            position += step
+            if position >= bits:
+                position -= bits
+        self.__added += 1
+        return False
+
+    def __rotate(self, now: float) -> None:
+        # After more than a TTL without a rotation, the current filter holds nothing recent enough to keep either.
+        expired = now >= self.__rotation + self.ttl
+        self.__previous = bytearray(len(self.__current)) if expired else self.__current
+        self.__previously_added = 0 if expired else self.__added
+        self.__current = bytearray(len(self.__previous))
+        self.__added = 0
+        self.__rotation = now + self.ttl
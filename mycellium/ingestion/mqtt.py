@@ -4,80 +4,322 @@
 
 
 from ..storage import *
+from ..metrics import current_metrics
+from ..pipelining.task import Task
+from .dedup import DuplicateFilter
 
 import time
-import random
+import queue
+import logging
+import selectors
+import dataclasses
 import multiprocessing
+from collections import deque
 import paho.mqtt.client as mqtt
 
 
-class MQTTIngestor(multiprocessing.Process):
-    def __init__(self, stop_event: multiprocessing.Event, task_queue: multiprocessing.JoinableQueue, client_id: int, broker_host: str, broker_port: int) -> None:
-        super().__init__()
+_logger = logging.getLogger(__name__)
 
-        self.__task_queue = task_queue
-        self.__stop_event = stop_event
+_MIN_RETRY_DELAY = 1.0
+_MAX_RETRY_DELAY = 30.0
+# How often connection attempts, keepalives and the stop event are serviced.
+_SERVICE_INTERVAL = 0.25
+# How often sessions paused on a full queue retry enqueuing their backlog.
+_BACKLOG_INTERVAL = 0.005
 
-        self.__client_id = client_id
-        self.__broker_host = broker_host
-        self.__broker_port = broker_port
-        self.__client: None | mqtt.Client = None
-        self.__is_connected = False
 
-    def run(self) -> None:
-        self.__client = mqtt.Client()
+class _MQTTSession:
+    # A single broker connection driven by the external event loop of the ingestion process it belongs to, rather
+    # than by a network thread of its own.
+    #
+    # Tasks are enqueued without blocking. When the queue is full and its overflow policy is to block, the session
+    # keeps the tasks of the messages it has read as a backlog and stops reading from its socket, so that the broker
+    # and TCP hold back further messages, while the other clients of the process and keepalives are still serviced.
+    # Reading resumes once the backlog is enqueued.
+    #
+    # With a duplicate filter, messages delivered again are dropped before they are routed.
+    def __init__(self, client_record: ClientRecord, task_queue: multiprocessing.JoinableQueue,
+                 selector: selectors.BaseSelector, paused_sessions: set["_MQTTSession"],
+                 duplicate_filter: None | DuplicateFilter = None) -> None:
+        self.__client_id = client_record.id
+        self.__task_queue = task_queue
+        self.__duplicate_filter = duplicate_filter
+        self.__selector = selector
+        self.__paused_sessions = paused_sessions
+        self.__backlog: deque[Task] = deque()
+        recorder = current_metrics()
+        self.__metrics = None if recorder is None else recorder.ingestor(client_record.id)
 
+        self.__client = mqtt.Client()
         self.__client.on_connect = self.__on_connect
         self.__client.on_message = self.__on_message
+        self.__client.on_socket_open = self.__on_socket_open
+        self.__client.on_socket_close = self.__on_socket_close
+        self.__client.on_socket_register_write = self.__on_socket_register_write
+        self.__client.on_socket_unregister_write = self.__on_socket_unregister_write
+        self.__client.connect_async(client_record.broker_host, client_record.broker_port)
+
+        # Topic filters the broker has been asked to deliver, with their QoS.
+        self.__subscribed: dict[str, int] = {}
+
+        self.__socket = None
+        self.__wants_write = False
+        self.__has_socket = False
+        self.__is_connected = False
+        self.__retry_delay = _MIN_RETRY_DELAY
+        self.__next_attempt = 0.0
+
+    @property
+    def client_id(self) -> int:
+        return self.__client_id
+
+    @property
+    def is_connected(self) -> bool:
+        return self.__is_connected
+
+    @property
+    def is_paused(self) -> bool:
+        return bool(self.__backlog)
 
-        self.__client.connect(self.__broker_host, self.__broker_port)
+    def service(self, now: float) -> None:
+        # (Re)connect once the retry delay has passed, otherwise let paho send keepalives.
+        if self.__has_socket:
+            self.__client.loop_misc()
+        elif now >= self.__next_attempt:
+            try:
+                self.__client.reconnect()
+            except OSError as error:
+                _logger.warning("Client '%s' could not connect (%s), retrying in %s s", self.__client_id, error,
+                                self.__retry_delay)
+                self.__schedule_retry(now)
 
-        # Start the client's event loop on a new thread.
-        self.__client.loop_start()
+    def handle(self, mask: int) -> None:
+        if mask & selectors.EVENT_READ:
+            self.__client.loop_read()
+        if mask & selectors.EVENT_WRITE and self.__has_socket:
+            self.__client.loop_write()
 
+    def close(self) -> None:
+        if self.__has_socket:
+            self.__client.disconnect()
+            self.__client.loop_write()
+        self.__is_connected = False
+
+    def __schedule_retry(self, now: float) -> None:
+        self.__next_attempt = now + self.__retry_delay
+        self.__retry_delay = min(self.__retry_delay * 2, _MAX_RETRY_DELAY)
+
+    def enqueue_backlog(self) -> None:
+        # Tasks are stamped as enqueued when they actually are, so that their time in the backlog counts as ingestion.
+        while self.__backlog:
+            task = dataclasses.replace(self.__backlog[0], enqueued=time.time())
+            try:
+                self.__task_queue.put(task, block=False)
+            except queue.Full:
+                return
+            self.__backlog.popleft()
+            self.__record_enqueued(task)
+        self.__paused_sessions.discard(self)
+        self.__update_registration()
+
+    def __enqueue(self, task: Task) -> None:
+        if self.__backlog:
+            self.__backlog.append(task)
+            return
         try:
-            while not self.__stop_event.is_set():
-                pass
-        except KeyboardInterrupt:
-            pass
-        print(f"Exiting client {self.__client_id}...")
+            self.__task_queue.put(task, block=False)
+        except queue.Full:
+            self.__backlog.append(task)
+            self.__paused_sessions.add(self)
+            self.__update_registration()
+            if self.__metrics is not None:
+                self.__metrics.pauses.add()
+            return
+        self.__record_enqueued(task)
+
+    def __record_enqueued(self, task: Task) -> None:
+        if self.__metrics is not None:
+            self.__metrics.enqueued.add()
+            self.__metrics.ingest_to_enqueue.record(time.time() - task.timestamp)
 
-        # Stop the client's event loop before exiting
-        self.__client.loop_stop()
+    def __update_registration(self) -> None:
+        # Watch the socket for reads unless paused, and for writes while paho has data to send.
+        if self.__socket is None:
+            return
+        events = (0 if self.__backlog else selectors.EVENT_READ) | (selectors.EVENT_WRITE if self.__wants_write else 0)
+        registered = self.__socket in self.__selector.get_map()
+        if not events:
+            if registered:
+                self.__selector.unregister(self.__socket)
+        elif registered:
+            self.__selector.modify(self.__socket, events, self)
+        else:
+            self.__selector.register(self.__socket, events, self)
+
+    def __on_socket_open(self, client: mqtt.Client, userdata, sock) -> None:
+        self.__socket = sock
+        self.__wants_write = False
+        self.__update_registration()
+        self.__has_socket = True
+
+    def __on_socket_close(self, client: mqtt.Client, userdata, sock) -> None:
+        try:
+            self.__selector.unregister(sock)
+        except (KeyError, ValueError):
+            pass
+        self.__socket = None
+        self.__has_socket = False
         self.__is_connected = False
+        self.__schedule_retry(time.monotonic())
+
+    def __on_socket_register_write(self, client: mqtt.Client, userdata, sock) -> None:
+        self.__wants_write = True
+        self.__update_registration()
+
+    def __on_socket_unregister_write(self, client: mqtt.Client, userdata, sock) -> None:
+        self.__wants_write = False
+        self.__update_registration()
 
     def __on_connect(self, client: mqtt.Client, userdata, flags, rc) -> None:
         if rc == 0:
             self.__is_connected = True
-            self.__update_subscriptions()
+            self.__retry_delay = _MIN_RETRY_DELAY
+            # The broker does not keep the subscriptions of a clean session, so all of them are made again.
+            self.__subscribed = {}
+            self.update_subscriptions()
         else:
-            raise RuntimeError(f"Client '{self.__client_id}' connection failed with result code {rc}")
+            # Raising here would take down every other client of the process, so back off and retry instead.
+            _logger.warning("Client '%s' connection failed with result code %s", self.__client_id, rc)
+            self.__client.disconnect()
 
     def __on_message(self, client: mqtt.Client, userdata, message) -> None:
+        timestamp = time.time()
         topic = message.topic
-        payload = message.payload.decode()
-
-        print(f"-> Ingested from topic '{topic}' payload {payload}")
-        subscription = fetch_subscription(client_id=self.__client_id, topic=topic)
-        pipeline_record = fetch_subscription_pipeline(subscription.id)
-        message_data = {
-            "timestamp": time.time(),
-            "payload": payload
-        }
-        task_data = {
-            "message": message_data,
-            "structure": pipeline_record.structure
-        }
-
-        # Add the new task item to the task queue
-        self.__task_queue.put(task_data)
-        time.sleep(random.uniform(0.1, 0.5))
-
-    def __update_subscriptions(self) -> None:
+        payload = message.payload
+        metrics = self.__metrics
+        if metrics is not None:
+            metrics.received.add()
+        _logger.debug("Ingested from topic '%s' payload %r", topic, payload)
+
+        duplicate_filter = self.__duplicate_filter
+        if duplicate_filter is not None and duplicate_filter.is_duplicate(topic, payload, message.qos, message.dup):
+            if metrics is not None:
+                metrics.duplicates.add()
+            return
+
+        # A topic can match several subscriptions through wildcards, each of which feeds its own pipeline.
+        routed = False
+        for subscription in match_subscriptions(client_id=self.__client_id, topic=topic):
+            pipeline_record = fetch_subscription_pipeline(subscription.id)
+            if pipeline_record is None:
+                continue
+            task = Task(
+                pipeline_id=pipeline_record.id,
+                pipeline_version=pipeline_record.version,
+                topic=topic,
+                payload=payload,
+                timestamp=timestamp,
+                encoding=subscription.encoding,
+                enqueued=time.time(),
+                qos=subscription.qos
+            )
+
+            # Add the new task item to the task queue
+            self.__enqueue(task)
+            routed = True
+
+        if not routed and metrics is not None:
+            metrics.unrouted.add()
+
+    def update_subscriptions(self) -> None:
+        # Apply the difference between the stored subscriptions and those of the broker connection. New and changed
+        # topic filters are subscribed to before removed ones are unsubscribed from, so that a filter being replaced
+        # by an overlapping one does not miss messages in between.
         if not self.__is_connected:
             return
 
-        # Add subscriptions to client
-        for subscription in fetch_subscriptions(client_id=self.__client_id):
-            print(f"Subscribed to {subscription}")
-            self.__client.subscribe(topic=subscription.topic, qos=subscription.qos)
+        subscriptions = {subscription.topic: subscription.qos
+                         for subscription in fetch_subscriptions(client_id=self.__client_id)}
+        added = [(topic, qos) for topic, qos in subscriptions.items() if self.__subscribed.get(topic) != qos]
+        removed = [topic for topic in self.__subscribed if topic not in subscriptions]
+
+        if added:
+            _logger.info("Client '%s' subscribing to %d topics", self.__client_id, len(added))
+            self.__client.subscribe(added)
+        if removed:
+            _logger.info("Client '%s' unsubscribing from %d topics", self.__client_id, len(removed))
+            self.__client.unsubscribe(removed)
+        self.__subscribed = subscriptions
+
+
+class MQTTIngestor(multiprocessing.Process):
+    # Multiplexes the MQTT clients assigned to it onto a single selector loop, so that many clients share one process.
+    def __init__(self, stop_event: multiprocessing.Event, task_queue: multiprocessing.JoinableQueue,
+                 clients: list[ClientRecord], duplicate_filter: None | DuplicateFilter = None) -> None:
+        super().__init__()
+
+        self.__task_queue = task_queue
+        self.__stop_event = stop_event
+        self.__clients = clients
+        # Shared by the clients of the process, each process filtering with a copy of its own.
+        self.__duplicate_filter = duplicate_filter
+
+    @property
+    def clients(self) -> list[ClientRecord]:
+        return self.__clients
+
+    @property
+    def duplicate_filter(self) -> None | DuplicateFilter:
+        return self.__duplicate_filter
+
+    def run(self) -> None:
+        selector = selectors.DefaultSelector()
+        recorder = current_metrics()
+        paused_sessions: set[_MQTTSession] = set()
+        sessions = [_MQTTSession(client, self.__task_queue, selector, paused_sessions, self.__duplicate_filter)
+                    for client in self.__clients]
+        filter_gauges = None
+        if recorder is not None and self.__duplicate_filter is not None:
+            filter_gauges = (recorder.gauge("mycellium_duplicate_filter_entries"),
+                             recorder.gauge("mycellium_duplicate_filter_bytes"))
+
+        revision = storage_revision()
+        next_service = 0.0
+        try:
+            while True:
+                now = time.monotonic()
+                if now >= next_service:
+                    if self.__stop_event.is_set():
+                        break
+                    for session in sessions:
+                        session.service(now)
+                    next_service = now + _SERVICE_INTERVAL
+                    if filter_gauges is not None:
+                        filter_gauges[0].set(self.__duplicate_filter.entries)
+                        filter_gauges[1].set(self.__duplicate_filter.memory_bytes)
+
+                    # Pick up subscriptions changed while running
+                    current_revision = storage_revision()
+                    if current_revision != revision:
+                        revision = current_revision
+                        for session in sessions:
+                            session.update_subscriptions()
+
+                # Wait for network events on any of the clients' sockets, or until paused clients retry their backlog
+                timeout = max(next_service - time.monotonic(), 0)
+                if paused_sessions:
+                    timeout = min(timeout, _BACKLOG_INTERVAL)
+                for key, mask in selector.select(timeout=timeout):
+                    key.data.handle(mask)
+                for session in list(paused_sessions):
+                    session.enqueue_backlog()
+        except KeyboardInterrupt:
+            pass
+        _logger.info("Exiting %d clients...", len(self.__clients))
+
+        # Disconnect every client cleanly before exiting
+        for session in sessions:
+            session.close()
+        selector.close()
+        if recorder is not None:
+            recorder.flush()
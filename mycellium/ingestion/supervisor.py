@@ -0,0 +1,77 @@
+""" supervisor.py
+
+"""
+
+import logging
+import threading
+import multiprocessing
+
+from ..storage import ClientRecord, fetch_clients
+from .dedup import DuplicateFilter
+from .mqtt import MQTTIngestor
+
+
+_logger = logging.getLogger(__name__)
+
+
+class IngestionSupervisor:
+    # Spreads the MQTT clients of a workspace over a fixed number of ingestion processes and restarts any process
+    # that dies, so the process count is independent of the number of clients.
+    def __init__(self, stop_event: multiprocessing.Event, task_queue: multiprocessing.JoinableQueue,
+                 workspace_id: int, num_processes: int = 1, check_interval: float = 1.0,
+                 duplicate_filter: None | DuplicateFilter = None) -> None:
+        if num_processes < 1:
+            raise ValueError(f"At least one ingestion process is required, got {num_processes}.")
+        self.__stop_event = stop_event
+        self.__task_queue = task_queue
+        self.__workspace_id = workspace_id
+        self.__num_processes = num_processes
+        self.__check_interval = check_interval
+        self.__duplicate_filter = duplicate_filter
+
+        self.__ingestors: list[MQTTIngestor] = []
+        self.__restarts = 0
+        self.__monitor: None | threading.Thread = None
+
+    @property
+    def ingestors(self) -> list[MQTTIngestor]:
+        return list(self.__ingestors)
+
+    @property
+    def restarts(self) -> int:
+        return self.__restarts
+
+    def start(self) -> None:
+        clients = fetch_clients(self.__workspace_id)
+        for partition in self.__partition(clients):
+            ingestor = MQTTIngestor(self.__stop_event, self.__task_queue, clients=partition,
+                                    duplicate_filter=self.__duplicate_filter)
+            ingestor.start()
+            self.__ingestors.append(ingestor)
+
+        self.__monitor = threading.Thread(target=self.__supervise, name="ingestion-supervisor", daemon=True)
+        self.__monitor.start()
+
+    def join(self) -> None:
+        if self.__monitor is not None:
+            self.__monitor.join()
+        for ingestor in self.__ingestors:
+            ingestor.join()
+
+    def __partition(self, clients: list[ClientRecord]) -> list[list[ClientRecord]]:
+        # Deal the clients out round-robin, never starting more processes than there are clients.
+        partitions = [clients[offset::self.__num_processes] for offset in range(self.__num_processes)]
+        return [partition for partition in partitions if partition]
+
+    def __supervise(self) -> None:
+        while not self.__stop_event.wait(self.__check_interval):
+            for position, ingestor in enumerate(self.__ingestors):
+                if ingestor.is_alive():
+                    continue
+                _logger.warning("Ingestion process %d (%d clients) exited with code %s, restarting...", position,
+                                len(ingestor.clients), ingestor.exitcode)
+                replacement = MQTTIngestor(self.__stop_event, self.__task_queue, clients=ingestor.clients,
+                                           duplicate_filter=self.__duplicate_filter)
+                replacement.start()
+                self.__ingestors[position] = replacement
+                self.__restarts += 1
@@ -0,0 +1,483 @@
+"""
+Metrics Module
+==============
+
+Counters, gauges and latency histograms of the ingestion and execution processes, aggregated through shared memory and
+exposed in the Prometheus text format or as a JSON file.
+
+Every process records into plain Python objects of its own, which a background thread copies into the process's slot
+of a `MetricsStore` once per publish interval, so recording a sample never takes a lock or touches shared memory.
+Metrics are disabled unless a store is configured before the processes are started.
+
+"""
+
+import os
+import json
+import time
+import logging
+import struct
+import marshal
+import threading
+import multiprocessing
+from multiprocessing.shared_memory import SharedMemory
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable
+
+
+_logger = logging.getLogger(__name__)
+
+
+# Histograms count nanosecond samples in buckets of 8 per power of two, so that every bucket is at most 12.5% wide
+# relative to its values, from 1 ns to about 18 minutes. Larger samples are counted in the last bucket.
+_SUB_BUCKET_BITS = 3
+_MAX_BUCKET = (37 << _SUB_BUCKET_BITS) + (1 << _SUB_BUCKET_BITS + 1) - 1
+
+# Sequence number, snapshot length and pid of the process owning a slot, followed by the snapshot. The sequence number
+# is odd while the snapshot is being written.
+_SLOT_HEADER = struct.Struct("<QII")
+
+# Bucket bounds exported to Prometheus, the powers of two from 1.024 us to about 69 s.
+_EXPORTED_BOUNDS = tuple((1 << exponent, repr((1 << exponent) / 1e9)) for exponent in range(10, 37))
+
+
+def _bucket_upper_bound(bucket: int) -> int:
+    # Exclusive upper bound in nanoseconds of the values counted in a bucket.
+    if bucket < 2 << _SUB_BUCKET_BITS:
+        return bucket + 1
+    shift = (bucket >> _SUB_BUCKET_BITS) - 1
+    return ((bucket & (1 << _SUB_BUCKET_BITS) - 1 | 1 << _SUB_BUCKET_BITS) + 1) << shift
+
+
+class Counter:
+    __slots__ = ("value",)
+
+    def __init__(self) -> None:
+        self.value = 0
+
+    def add(self, amount: int = 1) -> None:
+        self.value += amount
+
+
+class Gauge:
+    # A value of the process, such as the memory a cache holds. The gauges of live processes are summed.
+    __slots__ = ("value",)
+
+    def __init__(self) -> None:
+        self.value = 0
+
+    def set(self, value: int | float) -> None:
+        self.value = value
+
+
+class Histogram:
+    __slots__ = ("counts", "sum")
+
+    def __init__(self) -> None:
+        self.counts = [0] * (_MAX_BUCKET + 1)
+        self.sum = 0
+
+    def record_ns(self, nanoseconds: int) -> None:
+        # The bucket is the position of the highest set bit followed by the next three bits.
+        if nanoseconds < 16:
+            bucket = nanoseconds if nanoseconds > 0 else 0
+        else:
+            shift = nanoseconds.bit_length() - 4
+            bucket = (shift << _SUB_BUCKET_BITS) + (nanoseconds >> shift)
+            if bucket > _MAX_BUCKET:
+                bucket = _MAX_BUCKET
+        self.counts[bucket] += 1
+        self.sum += nanoseconds
+
+    def record(self, seconds: float) -> None:
+        self.record_ns(int(seconds * 1e9))
+
+
+class IngestorMetrics:
+    # The metrics of a single MQTT client.
+    __slots__ = ("received", "unrouted", "duplicates", "enqueued", "pauses", "ingest_to_enqueue")
+
+    def __init__(self, recorder: "MetricsRecorder", client_id: int) -> None:
+        labels = (("client", str(client_id)),)
+        self.received = recorder.counter("mycellium_received_messages_total", labels)
+        self.unrouted = recorder.counter("mycellium_unrouted_messages_total", labels)
+        self.duplicates = recorder.counter("mycellium_duplicate_messages_total", labels)
+        self.enqueued = recorder.counter("mycellium_enqueued_tasks_total", labels)
+        self.pauses = recorder.counter("mycellium_read_pauses_total", labels)
+        self.ingest_to_enqueue = recorder.histogram("mycellium_ingest_to_enqueue_seconds", labels)
+
+
+class PipelineMetrics:
+    # The metrics of a single pipeline, across its versions.
+    __slots__ = ("failures", "queue_wait", "duration", "end_to_end")
+
+    def __init__(self, recorder: "MetricsRecorder", pipeline_id: int) -> None:
+        labels = (("pipeline", str(pipeline_id)),)
+        self.failures = recorder.counter("mycellium_pipeline_failures_total", labels)
+        self.queue_wait = recorder.histogram("mycellium_queue_wait_seconds", labels)
+        self.duration = recorder.histogram("mycellium_pipeline_seconds", labels)
+        self.end_to_end = recorder.histogram("mycellium_end_to_end_seconds", labels)
+
+
+class MetricsRecorder:
+    # The metrics of one process. Counters and histograms are created on first use and kept for the lifetime of the
+    # process, so hot paths look them up once and then only update them.
+    def __init__(self, store: "MetricsStore", publish_interval: float) -> None:
+        self.__store = store
+        self.__publish_interval = publish_interval
+        self.__counters: dict[tuple, Counter] = {}
+        self.__gauges: dict[tuple, Gauge] = {}
+        self.__histograms: dict[tuple, Histogram] = {}
+        self.__ingestors: dict[int, IngestorMetrics] = {}
+        self.__pipelines: dict[int, PipelineMetrics] = {}
+        self.__lock = threading.Lock()
+
+        self.__thread = threading.Thread(target=self.__run, name="metrics-publisher", daemon=True)
+        self.__thread.start()
+
+    def counter(self, name: str, labels: tuple[tuple[str, str], ...] = ()) -> Counter:
+        with self.__lock:
+            return self.__counters.setdefault((name, labels), Counter())
+
+    def gauge(self, name: str, labels: tuple[tuple[str, str], ...] = ()) -> Gauge:
+        with self.__lock:
+            return self.__gauges.setdefault((name, labels), Gauge())
+
+    def histogram(self, name: str, labels: tuple[tuple[str, str], ...] = ()) -> Histogram:
+        with self.__lock:
+            return self.__histograms.setdefault((name, labels), Histogram())
+
+    def ingestor(self, client_id: int) -> IngestorMetrics:
+        metrics = self.__ingestors.get(client_id)
+        if metrics is None:
+            metrics = self.__ingestors[client_id] = IngestorMetrics(self, client_id)
+        return metrics
+
+    def pipeline(self, pipeline_id: int) -> PipelineMetrics:
+        metrics = self.__pipelines.get(pipeline_id)
+        if metrics is None:
+            metrics = self.__pipelines[pipeline_id] = PipelineMetrics(self, pipeline_id)
+        return metrics
+
+    def node_histogram(self, pipeline_id: int, node_label: str) -> Histogram:
+        return self.histogram("mycellium_node_seconds", (("pipeline", str(pipeline_id)), ("node", node_label)))
+
+    def snapshot(self) -> dict:
+        # Copying a list or dictionary is atomic, so samples recorded meanwhile are either in or out of the snapshot.
+        with self.__lock:
+            counters = list(self.__counters.items())
+            gauges = list(self.__gauges.items())
+            histograms = list(self.__histograms.items())
+        return {
+            "counters": {key: counter.value for key, counter in counters},
+            "gauges": {key: gauge.value for key, gauge in gauges},
+            "histograms": {
+                key: (histogram.sum, {bucket: count for bucket, count in enumerate(histogram.counts.copy()) if count})
+                for key, histogram in histograms
+            }
+        }
+
+    def flush(self) -> None:
+        self.__store.publish(self.snapshot())
+
+    def __run(self) -> None:
+        while True:
+            time.sleep(self.__publish_interval)
+            self.flush()
+
+
+class MetricsStore:
+    # Shared memory with a slot per process for the snapshots of its metrics. Processes claim a slot when they
+    # first publish their metrics, and keep it when they exit, so that the totals of a restarted process carry on
+    # from those of the process it replaced. Once every slot was claimed, processes take over the slot of a process
+    # that exited, and add its counters and histograms to their own. The store must be created before the processes
+    # are forked.
+    def __init__(self, max_processes: int = 64, slot_size: int = 256 * 1024, publish_interval: float = 1.0) -> None:
+        if max_processes < 1 or slot_size <= _SLOT_HEADER.size:
+            raise ValueError(f"Metrics store requires at least one slot larger than {_SLOT_HEADER.size} bytes, got "
+                             f"{max_processes} slots of {slot_size} bytes.")
+        self.__max_processes = max_processes
+        self.__slot_size = slot_size
+        self.__publish_interval = publish_interval
+        self.__memory = SharedMemory(create=True, size=max_processes * slot_size)
+        self.__claimed = multiprocessing.RawValue("I", 0)
+        self.__claim_lock = multiprocessing.Lock()
+
+        self.__slot: None | int = None
+        self.__slot_pid: None | int = None
+        # Counters and histograms of the process that exited before this one took over its slot.
+        self.__carried: None | dict = None
+        self.__recorder: None | MetricsRecorder = None
+        self.__recorder_pid: None | int = None
+        self.__recorder_lock = threading.Lock()
+        self.__collectors: list[Callable[[], dict[str, dict[tuple, int | float]]]] = []
+
+    @property
+    def max_processes(self) -> int:
+        return self.__max_processes
+
+    def recorder(self) -> MetricsRecorder:
+        # The recorder of the calling process. A forked process starts with a recorder of its own rather than a copy
+        # of its parent's counts.
+        with self.__recorder_lock:
+            if self.__recorder is None or self.__recorder_pid != os.getpid():
+                self.__recorder = MetricsRecorder(self, self.__publish_interval)
+                self.__recorder_pid = os.getpid()
+            return self.__recorder
+
+    def register_collector(self, collector: Callable[[], dict[str, dict[tuple, int | float]]]) -> None:
+        # Adds the counters and gauges a collector returns, keyed by name and labels, to those collected from the
+        # processes. Collectors are called in the collecting process, for state such as queue depths that any
+        # process can read.
+        self.__collectors.append(collector)
+
+    def publish(self, snapshot: dict) -> None:
+        slot = self.__claim()
+        if slot is None:
+            return
+        if self.__carried is not None:
+            snapshot = self.__carry(snapshot, self.__carried)
+        data = marshal.dumps(snapshot)
+        if _SLOT_HEADER.size + len(data) > self.__slot_size:
+            _logger.warning("Metrics snapshot of %d bytes exceeds the slot size of %d bytes.", len(data),
+                            self.__slot_size)
+            return
+        buffer = self.__memory.buf
+        offset = slot * self.__slot_size
+        sequence = _SLOT_HEADER.unpack_from(buffer, offset)[0]
+        _SLOT_HEADER.pack_into(buffer, offset, sequence + 1, 0, os.getpid())
+        buffer[offset + _SLOT_HEADER.size:offset + _SLOT_HEADER.size + len(data)] = data
+        _SLOT_HEADER.pack_into(buffer, offset, sequence + 2, len(data), os.getpid())
+
+    def collect(self) -> dict:
+        # Sums the snapshots of all processes, along with what the collectors return. Gauges are only summed over the
+        # processes still running, as those of an exited process no longer hold.
+        counters: dict[tuple, int] = {}
+        gauges: dict[tuple, int | float] = {}
+        histograms: dict[tuple, list] = {}
+        for collector in self.__collectors:
+            collected = collector()
+            for key, value in collected.get("counters", {}).items():
+                counters[key] = counters.get(key, 0) + value
+            gauges.update(collected.get("gauges", {}))
+        for pid, snapshot in self.__snapshots():
+            for key, value in snapshot["counters"].items():
+                counters[key] = counters.get(key, 0) + value
+            if snapshot.get("gauges") and self.__is_running(pid):
+                for key, value in snapshot["gauges"].items():
+                    gauges[key] = gauges.get(key, 0) + value
+            for key, (total, buckets) in snapshot["histograms"].items():
+                aggregate = histograms.setdefault(key, [0, {}])
+                aggregate[0] += total
+                for bucket, count in buckets.items():
+                    aggregate[1][bucket] = aggregate[1].get(bucket, 0) + count
+        return {"counters": counters, "gauges": gauges, "histograms": histograms}
+
+    def render(self) -> str:
+        # The Prometheus text exposition format. Histograms are exported with a bucket per power of two.
+        collected = self.collect()
+        lines = []
+        for name, series in self.__by_name(collected["counters"]).items():
+            lines.append(f"# TYPE {name} counter")
+            for labels, value in series:
+                lines.append(f"{name}{self.__labels(labels)} {value}")
+        for name, series in self.__by_name(collected["gauges"]).items():
+            lines.append(f"# TYPE {name} gauge")
+            for labels, value in series:
+                lines.append(f"{name}{self.__labels(labels)} {value}")
+        for name, series in self.__by_name(collected["histograms"]).items():
+            lines.append(f"# TYPE {name} histogram")
+            for labels, (total, buckets) in series:
+                cumulative = 0
+                ordered = sorted(buckets.items())
+                position = 0
+                # The le label goes last, after those of the series.
+                prefix = self.__labels(labels + (("le", ""),))[:-3]
+                for bound, le in _EXPORTED_BOUNDS:
+                    while position < len(ordered) and _bucket_upper_bound(ordered[position][0]) <= bound:
+                        cumulative += ordered[position][1]
+                        position += 1
+                    lines.append(f"{name}_bucket{prefix}\"{le}\"}} {cumulative}")
+                count = cumulative + sum(count for _, count in ordered[position:])
+                lines.append(f"{name}_bucket{prefix}\"+Inf\"}} {count}")
+                lines.append(f"{name}_sum{self.__labels(labels)} {total / 1e9:g}")
+                lines.append(f"{name}_count{self.__labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> dict[str, Any]:
+        # Counters and gauges, and the count, mean and percentiles of histograms in seconds, keyed by series.
+        collected = self.collect()
+        summary: dict[str, Any] = {}
+        for (name, labels), value in sorted({**collected["counters"], **collected["gauges"]}.items()):
+            summary[f"{name}{self.__labels(labels)}"] = value
+        for (name, labels), (total, buckets) in sorted(collected["histograms"].items()):
+            count = sum(buckets.values())
+            series = {"count": count, "mean": total / count / 1e9 if count else 0.0}
+            for quantile in (0.5, 0.9, 0.99, 0.999):
+                series[f"p{quantile * 100:g}"] = self.__quantile(buckets, count, quantile) / 1e9
+            summary[f"{name}{self.__labels(labels)}"] = series
+        return summary
+
+    def dump(self, path: str) -> None:
+        # Written to a temporary file and moved into place, so readers never see a partial dump.
+        temporary_path = f"{path}.{os.getpid()}.tmp"
+        with open(temporary_path, "w") as file:
+            json.dump({"timestamp": time.time(), "metrics": self.summary()}, file, indent=2)
+        os.replace(temporary_path, path)
+
+    def close(self) -> None:
+        self.__memory.close()
+
+    def unlink(self) -> None:
+        self.__memory.unlink()
+
+    def __claim(self) -> None | int:
+        if self.__slot is not None and self.__slot_pid == os.getpid():
+            return self.__slot
+        carried = None
+        with self.__claim_lock:
+            if self.__claimed.value < self.__max_processes:
+                slot = self.__claimed.value
+                self.__claimed.value += 1
+            else:
+                slot = self.__exited_slot()
+                if slot is not None:
+                    _, length, _, data = self.__read(slot)
+                    carried = marshal.loads(data) if length else None
+            if slot is not None:
+                # The slot is taken over under the lock, so that no other process takes over the same slot.
+                buffer = self.__memory.buf
+                offset = slot * self.__slot_size
+                sequence, length, _ = _SLOT_HEADER.unpack_from(buffer, offset)
+                _SLOT_HEADER.pack_into(buffer, offset, sequence + 1, length, os.getpid())
+                _SLOT_HEADER.pack_into(buffer, offset, sequence + 2, length, os.getpid())
+        if slot is None and self.__slot_pid != os.getpid():
+            _logger.warning("All %d metrics slots are taken, the metrics of process %d are not published.",
+                            self.__max_processes, os.getpid())
+        self.__slot = slot
+        self.__slot_pid = os.getpid()
+        self.__carried = None if carried is None else {"counters": carried["counters"],
+                                                       "histograms": carried["histograms"]}
+        return slot
+
+    def __exited_slot(self) -> None | int:
+        for slot in range(self.__max_processes):
+            _, _, pid, _ = self.__read(slot)
+            if pid != os.getpid() and not self.__is_running(pid):
+                return slot
+        return None
+
+    def __read(self, slot: int) -> tuple[int, int, int, bytes]:
+        # The sequence number, snapshot length, owning pid and snapshot of a slot, retried while the owning process
+        # is writing the snapshot.
+        buffer = self.__memory.buf
+        offset = slot * self.__slot_size
+        while True:
+            sequence, length, pid = _SLOT_HEADER.unpack_from(buffer, offset)
+            if sequence & 1:
+                time.sleep(0)
+                continue
+            data = bytes(buffer[offset + _SLOT_HEADER.size:offset + _SLOT_HEADER.size + length])
+            if _SLOT_HEADER.unpack_from(buffer, offset)[0] == sequence:
+                return sequence, length, pid, data
+
+    def __snapshots(self) -> list[tuple[int, dict]]:
+        snapshots = []
+        for slot in range(min(self.__claimed.value, self.__max_processes)):
+            _, length, pid, data = self.__read(slot)
+            if length:
+                snapshots.append((pid, marshal.loads(data)))
+        return snapshots
+
+    @staticmethod
+    def __carry(snapshot: dict, carried: dict) -> dict:
+        counters = dict(carried["counters"])
+        for key, value in snapshot["counters"].items():
+            counters[key] = counters.get(key, 0) + value
+        histograms = dict(carried["histograms"])
+        for key, (total, buckets) in snapshot["histograms"].items():
+            if key in histograms:
+                carried_total, carried_buckets = histograms[key]
+                buckets = {**carried_buckets, **{bucket: carried_buckets.get(bucket, 0) + count
+                                                 for bucket, count in buckets.items()}}
+                total += carried_total
+            histograms[key] = (total, buckets)
+        return {"counters": counters, "gauges": snapshot["gauges"], "histograms": histograms}
+
+    @staticmethod
+    def __is_running(pid: int) -> bool:
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            pass
+        return True
+
+    @staticmethod
+    def __by_name(series: dict[tuple, Any]) -> dict[str, list]:
+        grouped: dict[str, list] = {}
+        for (name, labels), value in sorted(series.items()):
+            grouped.setdefault(name, []).append((labels, value))
+        return grouped
+
+    @staticmethod
+    def __labels(labels: tuple[tuple[str, str], ...]) -> str:
+        if not labels:
+            return ""
+        escaped = (value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n") for _, value in labels)
+        return "{" + ",".join(f"{key}=\"{value}\"" for (key, _), value in zip(labels, escaped)) + "}"
+
+    @staticmethod
+    def __quantile(buckets: dict[int, int], count: int, quantile: float) -> int:
+        # The upper bound of the bucket holding the sample of the quantile, which overestimates it by at most a bucket.
+        if not count:
+            return 0
+        rank = quantile * count
+        cumulative = 0
+        for bucket, bucket_count in sorted(buckets.items()):
+            cumulative += bucket_count
+            if cumulative >= rank:
+                return _bucket_upper_bound(bucket)
+        return _bucket_upper_bound(max(buckets))
+
+
+_store: None | MetricsStore = None
+
+
+def configure_metrics(store: None | MetricsStore) -> None:
+    # Must be called before the ingestion and execution processes are started, so that they inherit the store.
+    global _store
+    _store = store
+
+
+def current_metrics() -> None | MetricsRecorder:
+    # The recorder of the calling process, None while metrics are disabled. Looked up once per process or component
+    # rather than per sample.
+    return None if _store is None else _store.recorder()
+
+
+class _MetricsRequestHandler(BaseHTTPRequestHandler):
+    store: MetricsStore
+
+    def do_GET(self) -> None:
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.store.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args) -> None:
+        # Scrapes are not worth a line of output each.
+        pass
+
+
+def serve_metrics(store: MetricsStore, port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    # Serves the metrics of all processes at http://host:port/metrics from a background thread.
+    handler = type("MetricsRequestHandler", (_MetricsRequestHandler,), {"store": store})
+    server = ThreadingHTTPServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server
@@ -7,4 +7,10 @@ This subpackage contains various modules for constructing and processing pipelin
 """
 
 from .pipeline import *
+from .cache import PipelineCache
 from .execution import Executor
+from .asynchronous import AsyncExecutor
+from .buffers import OverflowPolicy
+from .dispatch import Dispatcher
+from .transport import SharedMemoryQueue
+from .supervisor import ExecutionSupervisor
@@ -0,0 +1,165 @@
+"""
+Asynchronous Execution Module
+=============================
+
+"""
+
+import time
+import queue
+import asyncio
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+
+from .cache import PipelineCache
+from .execution import _RELOAD_INTERVAL, MissingPipelineError, _reload_pipelines, _resolve_pipeline
+from .message import Message
+from .task import Task
+from ..metrics import MetricsRecorder, current_metrics
+from ..storage import storage_revision
+
+
+_logger = logging.getLogger(__name__)
+
+
+class AsyncExecutor(multiprocessing.Process):
+    # Consumes the same tasks as `Executor`, but executes them as coroutines on an event loop, so that a single
+    # process keeps many I/O bound pipeline runs in flight at once. Asynchronous nodes are awaited on the loop,
+    # blocking synchronous nodes run on a thread pool and the other nodes run inline.
+    #
+    # A reader thread takes tasks off the queue while fewer than `max_inflight` are executing, and every pipeline
+    # executes at most `max_concurrency_per_pipeline` tasks at once. Tasks of a pipeline start in queue order but may
+    # finish out of order.
+    def __init__(self, stop_event: multiprocessing.Event, task_queue: multiprocessing.JoinableQueue,
+                 max_inflight: int = 1_000, max_concurrency_per_pipeline: int = 100, node_threads: int = 32,
+                 pipeline_cache_size: int = 128) -> None:
+        super().__init__()
+        if max_inflight < 1 or max_concurrency_per_pipeline < 1 or node_threads < 1:
+            raise ValueError("Asynchronous executor limits must be at least 1, got "
+                             f"max_inflight={max_inflight}, max_concurrency_per_pipeline="
+                             f"{max_concurrency_per_pipeline} and node_threads={node_threads}.")
+
+        self.__task_queue = task_queue
+        self.__stop_event = stop_event
+        self.__max_inflight = max_inflight
+        self.__max_concurrency_per_pipeline = max_concurrency_per_pipeline
+        self.__node_threads = node_threads
+
+        # Created before the process starts so that its counters are shared with the parent.
+        self.__pipeline_cache = PipelineCache(max_size=pipeline_cache_size)
+        self.__executed = multiprocessing.RawValue("Q", 0)
+        self.__failed = multiprocessing.RawValue("Q", 0)
+        # Tasks got from the queue, each of which is counted as executed or failed once done with.
+        self.__taken = multiprocessing.RawValue("Q", 0)
+
+    @property
+    def pipeline_cache(self) -> PipelineCache:
+        return self.__pipeline_cache
+
+    @property
+    def stats(self) -> dict[str, int]:
+        return {
+            "executed": self.__executed.value,
+            "failed": self.__failed.value
+        }
+
+    @property
+    def unfinished(self) -> int:
+        # Tasks got from the queue and not done with yet, which the supervisor finishes for an executor that died.
+        return self.__taken.value - self.__executed.value - self.__failed.value
+
+    def run(self) -> None:
+        recorder = current_metrics()
+        try:
+            asyncio.run(self.__consume(recorder))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if recorder is not None:
+                recorder.flush()
+
+    async def __consume(self, recorder: None | MetricsRecorder) -> None:
+        loop = asyncio.get_running_loop()
+        # Threads do not survive a fork, so the pool is created in the executor process.
+        pool = ThreadPoolExecutor(self.__node_threads, "pipeline-node")
+        slots = threading.BoundedSemaphore(self.__max_inflight)
+        limits: dict[int, asyncio.Semaphore] = {}
+        running: set[asyncio.Task] = set()
+
+        def start(task: Task) -> None:
+            limit = limits.get(task.pipeline_id)
+            if limit is None:
+                limit = limits[task.pipeline_id] = asyncio.Semaphore(self.__max_concurrency_per_pipeline)
+            coroutine = loop.create_task(self.__execute(task, limit, slots, pool, recorder))
+            running.add(coroutine)
+            coroutine.add_done_callback(running.discard)
+
+        reader = threading.Thread(target=self.__read_tasks, args=(loop, slots, start), name="task-reader",
+                                  daemon=True)
+        reader.start()
+
+        revision = storage_revision()
+        while not self.__stop_event.is_set():
+            await asyncio.sleep(_RELOAD_INTERVAL)
+            current_revision = storage_revision()
+            if current_revision != revision:
+                revision = current_revision
+                _reload_pipelines(self.__pipeline_cache, recorder)
+
+        # Finish the tasks already taken off the queue before exiting.
+        await loop.run_in_executor(None, reader.join)
+        while running:
+            await asyncio.wait(set(running))
+        pool.shutdown()
+
+    def __read_tasks(self, loop: asyncio.AbstractEventLoop, slots: threading.BoundedSemaphore, start) -> None:
+        while not self.__stop_event.is_set():
+            if not slots.acquire(timeout=1):
+                continue
+            try:
+                task: Task = self.__task_queue.get(timeout=1)
+            except queue.Empty:
+                slots.release()
+                continue
+            self.__taken.value += 1
+            loop.call_soon_threadsafe(start, task)
+
+    async def __execute(self, task: Task, limit: asyncio.Semaphore, slots: threading.BoundedSemaphore,
+                        pool: ThreadPoolExecutor, recorder: None | MetricsRecorder) -> None:
+        metrics = None if recorder is None else recorder.pipeline(task.pipeline_id)
+        try:
+            # The payload may be a view of a shared memory queue, which is only valid until the task is done. Tasks
+            # finish out of order here while `task_done` refers to the oldest task taken, so the view is copied.
+            message = Message(timestamp=task.timestamp, topic=task.topic, raw=bytes(task.payload),
+                              encoding=task.encoding)
+            async with limit:
+                # Waiting for the concurrency limit of the pipeline counts as waiting in the queue.
+                start = time.perf_counter_ns()
+                if metrics is not None and task.enqueued:
+                    metrics.queue_wait.record(time.time() - task.enqueued)
+                pipeline = _resolve_pipeline(self.__pipeline_cache, task, recorder)
+                # Pipelines are reloaded, and evicted, while other runs are awaiting, which must not close this one.
+                self.__pipeline_cache.acquire(pipeline)
+                try:
+                    await pipeline.execute_async(message, pool)
+                finally:
+                    self.__pipeline_cache.release(pipeline)
+            self.__executed.value += 1
+            if metrics is not None:
+                metrics.duration.record_ns(time.perf_counter_ns() - start)
+                metrics.end_to_end.record(time.time() - task.timestamp)
+        except MissingPipelineError as error:
+            self.__failed.value += 1
+            if metrics is not None:
+                metrics.failures.add()
+            _logger.warning("Dropped a task: %s", error)
+        except Exception:
+            # A failing task must not take the other tasks of the process down with it.
+            self.__failed.value += 1
+            if metrics is not None:
+                metrics.failures.add()
+            _logger.exception("Task of pipeline '%s' failed", task.pipeline_id)
+        finally:
+            self.__task_queue.task_done()
+            slots.release()
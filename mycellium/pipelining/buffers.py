@@ -0,0 +1,141 @@
+"""
+Buffers Module
+==============
+
+"""
+
+import time
+import threading
+from enum import Enum
+from collections import deque
+from typing import Any, Callable
+
+
+class OverflowPolicy(Enum):
+    BLOCK = "block"
+    DROP_OLDEST = "drop_oldest"
+    DROP_NEWEST = "drop_newest"
+    # Every `sample_every`-th item that overflows a full buffer replaces the oldest item, the others are dropped, so
+    # that a sample of fresh items keeps flowing during an overload.
+    SAMPLE = "sample"
+
+
+class OutboundBuffer:
+    # A bounded buffer drained in bulk by a background thread. Producers return as soon as an item is buffered, or,
+    # when the buffer is full, according to the overflow policy. The drain returns how many items of a batch it lost,
+    # and should drain the others rather than give up on the first that fails. The whole batch is counted as lost
+    # when it raises.
+    def __init__(self, drain: Callable[[list[Any]], int], capacity: int, flush_interval: float,
+                 policy: OverflowPolicy = OverflowPolicy.BLOCK, name: str = "outbound-buffer",
+                 sample_every: int = 10) -> None:
+        if capacity < 1:
+            raise ValueError(f"Outbound buffer capacity must be at least 1, got {capacity}.")
+        if sample_every < 1:
+            raise ValueError(f"Outbound buffer sample interval must be at least 1, got {sample_every}.")
+        self.__drain = drain
+        self.__capacity = capacity
+        self.__flush_interval = flush_interval
+        self.__policy = policy
+        self.__sample_every = sample_every
+
+        self.__items: deque = deque()
+        self.__condition = threading.Condition()
+        self.__closed = False
+
+        self.__enqueued = 0
+        self.__drained = 0
+        self.__blocked = 0
+        self.__dropped_oldest = 0
+        self.__dropped_newest = 0
+        self.__overflowed = 0
+        self.__sampled_out = 0
+        self.__lost = 0
+
+        self.__thread = threading.Thread(target=self.__run, name=name, daemon=True)
+        self.__thread.start()
+
+    def __len__(self) -> int:
+        return len(self.__items)
+
+    @property
+    def policy(self) -> OverflowPolicy:
+        return self.__policy
+
+    @property
+    def stats(self) -> dict[str, int]:
+        with self.__condition:
+            return {
+                "enqueued": self.__enqueued,
+                "drained": self.__drained,
+                "blocked": self.__blocked,
+                "dropped_oldest": self.__dropped_oldest,
+                "dropped_newest": self.__dropped_newest,
+                "sampled_out": self.__sampled_out,
+                "lost": self.__lost,
+                "buffered": len(self.__items)
+            }
+
+    def put(self, item: Any) -> bool:
+        # Returns whether the item was buffered.
+        with self.__condition:
+            if self.__closed:
+                raise RuntimeError("Cannot put items into a closed outbound buffer.")
+
+            if len(self.__items) >= self.__capacity:
+                match self.__policy:
+                    case OverflowPolicy.BLOCK:
+                        self.__blocked += 1
+                        self.__condition.wait_for(lambda: len(self.__items) < self.__capacity or self.__closed)
+                        if self.__closed:
+                            return False
+                    case OverflowPolicy.DROP_OLDEST:
+                        self.__items.popleft()
+                        self.__dropped_oldest += 1
+                    case OverflowPolicy.DROP_NEWEST:
+                        self.__dropped_newest += 1
+                        return False
+                    case OverflowPolicy.SAMPLE:
+                        self.__overflowed += 1
+                        if self.__overflowed % self.__sample_every:
+                            self.__sampled_out += 1
+                            return False
+                        self.__items.popleft()
+                        self.__dropped_oldest += 1
+
+            self.__items.append(item)
+            self.__enqueued += 1
+            if len(self.__items) == 1 or len(self.__items) >= self.__capacity:
+                self.__condition.notify_all()
+            return True
+
+    def close(self, timeout: None | float = None) -> None:
+        # Stop accepting items and wait for the buffered ones to be drained.
+        with self.__condition:
+            self.__closed = True
+            self.__condition.notify_all()
+        self.__thread.join(timeout)
+
+    def __run(self) -> None:
+        while True:
+            with self.__condition:
+                self.__condition.wait_for(lambda: len(self.__items) > 0 or self.__closed)
+                if self.__flush_interval > 0 and not self.__closed:
+                    # Let a batch accumulate, unless the buffer fills up first.
+                    deadline = time.monotonic() + self.__flush_interval
+                    self.__condition.wait_for(
+                        lambda: len(self.__items) >= self.__capacity or self.__closed or time.monotonic() >= deadline,
+                        self.__flush_interval)
+                if len(self.__items) == 0 and self.__closed:
+                    return
+                batch = list(self.__items)
+                self.__items.clear()
+                # Wake producers blocked on a full buffer.
+                self.__condition.notify_all()
+
+            try:
+                lost = self.__drain(batch)
+            except Exception:
+                lost = len(batch)
+            with self.__condition:
+                self.__drained += len(batch) - lost
+                self.__lost += lost
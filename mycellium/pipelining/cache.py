@@ -0,0 +1,113 @@
+"""
+Pipeline Cache Module
+=====================
+
+"""
+
+import multiprocessing
+from collections import OrderedDict
+
+from .pipeline import Pipeline
+
+
+class PipelineCache:
+    def __init__(self, max_size: int = 128) -> None:
+        if max_size < 1:
+            raise ValueError(f"Pipeline cache size must be at least 1, got {max_size}.")
+        self.__max_size = max_size
+        # Compiled pipelines keyed by (pipeline id, structure version), in least to most recently used order.
+        self.__pipelines: OrderedDict[tuple[int, int], Pipeline] = OrderedDict()
+        self.__latest_versions: dict[int, int] = {}
+        # Pipelines being executed, with their number of runs in flight, and those of them no longer cached, which
+        # are closed once their last run finishes rather than under it.
+        self.__runs: dict[Pipeline, int] = {}
+        self.__retired: set[Pipeline] = set()
+
+        # Counters live in shared memory so that the parent process can scrape them while the
+        # owning Executor process is running.
+        self.__hits = multiprocessing.RawValue("Q", 0)
+        self.__misses = multiprocessing.RawValue("Q", 0)
+        self.__evictions = multiprocessing.RawValue("Q", 0)
+        self.__invalidations = multiprocessing.RawValue("Q", 0)
+
+    def __len__(self) -> int:
+        return len(self.__pipelines)
+
+    @property
+    def max_size(self) -> int:
+        return self.__max_size
+
+    @property
+    def stats(self) -> dict[str, int]:
+        return {
+            "hits": self.__hits.value,
+            "misses": self.__misses.value,
+            "evictions": self.__evictions.value,
+            "invalidations": self.__invalidations.value
+        }
+
+    @property
+    def latest_versions(self) -> dict[int, int]:
+        return dict(self.__latest_versions)
+
+    def get(self, pipeline_id: int, version: int) -> None | Pipeline:
+        key = (pipeline_id, version)
+        pipeline = self.__pipelines.get(key)
+        if pipeline is None:
+            self.__misses.value += 1
+            return None
+        self.__pipelines.move_to_end(key)
+        self.__hits.value += 1
+        return pipeline
+
+    def acquire(self, pipeline: Pipeline) -> None:
+        # Marks a run of the pipeline as in flight, so that replacing or evicting it does not close it meanwhile.
+        # Only needed where runs overlap with changes to the cache, such as across the awaits of asynchronous runs.
+        self.__runs[pipeline] = self.__runs.get(pipeline, 0) + 1
+
+    def release(self, pipeline: Pipeline) -> None:
+        runs = self.__runs[pipeline] - 1
+        if runs > 0:
+            self.__runs[pipeline] = runs
+            return
+        del self.__runs[pipeline]
+        if pipeline in self.__retired:
+            self.__retired.remove(pipeline)
+            pipeline.close()
+
+    def put(self, pipeline_id: int, version: int, pipeline: Pipeline) -> None:
+        latest_version = self.__latest_versions.get(pipeline_id)
+        if latest_version is not None and version > latest_version:
+            # A newer structure has been fetched for this pipeline. The version it replaces is kept for the tasks
+            # that were queued before the change, so that they finish on the version they were ingested for, while
+            # every version older than that is stale.
+            for stale_key in [key for key in self.__pipelines if key[0] == pipeline_id and key[1] < latest_version]:
+                self.__close(self.__pipelines.pop(stale_key))
+                self.__invalidations.value += 1
+        if latest_version is None or version > latest_version:
+            self.__latest_versions[pipeline_id] = version
+
+        replaced = self.__pipelines.get((pipeline_id, version))
+        if replaced is not None and replaced is not pipeline:
+            self.__close(replaced)
+        self.__retired.discard(pipeline)
+        self.__pipelines[(pipeline_id, version)] = pipeline
+        self.__pipelines.move_to_end((pipeline_id, version))
+        while len(self.__pipelines) > self.__max_size:
+            (evicted_id, _), evicted_pipeline = self.__pipelines.popitem(last=False)
+            self.__close(evicted_pipeline)
+            self.__evictions.value += 1
+            if not any(key[0] == evicted_id for key in self.__pipelines):
+                del self.__latest_versions[evicted_id]
+
+    def clear(self) -> None:
+        for pipeline in self.__pipelines.values():
+            self.__close(pipeline)
+        self.__pipelines.clear()
+        self.__latest_versions.clear()
+
+    def __close(self, pipeline: Pipeline) -> None:
+        if pipeline in self.__runs:
+            self.__retired.add(pipeline)
+        else:
+            pipeline.close()
@@ -0,0 +1,168 @@
+"""
+Connections Module
+==================
+
+Long-lived MQTT clients shared by the publishing nodes of a process.
+
+"""
+
+import os
+import threading
+
+import paho.mqtt.client as mqtt
+
+
+class PooledMQTTClient:
+    def __init__(self, broker_host: str, broker_port: int, max_inflight: int, reconnect_min_delay: int,
+                 reconnect_max_delay: int) -> None:
+        self.__broker_host = broker_host
+        self.__broker_port = broker_port
+        self.__connected = threading.Event()
+        self.__references = 0
+
+        # Message ids of publishes that paho has not reported as completed yet. Completions can arrive on the network
+        # thread before `publish` returns, those are parked in `__early_acknowledgements`.
+        self.__inflight_lock = threading.Condition()
+        self.__inflight: set[int] = set()
+        self.__early_acknowledgements: set[int] = set()
+        self.__published = 0
+        self.__failed = 0
+
+        self.__client = mqtt.Client()
+        self.__client.on_connect = self.__on_connect
+        self.__client.on_disconnect = self.__on_disconnect
+        self.__client.on_publish = self.__on_publish
+        self.__client.max_inflight_messages_set(max_inflight)
+        self.__client.reconnect_delay_set(min_delay=reconnect_min_delay, max_delay=reconnect_max_delay)
+        # Connect in the background, the network loop thread reconnects automatically whenever the connection drops.
+        self.__client.connect_async(broker_host, broker_port)
+        self.__client.loop_start()
+
+    @property
+    def key(self) -> tuple[str, int]:
+        return self.__broker_host, self.__broker_port
+
+    @property
+    def is_connected(self) -> bool:
+        return self.__connected.is_set()
+
+    @property
+    def references(self) -> int:
+        return self.__references
+
+    @property
+    def stats(self) -> dict[str, int]:
+        with self.__inflight_lock:
+            return {
+                "published": self.__published,
+                "failed": self.__failed,
+                "inflight": len(self.__inflight)
+            }
+
+    def wait_until_connected(self, timeout: None | float = None) -> bool:
+        return self.__connected.wait(timeout)
+
+    def publish(self, topic: str, payload, qos: int = 0) -> mqtt.MQTTMessageInfo:
+        message_info = self.__client.publish(topic, payload, qos=qos)
+        with self.__inflight_lock:
+            # While disconnected paho keeps QoS 1 and 2 publishes queued for the next connection, but QoS 0 publishes
+            # are lost. A publish counts as completed once paho reports it, which for QoS 0 is when it has been
+            # written to the socket.
+            if message_info.rc == mqtt.MQTT_ERR_QUEUE_SIZE or (qos == 0 and message_info.rc != mqtt.MQTT_ERR_SUCCESS):
+                self.__failed += 1
+            elif message_info.mid in self.__early_acknowledgements:
+                self.__early_acknowledgements.remove(message_info.mid)
+                self.__published += 1
+            else:
+                self.__inflight.add(message_info.mid)
+        return message_info
+
+    def flush(self, timeout: None | float = None) -> bool:
+        # Wait for every publish to be written, and for QoS 1 and 2 publishes to be acknowledged by the broker.
+        with self.__inflight_lock:
+            return self.__inflight_lock.wait_for(lambda: len(self.__inflight) == 0, timeout)
+
+    def close(self) -> None:
+        self.__client.disconnect()
+        self.__client.loop_stop()
+
+    def _acquire(self) -> None:
+        self.__references += 1
+
+    def _release(self) -> int:
+        self.__references -= 1
+        return self.__references
+
+    def __on_connect(self, client: mqtt.Client, userdata, flags, rc) -> None:
+        if rc == 0:
+            self.__connected.set()
+
+    def __on_disconnect(self, client: mqtt.Client, userdata, rc) -> None:
+        self.__connected.clear()
+
+    def __on_publish(self, client: mqtt.Client, userdata, mid: int) -> None:
+        with self.__inflight_lock:
+            if mid in self.__inflight:
+                self.__inflight.remove(mid)
+                self.__published += 1
+                if len(self.__inflight) == 0:
+                    self.__inflight_lock.notify_all()
+            else:
+                self.__early_acknowledgements.add(mid)
+
+
+class MQTTConnectionPool:
+    def __init__(self, max_inflight: int = 1_000, reconnect_min_delay: int = 1, reconnect_max_delay: int = 30,
+                 connect_timeout: float = 5.0) -> None:
+        self.__max_inflight = max_inflight
+        self.__reconnect_min_delay = reconnect_min_delay
+        self.__reconnect_max_delay = reconnect_max_delay
+        self.__connect_timeout = connect_timeout
+        self.__lock = threading.Lock()
+        self.__clients: dict[tuple[str, int], PooledMQTTClient] = {}
+
+    def __len__(self) -> int:
+        return len(self.__clients)
+
+    def acquire(self, broker_host: str, broker_port: int) -> PooledMQTTClient:
+        key = (broker_host, broker_port)
+        with self.__lock:
+            client = self.__clients.get(key)
+            if client is None:
+                client = PooledMQTTClient(broker_host, broker_port, self.__max_inflight, self.__reconnect_min_delay,
+                                          self.__reconnect_max_delay)
+                self.__clients[key] = client
+            client._acquire()
+        # Give a new connection a chance to come up, so that the first QoS 0 publishes are not lost. If the broker is
+        # unreachable the client keeps reconnecting in the background.
+        client.wait_until_connected(self.__connect_timeout)
+        return client
+
+    def release(self, client: PooledMQTTClient) -> None:
+        with self.__lock:
+            if client._release() > 0:
+                return
+            del self.__clients[client.key]
+        client.close()
+
+    def close(self) -> None:
+        with self.__lock:
+            clients = list(self.__clients.values())
+            self.__clients.clear()
+        for client in clients:
+            client.close()
+
+
+_pool: None | MQTTConnectionPool = None
+_pool_pid: None | int = None
+_pool_lock = threading.Lock()
+
+
+def mqtt_connection_pool() -> MQTTConnectionPool:
+    # Network loop threads do not survive a fork, so every process lazily creates its own pool.
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = MQTTConnectionPool()
+            _pool_pid = os.getpid()
+        return _pool
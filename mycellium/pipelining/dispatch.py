@@ -0,0 +1,198 @@
+"""
+Dispatch Module
+===============
+
+"""
+
+import json
+import zlib
+import queue
+import multiprocessing
+from multiprocessing.queues import JoinableQueue
+
+from .buffers import OverflowPolicy
+from .task import Task
+from .transport import SharedMemoryQueue
+from ..encodings import parse_json
+from ..fields import MISSING, field_getter
+
+
+# What tasks can be sharded by.
+_SHARD_KEYS = ("topic", "pipeline", "payload")
+
+_QOS_LEVELS = (0, 1, 2)
+
+# Positions of the shed task counters.
+_DROPPED_OLDEST = 0
+_DROPPED_NEWEST = 1
+_SAMPLED_OUT = 2
+
+# How long making room waits for the oldest task of a full queue, which a queue fed through a pipe may not have
+# flushed yet, and how often it tries before shedding the new task instead.
+_EVICTION_TIMEOUT = 0.001
+_EVICTION_ATTEMPTS = 3
+
+
+class Dispatcher:
+    # Gives every executor a queue of its own and routes each task to one of them by a stable hash of its topic,
+    # its pipeline or a field of its JSON payload. Tasks with the same key are always executed by the same executor,
+    # in the order they were ingested, each executor only compiles the pipelines of its own shard, and producers and
+    # consumers contend for the lock of a single queue rather than all of them for one.
+    #
+    # The hash is a CRC-32 rather than `hash()`, which is salted per process for strings and would route the same key
+    # differently from every ingestion process. Payloads that are not JSON objects with the field are routed by topic.
+    # Dispatchers are handed to ingestors in place of a queue, so `put` follows `JoinableQueue.put`.
+    #
+    # With a buffer size, every queue is a shared memory ring buffer of that many bytes rather than a `JoinableQueue`
+    # of at most `maxsize` tasks.
+    #
+    # What happens to a task whose queue is full depends on the overflow policy for the QoS of its subscription.
+    # With BLOCK, `put` waits for room, or raises `queue.Full` when it must not block, so that ingestors can stop
+    # reading from the broker meanwhile. The other policies never wait and shed tasks instead: DROP_NEWEST sheds the
+    # new task, DROP_OLDEST takes the oldest task off the queue to make room, and SAMPLE makes room for every
+    # `sample_every`-th overflowing task and sheds the others. Shed tasks are counted across processes.
+    def __init__(self, num_queues: int, key: str = "topic", field: None | str = None, maxsize: int = 0,
+                 buffer_size: int = 0, overflow: None | dict[int, OverflowPolicy] = None,
+                 sample_every: int = 10) -> None:
+        if num_queues < 1:
+            raise ValueError(f"A dispatcher requires at least one queue, got {num_queues}.")
+        if key not in _SHARD_KEYS:
+            raise ValueError(f"Unknown shard key provided: '{key}', expected one of {', '.join(_SHARD_KEYS)}.")
+        if (key == "payload") != (field is not None):
+            raise ValueError("A payload field is required when, and only when, sharding by payload.")
+        overflow = {} if overflow is None else overflow
+        unknown_levels = sorted(set(overflow) - set(_QOS_LEVELS))
+        if unknown_levels:
+            raise ValueError(f"Overflow policies can only be set for QoS levels 0, 1 and 2, got {unknown_levels}.")
+        if sample_every < 1:
+            raise ValueError(f"Dispatcher sample interval must be at least 1, got {sample_every}.")
+
+        self.__key = key
+        self.__field = field
+        # A field of just 'payload' keys on the whole payload.
+        self.__get_field = field_getter(field) or (lambda payload: payload)
+        if buffer_size > 0:
+            self.__queues = [SharedMemoryQueue(buffer_size) for _ in range(num_queues)]
+        else:
+            self.__queues = [multiprocessing.JoinableQueue(maxsize) for _ in range(num_queues)]
+
+        self.__policies = tuple(OverflowPolicy(overflow.get(qos, OverflowPolicy.BLOCK)) for qos in _QOS_LEVELS)
+        self.__sample_every = sample_every
+        # Overflowing tasks of sampled QoS levels seen by this process.
+        self.__overflowed = 0
+        # Created before the processes start so that the counters are shared with them.
+        self.__shed = multiprocessing.RawArray("Q", 3)
+        self.__shed_lock = multiprocessing.Lock()
+
+    def __len__(self) -> int:
+        return len(self.__queues)
+
+    @property
+    def key(self) -> str:
+        return self.__key
+
+    @property
+    def field(self) -> None | str:
+        return self.__field
+
+    @property
+    def queues(self) -> list[JoinableQueue | SharedMemoryQueue]:
+        return list(self.__queues)
+
+    @property
+    def policies(self) -> dict[int, OverflowPolicy]:
+        return dict(zip(_QOS_LEVELS, self.__policies))
+
+    @property
+    def stats(self) -> dict[str, int | list[int]]:
+        return {
+            "depths": [task_queue.qsize() for task_queue in self.__queues],
+            "dropped_oldest": self.__shed[_DROPPED_OLDEST],
+            "dropped_newest": self.__shed[_DROPPED_NEWEST],
+            "sampled_out": self.__shed[_SAMPLED_OUT]
+        }
+
+    def collect_metrics(self) -> dict[str, dict[tuple, int]]:
+        # Queue depths and shed task counters in the form `MetricsStore.register_collector` expects.
+        stats = self.stats
+        return {
+            "gauges": {("mycellium_queue_depth", (("queue", str(position)),)): depth
+                       for position, depth in enumerate(stats["depths"])},
+            "counters": {("mycellium_shed_tasks_total", (("reason", reason),)): stats[reason]
+                         for reason in ("dropped_oldest", "dropped_newest", "sampled_out")}
+        }
+
+    def shard(self, task: Task) -> int:
+        if len(self.__queues) == 1:
+            return 0
+        match self.__key:
+            case "pipeline":
+                key = task.pipeline_id.to_bytes(8, "little", signed=True)
+            case "payload":
+                key = self.__payload_key(task)
+            case _:
+                key = task.topic.encode()
+        return zlib.crc32(key) % len(self.__queues)
+
+    def put(self, task: Task, block: bool = True, timeout: None | float = None) -> None:
+        task_queue = self.__queues[self.shard(task)]
+        policy = self.__policies[task.qos]
+        if policy is OverflowPolicy.BLOCK:
+            task_queue.put(task, block, timeout)
+            return
+        try:
+            task_queue.put_nowait(task)
+            return
+        except queue.Full:
+            pass
+
+        if policy is OverflowPolicy.SAMPLE:
+            self.__overflowed += 1
+            if self.__overflowed % self.__sample_every:
+                self.__count_shed(_SAMPLED_OUT)
+                return
+        elif policy is OverflowPolicy.DROP_NEWEST:
+            self.__count_shed(_DROPPED_NEWEST)
+            return
+
+        # Consumers may take tasks and other producers may fill the room in the meantime, so making room is retried
+        # a few times before the new task is shed after all.
+        for _ in range(_EVICTION_ATTEMPTS):
+            try:
+                task_queue.get(timeout=_EVICTION_TIMEOUT)
+            except queue.Empty:
+                pass
+            else:
+                task_queue.task_done()
+                self.__count_shed(_DROPPED_OLDEST)
+            try:
+                task_queue.put_nowait(task)
+                return
+            except queue.Full:
+                pass
+        self.__count_shed(_DROPPED_NEWEST)
+
+    def join(self) -> None:
+        for task_queue in self.__queues:
+            task_queue.join()
+
+    def close(self) -> None:
+        # Frees the shared memory of ring buffer queues, once no process uses them anymore.
+        for task_queue in self.__queues:
+            if isinstance(task_queue, SharedMemoryQueue):
+                task_queue.close()
+                task_queue.unlink()
+
+    def __count_shed(self, reason: int) -> None:
+        with self.__shed_lock:
+            self.__shed[reason] += 1
+
+    def __payload_key(self, task: Task) -> bytes:
+        try:
+            value = self.__get_field(parse_json(task.payload))
+        except ValueError:
+            value = MISSING
+        if value is MISSING:
+            return task.topic.encode()
+        # Key on the JSON form of the value, so that equal values of any type route alike in every process.
+        return json.dumps(value, sort_keys=True).encode()
@@ -6,48 +6,278 @@ Execution Module
 
 import time
 import queue
+import logging
+import functools
 import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
 
+from .cache import PipelineCache
 from .pipeline import Pipeline
 from .message import Message
+from .task import Task
+from ..metrics import MetricsRecorder, PipelineMetrics, current_metrics
+from ..storage import fetch_pipeline, storage_revision
+
+
+_logger = logging.getLogger(__name__)
+
+# How often storage is checked for changed pipelines.
+_RELOAD_INTERVAL = 0.25
+
+
+class MissingPipelineError(LookupError):
+    # Raised for a task whose pipeline was deleted while the task was queued.
+    pass
+
+
+def _instrument(pipeline: Pipeline, pipeline_id: int, recorder: None | MetricsRecorder) -> Pipeline:
+    # Time the nodes of pipelines compiled while metrics are enabled.
+    if recorder is not None:
+        pipeline.instrument(functools.partial(recorder.node_histogram, pipeline_id))
+    return pipeline
+
+
+def _resolve_pipeline(pipeline_cache: PipelineCache, task: Task, recorder: None | MetricsRecorder = None) -> Pipeline:
+    pipeline = pipeline_cache.get(task.pipeline_id, task.pipeline_version)
+    if pipeline is not None:
+        return pipeline
+
+    # Compile the pipeline from this process's registry and keep it for subsequent tasks. Storage only keeps the latest
+    # structure of a pipeline, so tasks queued for a version this process never compiled, because it started or
+    # evicted it after the change, or because the change was made twice meanwhile, are executed by the latest version
+    # rather than dropped. Only the versions this process compiled before a change keep executing the tasks queued for
+    # them.
+    pipeline_record = fetch_pipeline(task.pipeline_id)
+    if pipeline_record is None:
+        raise MissingPipelineError(f"Pipeline '{task.pipeline_id}' referenced by a task does not exist.")
+    if pipeline_record.version != task.pipeline_version:
+        pipeline = pipeline_cache.get(pipeline_record.id, pipeline_record.version)
+        if pipeline is not None:
+            return pipeline
+    pipeline = _instrument(Pipeline.from_dict(pipeline_record.structure), pipeline_record.id, recorder)
+    pipeline_cache.put(pipeline_record.id, pipeline_record.version, pipeline)
+    return pipeline
+
+
+def _reload_pipelines(pipeline_cache: PipelineCache, recorder: None | MetricsRecorder = None) -> None:
+    # Compile the new versions of changed pipelines ahead of the tasks that reference them, rather than when the
+    # first of those tasks arrives. Swapping happens between tasks, so a task being executed always finishes on
+    # the version it started with, and tasks queued before the change still find that version in the cache.
+    for pipeline_id, version in pipeline_cache.latest_versions.items():
+        pipeline_record = fetch_pipeline(pipeline_id)
+        if pipeline_record is None or pipeline_record.version <= version:
+            continue
+        try:
+            pipeline = _instrument(Pipeline.from_dict(pipeline_record.structure), pipeline_id, recorder)
+        except (KeyError, ValueError) as error:
+            _logger.warning("Pipeline '%s' version %s could not be compiled: %s", pipeline_id, pipeline_record.version,
+                            error)
+            continue
+        pipeline_cache.put(pipeline_record.id, pipeline_record.version, pipeline)
 
 
 class Executor(multiprocessing.Process):
-    def __init__(self, stop_event: multiprocessing.Event, task_queue: multiprocessing.JoinableQueue, debug: bool = False) -> None:
+    def __init__(self, stop_event: multiprocessing.Event, task_queue: multiprocessing.JoinableQueue, debug: bool = False,
+                 pipeline_cache_size: int = 128, batch_size: int = 1, batch_timeout_ms: float = 0.0,
+                 node_threads: int = 0) -> None:
         super().__init__()
+        if batch_size < 1:
+            raise ValueError(f"Executor batch size must be at least 1, got {batch_size}.")
 
+        # Log every consumed task at debug level.
         self.__debug = debug
+        # With a batch size above 1, up to that many tasks are taken off the queue at once, waiting up to the batch
+        # timeout for more to arrive, and executed together.
+        self.__batch_size = batch_size
+        self.__batch_timeout = batch_timeout_ms / 1_000
+        # With node threads, the independent nodes of a pipeline generation, such as the sinks a switch fans out to,
+        # are executed concurrently by a pool of that many threads. Only tasks executed one at a time use the pool.
+        self.__node_threads = node_threads
 
         self.__task_queue = task_queue
         self.__stop_event = stop_event
 
+        # Created before the process starts so that its counters are shared with the parent.
+        self.__pipeline_cache = PipelineCache(max_size=pipeline_cache_size)
+        self.__executed = multiprocessing.RawValue("Q", 0)
+        self.__failed = multiprocessing.RawValue("Q", 0)
+        # Tasks got from the queue, each of which is counted as executed or failed once done with.
+        self.__taken = multiprocessing.RawValue("Q", 0)
+
+    @property
+    def pipeline_cache(self) -> PipelineCache:
+        return self.__pipeline_cache
+
+    @property
+    def stats(self) -> dict[str, int]:
+        return {
+            "executed": self.__executed.value,
+            "failed": self.__failed.value
+        }
+
+    @property
+    def unfinished(self) -> int:
+        # Tasks got from the queue and not done with yet, which the supervisor finishes for an executor that died.
+        return self.__taken.value - self.__executed.value - self.__failed.value
+
     def run(self) -> None:
+        # Threads do not survive a fork, so the pool is created in the Executor process.
+        pool = ThreadPoolExecutor(self.__node_threads, "pipeline-node") if self.__node_threads > 0 else None
+        recorder = current_metrics()
+        try:
+            self.__consume(pool, recorder)
+        finally:
+            if pool is not None:
+                pool.shutdown()
+            if recorder is not None:
+                recorder.flush()
+
+    def __consume(self, pool: None | ThreadPoolExecutor, recorder: None | MetricsRecorder) -> None:
+        revision = storage_revision()
+        next_reload = time.monotonic() + _RELOAD_INTERVAL
         while not self.__stop_event.is_set():
+            now = time.monotonic()
+            if now >= next_reload:
+                next_reload = now + _RELOAD_INTERVAL
+                current_revision = storage_revision()
+                if current_revision != revision:
+                    revision = current_revision
+                    _reload_pipelines(self.__pipeline_cache, recorder)
+
+            if self.__batch_size > 1:
+                try:
+                    tasks = self.__next_batch()
+                except queue.Empty:
+                    continue
+                self.__execute_batch(tasks, recorder)
+                continue
+
             try:
                 # Try fetching a task item off the queue and process it
-                task_data: dict = self.__task_queue.get(timeout=1)
-                message_data: dict = task_data["message"]
-                structure_data: dict = task_data["structure"]
-                message = Message(**message_data)
-                received_time = 0
-                if self.__debug:
-                    print(f"-> Consuming task with message: {message}")
-                    received_time = time.time()
-                    received_latency = received_time - message.timestamp
-                    print(f"Received latency: {received_latency * 1_000} ms")
-
-                # Build the pipeline and execute it with the given message
-                pipeline = Pipeline.from_dict(structure_data)
-                pipeline.execute(message)
-
-                if self.__debug:
-                    processed_time = time.time()
-                    pipeline_processing_time = processed_time - received_time
-                    total_processing_time = processed_time - message.timestamp
-                    print(f"<- Consumed task with message: {message}")
-                    print(f"Pipeline time to processes: {pipeline_processing_time * 1_000} ms")
-                    print(f"Total time to processes: {total_processing_time * 1_000} ms")
+                task: Task = self.__task_queue.get(timeout=1)
+            except queue.Empty:
+                continue
+            self.__taken.value += 1
+            message = Message(timestamp=task.timestamp, topic=task.topic, raw=task.payload, encoding=task.encoding)
+            if self.__debug:
+                _logger.debug("Consuming task of pipeline '%s' with %r", task.pipeline_id, message)
 
+            try:
+                # Resolve the pipeline referenced by the task and execute it with the given message
+                if recorder is None:
+                    pipeline = _resolve_pipeline(self.__pipeline_cache, task)
+                    pipeline.execute(message, pool=pool)
+                else:
+                    self.__execute_measured(task, message, pool, recorder)
+                self.__executed.value += 1
+            except MissingPipelineError as error:
+                self.__failed.value += 1
+                _logger.warning("Dropped a task: %s", error)
+            except Exception:
+                # A task failing, such as on a payload its nodes cannot handle, must not stop the executor from
+                # consuming the tasks after it.
+                self.__failed.value += 1
+                _logger.exception("Task of pipeline '%s' failed", task.pipeline_id)
+            finally:
                 self.__task_queue.task_done()
+
+    def __next_batch(self) -> list[Task]:
+        tasks = [self.__task_queue.get(timeout=1)]
+        self.__taken.value += 1
+        deadline = time.monotonic() + self.__batch_timeout
+        while len(tasks) < self.__batch_size:
+            # Take whatever is queued already, and wait for more only while the batch timeout allows.
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    tasks.append(self.__task_queue.get(timeout=remaining))
+                else:
+                    tasks.append(self.__task_queue.get_nowait())
             except queue.Empty:
-                pass
+                break
+            self.__taken.value += 1
+        return tasks
+
+    def __execute_measured(self, task: Task, message: Message, pool: None | ThreadPoolExecutor,
+                           recorder: MetricsRecorder) -> None:
+        metrics = recorder.pipeline(task.pipeline_id)
+        if task.enqueued:
+            metrics.queue_wait.record(time.time() - task.enqueued)
+        start = time.perf_counter_ns()
+        try:
+            pipeline = _resolve_pipeline(self.__pipeline_cache, task, recorder)
+            pipeline.execute(message, pool=pool)
+        except Exception:
+            metrics.failures.add()
+            raise
+        metrics.duration.record_ns(time.perf_counter_ns() - start)
+        metrics.end_to_end.record(time.time() - task.timestamp)
+
+    def __execute_batch(self, tasks: list[Task], recorder: None | MetricsRecorder) -> None:
+        if self.__debug:
+            _logger.debug("Consuming batch of %d tasks", len(tasks))
+        dequeued = time.time()
+        # Tasks of the same pipeline version are executed together, in the order they were queued.
+        batches: dict[tuple[int, int], list[Task]] = {}
+        for task in tasks:
+            batches.setdefault((task.pipeline_id, task.pipeline_version), []).append(task)
+        for batch in batches.values():
+            metrics = None if recorder is None else recorder.pipeline(batch[0].pipeline_id)
+            if metrics is not None:
+                for task in batch:
+                    if task.enqueued:
+                        metrics.queue_wait.record(dequeued - task.enqueued)
+
+            start = time.perf_counter_ns()
+            try:
+                pipeline = _resolve_pipeline(self.__pipeline_cache, batch[0], recorder)
+            except MissingPipelineError as error:
+                self.__failed.value += len(batch)
+                if metrics is not None:
+                    metrics.failures.add(len(batch))
+                _logger.warning("Dropped %d tasks: %s", len(batch), error)
+                continue
+            except Exception:
+                # Only the batch of the pipeline version that cannot be compiled is lost, the others are still executed.
+                self.__failed.value += len(batch)
+                if metrics is not None:
+                    metrics.failures.add(len(batch))
+                _logger.exception("Batch of %d tasks of pipeline '%s' failed", len(batch), batch[0].pipeline_id)
+                continue
+            try:
+                pipeline.execute_batch([Message(timestamp=task.timestamp, topic=task.topic, raw=task.payload,
+                                                encoding=task.encoding) for task in batch])
+            except Exception:
+                self.__execute_singly(pipeline, batch, metrics)
+                continue
+            self.__executed.value += len(batch)
+
+            if metrics is not None:
+                # Every task of the batch is recorded with an equal share of its execution time.
+                duration = (time.perf_counter_ns() - start) // len(batch)
+                processed = time.time()
+                for task in batch:
+                    metrics.duration.record_ns(duration)
+                    metrics.end_to_end.record(processed - task.timestamp)
+        for _ in tasks:
+            self.__task_queue.task_done()
+
+    def __execute_singly(self, pipeline: Pipeline, batch: list[Task], metrics: None | PipelineMetrics) -> None:
+        # A task failing fails the whole batch it was executed in, so the batch is executed again one task at a time
+        # for only the failing tasks to be dropped. Side effects of the tasks executed before the failure, such as
+        # publishes, are repeated.
+        for task in batch:
+            start = time.perf_counter_ns()
+            try:
+                pipeline.execute(Message(timestamp=task.timestamp, topic=task.topic, raw=task.payload,
+                                         encoding=task.encoding))
+            except Exception:
+                self.__failed.value += 1
+                if metrics is not None:
+                    metrics.failures.add()
+                _logger.exception("Task of pipeline '%s' failed", task.pipeline_id)
+                continue
+            self.__executed.value += 1
+            if metrics is not None:
+                metrics.duration.record_ns(time.perf_counter_ns() - start)
+                metrics.end_to_end.record(time.time() - task.timestamp)
@@ -4,13 +4,82 @@ Node Message Module
 
 """
 
-from dataclasses import dataclass
+from ..encodings import UTF8, parse_json, payload_decoder
 
 
 Payload = None | str | int | float | bool | dict | list
 
+_UNDECODED = object()
+
 
-@dataclass
 class Message:
-    timestamp: float
-    payload: Payload
+    # Messages built from ingested bytes keep them as they are and decode them according to the encoding of their
+    # subscription the first time the payload is accessed, so that pipelines which only pass messages on, or publish
+    # them unchanged, never decode them. The decoded payload is kept for later accesses. The raw bytes may be a view
+    # of a shared memory queue, which is only valid until the task of the message is done.
+    #
+    # Messages are immutable, and every attribute is a slot rather than an instance dictionary entry.
+    __slots__ = ("__timestamp", "__topic", "__raw", "__encoding", "__payload", "__document")
+
+    def __init__(self, timestamp: float, payload: Payload = None, topic: None | str = None,
+                 raw: None | bytes | memoryview = None, encoding: str = UTF8) -> None:
+        self.__timestamp = timestamp
+        self.__topic = topic
+        self.__raw = raw
+        self.__encoding = encoding
+        self.__payload = payload if raw is None else _UNDECODED
+        self.__document = _UNDECODED
+
+    @property
+    def timestamp(self) -> float:
+        return self.__timestamp
+
+    @property
+    def topic(self) -> None | str:
+        return self.__topic
+
+    @property
+    def raw(self) -> None | bytes | memoryview:
+        # The bytes the message was ingested as, None for messages built from a payload.
+        return self.__raw
+
+    @property
+    def encoding(self) -> str:
+        return self.__encoding
+
+    @property
+    def is_decoded(self) -> bool:
+        return self.__payload is not _UNDECODED
+
+    @property
+    def payload(self) -> Payload:
+        payload = self.__payload
+        if payload is _UNDECODED:
+            payload = self.__payload = payload_decoder(self.__encoding)(self.__raw)
+        return payload
+
+    @property
+    def json(self) -> Payload:
+        # The payload parsed as JSON, at most once per message however many nodes read it. Payloads ingested as UTF-8
+        # are parsed from their raw bytes without decoding them into a string first. Strings that are not JSON are
+        # returned as they are, and so are payloads that are not strings, such as those of JSON or MessagePack
+        # subscriptions, or those computed by a node.
+        document = self.__document
+        if document is _UNDECODED:
+            if self.__payload is _UNDECODED and self.__encoding == UTF8:
+                text = self.__raw
+            else:
+                text = self.payload
+            document = text
+            if isinstance(text, (str, bytes, memoryview)):
+                try:
+                    document = parse_json(text)
+                except ValueError:
+                    document = self.payload
+            self.__document = document
+        return document
+
+    def __repr__(self) -> str:
+        if self.__payload is _UNDECODED:
+            return f"Message(timestamp={self.__timestamp!r}, topic={self.__topic!r}, raw={bytes(self.__raw)!r})"
+        return f"Message(timestamp={self.__timestamp!r}, topic={self.__topic!r}, payload={self.__payload!r})"
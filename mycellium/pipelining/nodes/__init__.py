@@ -10,12 +10,19 @@ from .debug import *
 from .mqtt import *
 from .node import *
 from .switch import *
+from .throttle import *
+from .transform import *
+from .window import *
 
 
 _types: dict[str, Type[Node]] = {
     "debug": DebugNode,
     "switch": SwitchNode,
-    "mqtt": MQTTPublisherNode
+    "mqtt": MQTTPublisherNode,
+    "throttle": ThrottleNode,
+    "transform": TransformNode,
+    "extract": TransformNode,
+    "window": WindowNode
 }
 
 
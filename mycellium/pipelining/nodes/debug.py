@@ -4,11 +4,18 @@ Debug Node Module
 
 """
 
+import logging
+
 from .node import Node
-from ..message import Message, Payload
+from ..message import Message
+
+
+_logger = logging.getLogger(__name__)
 
 
 class DebugNode(Node):
+    blocking = False
+
     def __init__(self, output_ports: list[str], config: dict) -> None:
         super().__init__(output_ports)
         config_output: str = config["output"]
@@ -16,8 +23,11 @@ class DebugNode(Node):
         self.__output = config_output
         self.__show_payload = config_show_payload
 
-    def process(self, message: Message) -> tuple[set[str], Payload]:
-        print(self.__output)
-        if self.__show_payload:
-            print(f"Payload: {message.payload}")
-        return self.children, message.payload
+    def process(self, message: Message) -> tuple[set[str], Message]:
+        # Logged rather than printed, so that debug nodes left in a pipeline cost little once the level is raised.
+        if _logger.isEnabledFor(logging.INFO):
+            if self.__show_payload:
+                _logger.info("%s Payload: %r", self.__output, message.payload)
+            else:
+                _logger.info("%s", self.__output)
+        return self.children, message
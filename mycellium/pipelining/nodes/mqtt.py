@@ -4,10 +4,17 @@ MQTT Publisher Node Module
 
 """
 
-import paho.mqtt.client as mqtt
+import logging
+import threading
 
 from .node import Node
+from ..buffers import OutboundBuffer, OverflowPolicy
+from ..connections import PooledMQTTClient, mqtt_connection_pool
 from ..message import Message, Payload
+from ...encodings import dump_json
+
+
+_logger = logging.getLogger(__name__)
 
 
 class MQTTPublisherNode(Node):
@@ -19,16 +26,78 @@ class MQTTPublisherNode(Node):
         self.__topic: str = config["topic"]
         self.__qos = int(config["qos"])
 
-        self.__client = mqtt.Client()
+        # Optional asynchronous mode, where payloads are buffered and published in bulk by a background thread.
+        self.__is_async = bool(config.get("async", False))
+        self.__max_inflight = int(config.get("max_inflight", 1_000))
+        self.__flush_interval = float(config.get("flush_interval_ms", 0)) / 1_000
+        self.__backpressure = OverflowPolicy(config.get("backpressure", OverflowPolicy.BLOCK.value))
+        self.__sample_every = int(config.get("sample_every", 10))
+
+        # Borrowed from the process's connection pool on first use, so that building a pipeline does not connect.
+        self.__client: None | PooledMQTTClient = None
+        self.__buffer: None | OutboundBuffer = None
+        self.__client_lock = threading.Lock()
+
+    @property
+    def stats(self) -> dict[str, int]:
+        buffer = self.__buffer
+        return {} if buffer is None else buffer.stats
+
+    def process(self, message: Message) -> tuple[set[str], Message]:
+        if self.__client is None:
+            self.__connect()
+
+        # Ingested messages are published as they arrived, without decoding them. Views of a shared memory queue are
+        # copied, as paho only publishes bytes and they are no longer valid once the task is done. Payloads computed
+        # by nodes, such as the aggregates of a window, are published as JSON when they are dicts or lists, which paho
+        # does not publish.
+        payload = message.raw
+        if payload is None:
+            payload = message.payload
+            if isinstance(payload, (dict, list, tuple)):
+                payload = dump_json(payload)
+        elif not isinstance(payload, bytes):
+            payload = bytes(payload)
+
+        if self.__buffer is not None:
+            self.__buffer.put(payload)
+        else:
+            self.__client.publish(self.__topic, payload, qos=self.__qos)
 
-    def process(self, message: Message) -> tuple[set[str], Payload]:
-        # Connect to the broker
-        self.__client.connect(self.__broker_host, self.__broker_port)
-        # Publish a message
-        self.__client.publish(self.__topic, message.payload, qos=self.__qos)
-        # Disconnect from the broker
-        self.__client.disconnect()
+        return self.children, message
 
-        return self.children, message.payload
+    def close(self) -> None:
+        with self.__client_lock:
+            if self.__buffer is not None:
+                self.__buffer.close()
+                self.__buffer = None
+            if self.__client is not None:
+                mqtt_connection_pool().release(self.__client)
+                self.__client = None
 
+    def __connect(self) -> None:
+        with self.__client_lock:
+            if self.__client is not None:
+                return
+            client = mqtt_connection_pool().acquire(self.__broker_host, self.__broker_port)
+            if self.__is_async:
+                self.__buffer = OutboundBuffer(self.__publish_batch, capacity=self.__max_inflight,
+                                               flush_interval=self.__flush_interval, policy=self.__backpressure,
+                                               name=f"mqtt-publisher-{self.__topic}",
+                                               sample_every=self.__sample_every)
+            self.__client = client
 
+    def __publish_batch(self, payloads: list[Payload]) -> int:
+        # A payload paho refuses, such as one too large for a packet, is lost on its own rather than with the rest of
+        # the batch. Returns the number of payloads lost.
+        lost = 0
+        error = None
+        for payload in payloads:
+            try:
+                self.__client.publish(self.__topic, payload, qos=self.__qos)
+            except Exception as publish_error:
+                lost += 1
+                error = publish_error
+        if lost:
+            _logger.warning("Lost %d of %d payloads published to '%s': %r", lost, len(payloads), self.__topic, error)
+        return lost
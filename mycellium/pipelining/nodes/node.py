@@ -4,18 +4,36 @@ Node Module
 
 """
 
+import asyncio
 from abc import ABC, abstractmethod
 
 from ..message import Message, Payload
 
 
 class Node(ABC):
+    # Whether `process` may block, on I/O for instance. The asynchronous runtime runs blocking nodes on a thread pool
+    # and the others inline on its event loop.
+    blocking: bool = True
+
     def __init__(self, output_ports: list[str], config: None | dict = None) -> None:
         self.__outputs: dict[str, set[str]] = {output_port: set() for output_port in output_ports}
-        self.__parents: set[str] = set()
+        self.__parents: frozenset[str] = frozenset()
+        # Cached union of all port children, so that returning every child does not allocate per message.
+        self.__children: frozenset[str] = frozenset()
 
     @abstractmethod
-    def process(self, message: Message) -> tuple[set[str], Payload]:
+    def process(self, message: Message) -> tuple[set[str], Payload | Message]:
+        # Returns the children to pass the result on to, and the result. Nodes that pass their input on unchanged
+        # return the message itself rather than its payload, so that it is not decoded on their account.
+        pass
+
+    def process_batch(self, messages: list[Message]) -> list[tuple[set[str], Payload | Message]]:
+        # Process several messages at once, returning what `process` would for each. Nodes that can share work
+        # across the messages override this, the others process them one by one.
+        return [self.process(message) for message in messages]
+
+    def close(self) -> None:
+        # Release any resources held by the node once its pipeline is discarded.
         pass
 
     @property
@@ -23,11 +41,11 @@ class Node(ABC):
         return len(self.__outputs)
 
     @property
-    def children(self) -> set[str]:
-        return set().union(*self.__outputs.values())
+    def children(self) -> frozenset[str]:
+        return self.__children
 
     @property
-    def parents(self) -> set[str]:
+    def parents(self) -> frozenset[str]:
         return self.__parents
 
     def port_children(self, port: str) -> set[str]:
@@ -35,8 +53,20 @@ class Node(ABC):
 
     def add_child(self, output_port: str, child_label: str) -> None:
         self.__outputs[output_port].add(child_label)
+        self.__children = self.__children.union((child_label,))
 
     def add_parent(self, parent_label: str) -> None:
-        self.__parents.add(parent_label)
+        self.__parents = self.__parents.union((parent_label,))
 
 
+class AsyncNode(Node):
+    # A node implemented as a coroutine, which the asynchronous runtime awaits on its event loop. Executed by the
+    # synchronous runtime, each message gets an event loop of its own.
+    blocking = False
+
+    @abstractmethod
+    async def process_async(self, message: Message) -> tuple[set[str], Payload | Message]:
+        pass
+
+    def process(self, message: Message) -> tuple[set[str], Payload | Message]:
+        return asyncio.run(self.process_async(message))
@@ -0,0 +1,107 @@
+"""
+Node State Module
+=================
+
+"""
+
+import json
+from array import array
+from collections import OrderedDict
+from typing import Any, Callable, Generic, TypeVar
+
+
+_State = TypeVar("_State")
+
+
+def state_key(value: Any) -> Any:
+    # Keys taken from payloads may be dicts or lists, which are keyed by their canonical JSON instead.
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, sort_keys=True)
+    return value
+
+
+class KeyedState(Generic[_State]):
+    # The state a stateful node keeps per key, for at most `max_keys` keys. Once full, the state of the least
+    # recently used key is discarded to make room, so that a node's memory is bounded however many keys its stream
+    # carries. Nodes are instantiated per pipeline in every executor, so state is only complete when every message
+    # of a key is routed to the same executor, which dispatchers sharding by topic or by the key field ensure.
+    def __init__(self, factory: Callable[[], _State], max_keys: int = 10_000) -> None:
+        if max_keys < 1:
+            raise ValueError(f"Stateful nodes must keep at least one key, got {max_keys}.")
+        self.__factory = factory
+        self.__max_keys = max_keys
+        self.__states: OrderedDict[Any, _State] = OrderedDict()
+        self.__evicted = 0
+
+    def __len__(self) -> int:
+        return len(self.__states)
+
+    @property
+    def evicted(self) -> int:
+        return self.__evicted
+
+    def get(self, key: Any) -> _State:
+        state = self.__states.get(key)
+        if state is None:
+            state = self.__factory()
+            self.__states[key] = state
+            if len(self.__states) > self.__max_keys:
+                self.__states.popitem(last=False)
+                self.__evicted += 1
+        else:
+            self.__states.move_to_end(key)
+        return state
+
+
+class RingBuffer:
+    # The latest `capacity` samples of a key with their timestamps, in arrays allocated once. Appending to a full
+    # buffer overwrites its oldest sample, so that it takes 16 bytes per sample of capacity whatever the rate of its
+    # stream. Samples are stored from `start` onwards and wrap around the end of the arrays.
+    __slots__ = ("values", "times", "start", "count")
+
+    def __init__(self, capacity: int) -> None:
+        self.values = array("d", bytes(8 * capacity))
+        self.times = array("d", bytes(8 * capacity))
+        self.start = 0
+        self.count = 0
+
+    def __len__(self) -> int:
+        return self.count
+
+    @property
+    def capacity(self) -> int:
+        return len(self.values)
+
+    @property
+    def oldest_time(self) -> float:
+        return self.times[self.start]
+
+    def append(self, value: float, timestamp: float) -> None:
+        capacity = len(self.values)
+        end = self.start + self.count
+        if end >= capacity:
+            end -= capacity
+        self.values[end] = value
+        self.times[end] = timestamp
+        if self.count < capacity:
+            self.count += 1
+        else:
+            self.start = end + 1 if end + 1 < capacity else 0
+
+    def pop_oldest(self) -> float:
+        value = self.values[self.start]
+        self.start = self.start + 1 if self.start + 1 < len(self.values) else 0
+        self.count -= 1
+        return value
+
+    def clear(self) -> None:
+        self.start = 0
+        self.count = 0
+
+    def samples(self) -> list[memoryview]:
+        # The stored values as one or two views of the array, depending on whether they wrap around its end.
+        view = memoryview(self.values)
+        end = self.start + self.count
+        if end <= len(self.values):
+            return [view[self.start:end]]
+        return [view[self.start:], view[:end - len(self.values)]]
@@ -4,11 +4,20 @@ Switch Node Module
 
 """
 
+import operator
 from enum import Enum
+from functools import partial
 from dataclasses import dataclass
+from typing import Any, Callable
 
 from .node import Node
 from ..message import Message, Payload
+from ...fields import MISSING, field_getter
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 
 class _Comparison(Enum):
@@ -26,46 +35,184 @@ class _Comparison(Enum):
 class _Condition:
     comparison: _Comparison
     value: None | int | str | float | bool
+    # Dotted path of the compared value within dict payloads, e.g. 'payload.temperature'. The whole payload is
+    # compared when there is none.
+    field: None | str = None
+
+
+# Predicates take the compared value, the value of the condition being bound beforehand. Ordering comparisons are
+# written mirrored so that `operator` functions can be bound with the value of the condition as their first argument.
+_predicates: dict[_Comparison, Callable[[Any], Callable[[Any], Any]]] = {
+    _Comparison.EQUALS: lambda right_value: partial(operator.eq, right_value),
+    _Comparison.NOT_EQUALS: lambda right_value: partial(operator.ne, right_value),
+    _Comparison.AND: lambda right_value: lambda left_value: left_value and right_value,
+    _Comparison.OR: lambda right_value: lambda left_value: left_value or right_value,
+    _Comparison.LESS_THAN: lambda right_value: partial(operator.gt, right_value),
+    _Comparison.LESS_THAN_OR_EQUAL: lambda right_value: partial(operator.ge, right_value),
+    _Comparison.GREATER_THAN: lambda right_value: partial(operator.lt, right_value),
+    _Comparison.GREATER_THAN_OR_EQUAL: lambda right_value: partial(operator.le, right_value)
+}
+
+# NumPy functions of the comparisons that batches of numbers can be evaluated with at once.
+_vectorized_comparisons = {} if numpy is None else {
+    _Comparison.EQUALS: numpy.equal,
+    _Comparison.NOT_EQUALS: numpy.not_equal,
+    _Comparison.LESS_THAN: numpy.less,
+    _Comparison.LESS_THAN_OR_EQUAL: numpy.less_equal,
+    _Comparison.GREATER_THAN: numpy.greater,
+    _Comparison.GREATER_THAN_OR_EQUAL: numpy.greater_equal
+}
+
+# Batches smaller than this are not worth converting into arrays.
+_MIN_VECTORIZED_BATCH = 16
+
+# Integers up to this magnitude are represented exactly as floats, which NumPy converts integer arrays into to compare
+# them with a float.
+_MAX_EXACT_INTEGER = 2 ** 53
+
+# Bound on the number of port combinations whose children are kept per switch.
+_MAX_ROUTES = 1_024
 
 
 class SwitchNode(Node):
+    # Conditions are compiled into predicates when the node is built, grouped by the field they compare so that
+    # each field is looked up once per message. The ports a message passes are collected as a bit mask, which
+    # indexes the precomputed union of the children of those ports. Switches made up only of equality conditions on
+    # a single field resolve the bit mask with a single dictionary lookup of the compared value.
+    blocking = False
+
     def __init__(self, output_ports: list[str], config: dict) -> None:
         super().__init__(output_ports)
         config_conditions: dict = config["conditions"]
         self.__output_conditions: dict[str, _Condition] = {
-            output_port: _Condition(comparison=_Comparison(condition["comparison"]), value=condition["value"])
+            output_port: _Condition(comparison=_Comparison(condition["comparison"]), value=condition["value"],
+                                    field=condition.get("field"))
             for output_port, condition in config_conditions.items()
         }
+        self.__ports = list(self.__output_conditions)
+
+        groups: dict[None | str, list[tuple[Callable[[Any], Any], int]]] = {}
+        for position, condition in enumerate(self.__output_conditions.values()):
+            predicate = _predicates[condition.comparison](condition.value)
+            groups.setdefault(condition.field, []).append((predicate, 1 << position))
+        self.__groups = [(field_getter(field), tests) for field, tests in groups.items()]
+
+        # The comparisons of each field as NumPy functions, when every condition compares with a number that NumPy
+        # represents exactly.
+        self.__vectorized_groups: None | list = None
+        self.__compares_floats = any(type(condition.value) is float for condition in self.__output_conditions.values())
+        if all(condition.comparison in _vectorized_comparisons and type(condition.value) in (int, float, bool)
+               and abs(condition.value) < _MAX_EXACT_INTEGER for condition in self.__output_conditions.values()):
+            vectorized_groups: dict[None | str, list[tuple[Any, Any, int]]] = {}
+            for position, condition in enumerate(self.__output_conditions.values()):
+                vectorized_groups.setdefault(condition.field, []).append(
+                    (_vectorized_comparisons[condition.comparison], condition.value, position))
+            self.__vectorized_groups = [(field_getter(field), tests) for field, tests in vectorized_groups.items()]
+
+        # Compared values mapped to the bit mask of the ports they pass, for equality only switches.
+        self.__equality_masks: None | dict[Any, int] = None
+        self.__equality_getter: None | Callable[[Payload], Any] = None
+        conditions = list(self.__output_conditions.values())
+        if (len(groups) == 1 and all(condition.comparison is _Comparison.EQUALS for condition in conditions)
+                and self.__is_hashable(condition.value for condition in conditions)):
+            self.__equality_masks = {}
+            for position, condition in enumerate(conditions):
+                self.__equality_masks[condition.value] = self.__equality_masks.get(condition.value, 0) | 1 << position
+            self.__equality_getter = self.__groups[0][0]
 
-    def process(self, message: Message) -> tuple[set[str], Payload]:
-        survived_children = set()
-        for output_port, condition in self.__output_conditions.items():
-            if self.__conditions_is_met(condition, message.payload):
-                survived_children = survived_children.union(self.port_children(output_port))
-        return survived_children, message.payload
+        # Union of the port children for each bit mask of passed ports seen so far.
+        self.__routes: dict[int, frozenset[str]] = {0: frozenset()}
+
+    def add_child(self, output_port: str, child_label: str) -> None:
+        super().add_child(output_port, child_label)
+        self.__routes = {0: frozenset()}
+
+    def process(self, message: Message) -> tuple[set[str], Message]:
+        payload = message.payload
+        if self.__equality_masks is not None:
+            value = payload if self.__equality_getter is None else self.__equality_getter(payload)
+            try:
+                mask = self.__equality_masks.get(value, 0)
+            except TypeError:
+                # Unhashable payloads, such as lists, equal none of the condition values.
+                mask = 0
+        else:
+            mask = 0
+            for getter, tests in self.__groups:
+                value = payload if getter is None else getter(payload)
+                if value is MISSING:
+                    # Payloads without the field fail every condition on it.
+                    continue
+                for predicate, bit in tests:
+                    if predicate(value):
+                        mask |= bit
+
+        return self.__children(mask), message
+
+    def process_batch(self, messages: list[Message]) -> list[tuple[set[str], Message]]:
+        # Batches of plain numbers (or of numeric fields) are compared with NumPy, a condition at a time over the
+        # whole batch. Anything else, and equality only switches which need a single lookup per message anyway, is
+        # processed message by message.
+        if self.__vectorized_groups is None or self.__equality_masks is not None or \
+                len(messages) < _MIN_VECTORIZED_BATCH:
+            return [self.process(message) for message in messages]
+
+        passed = numpy.zeros((len(self.__ports), len(messages)), dtype=bool)
+        for getter, tests in self.__vectorized_groups:
+            if getter is None:
+                values = [message.payload for message in messages]
+            else:
+                values = [getter(message.payload) for message in messages]
+            array = self.__numeric_array(values, self.__compares_floats)
+            if array is None:
+                return [self.process(message) for message in messages]
+            for compare, right_value, position in tests:
+                compare(array, right_value, out=passed[position])
+
+        if len(self.__ports) < 64:
+            shifts = numpy.arange(len(self.__ports), dtype=numpy.int64)[:, numpy.newaxis]
+            masks = numpy.bitwise_or.reduce(passed.astype(numpy.int64) << shifts, axis=0).tolist()
+        else:
+            packed = numpy.packbits(passed, axis=0, bitorder="little").T
+            masks = [int.from_bytes(row.tobytes(), "little") for row in packed]
+        return [(self.__children(mask), message) for mask, message in zip(masks, messages)]
+
+    def __children(self, mask: int) -> frozenset[str]:
+        survived_children = self.__routes.get(mask)
+        if survived_children is None:
+            survived_children = self.__route(mask)
+            if len(self.__routes) < _MAX_ROUTES:
+                self.__routes[mask] = survived_children
+        return survived_children
+
+    def __route(self, mask: int) -> frozenset[str]:
+        # Visit only the set bits, so that routing to few of many ports stays cheap.
+        children = []
+        while mask:
+            bit = mask & -mask
+            children.append(self.port_children(self.__ports[bit.bit_length() - 1]))
+            mask ^= bit
+        return frozenset().union(*children)
+
+    @staticmethod
+    def __numeric_array(values: list, compares_floats: bool) -> Any:
+        # Only batches of all integers or all floats, so that comparisons give the same results as in Python.
+        # Integers that do not fit into 64 bits end up as an array of objects. Integers compared with floats are
+        # converted into floats, so they must also be small enough to stay exact.
+        value_types = set(map(type, values))
+        if value_types != {int} and value_types != {float}:
+            return None
+        array = numpy.array(values)
+        if array.dtype.kind == "i" and compares_floats and \
+                (array.max() > _MAX_EXACT_INTEGER or array.min() < -_MAX_EXACT_INTEGER):
+            return None
+        return array if array.dtype.kind in "if" else None
 
     @staticmethod
-    def __conditions_is_met(condition: _Condition, payload: Payload) -> bool:
-        left_value = payload
-        right_value = condition.value
-
-        # Evaluate condition, if any of the cases are false, do not allow the node's predecessors to execute.
-        match condition.comparison:
-            case _Comparison.EQUALS:
-                return left_value == right_value
-            case _Comparison.NOT_EQUALS:
-                return left_value != right_value
-            case _Comparison.AND:
-                return left_value and right_value
-            case _Comparison.OR:
-                return left_value or right_value
-            case _Comparison.LESS_THAN:
-                return left_value < right_value
-            case _Comparison.LESS_THAN_OR_EQUAL:
-                return left_value <= right_value
-            case _Comparison.GREATER_THAN:
-                return left_value > right_value
-            case _Comparison.GREATER_THAN_OR_EQUAL:
-                return left_value >= right_value
-            case _:
-                raise ValueError(f"Unknown condition comparison provided: '{condition.comparison}'")
+    def __is_hashable(values) -> bool:
+        try:
+            for value in values:
+                hash(value)
+        except TypeError:
+            return False
+        return True
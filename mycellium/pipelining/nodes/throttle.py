@@ -0,0 +1,79 @@
+"""
+Throttle Node Module
+====================
+
+"""
+
+from enum import Enum
+
+from .node import Node
+from .state import KeyedState, state_key
+from ..message import Message
+from ...fields import MISSING, field_getter
+
+
+class _Mode(Enum):
+    THROTTLE = "throttle"
+    DEBOUNCE = "debounce"
+
+
+_NO_CHILDREN = frozenset()
+
+
+class _Timestamps:
+    __slots__ = ("passed", "seen")
+
+    def __init__(self) -> None:
+        self.passed = float("-inf")
+        self.seen = float("-inf")
+
+
+class ThrottleNode(Node):
+    # Passes on at most one message per interval of message timestamps and key, and drops the others, so that a
+    # 10 kHz stream throttled to 1000 ms reaches the nodes after it at 1 Hz. Throttling passes the first message of
+    # every interval. Debouncing passes a message only after its key has been quiet for the interval, so that bursts
+    # are reduced to their first message. Messages are passed on unchanged.
+    #
+    # As nodes are only run on messages, neither can pass the last message of an interval or burst once it is over.
+    # Keys and the affinity they require follow `WindowNode`.
+    blocking = False
+
+    def __init__(self, output_ports: list[str], config: dict) -> None:
+        super().__init__(output_ports)
+        config_interval_ms: float = config["interval_ms"]
+        config_mode: str = config.get("mode", "throttle")
+        config_key: None | str = config.get("key")
+        config_max_keys: int = config.get("max_keys", 10_000)
+        if config_interval_ms <= 0:
+            raise ValueError(f"Throttle interval must be positive, got {config_interval_ms} ms.")
+
+        self.__interval = config_interval_ms / 1_000
+        self.__debounce = _Mode(config_mode) is _Mode.DEBOUNCE
+        self.__get_key = field_getter(config_key)
+        self.__keyed = config_key is not None
+        self.__states: KeyedState[_Timestamps] = KeyedState(_Timestamps, config_max_keys)
+        self.__dropped = 0
+
+    @property
+    def dropped(self) -> int:
+        return self.__dropped
+
+    def process(self, message: Message) -> tuple[set[str], Message]:
+        key = None
+        if self.__keyed:
+            key = message.payload if self.__get_key is None else self.__get_key(message.payload)
+            # Messages without the key are throttled together.
+            key = None if key is MISSING else state_key(key)
+
+        state = self.__states.get(key)
+        timestamp = message.timestamp
+        if self.__debounce:
+            passed = timestamp - state.seen >= self.__interval
+            state.seen = timestamp
+        else:
+            passed = timestamp - state.passed >= self.__interval
+        if not passed:
+            self.__dropped += 1
+            return _NO_CHILDREN, message
+        state.passed = timestamp
+        return self.children, message
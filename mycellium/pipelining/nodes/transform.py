@@ -0,0 +1,266 @@
+"""
+Transform Node Module
+=====================
+
+"""
+
+import ast
+import json
+import warnings
+from dataclasses import dataclass
+from typing import Any, Callable
+
+from .node import Node
+from ..message import Message, Payload
+
+
+# Names expressions may refer to, bound to the message's payload parsed as JSON, its topic and its timestamp.
+_VARIABLES = ("payload", "topic", "timestamp")
+
+_FUNCTIONS = {
+    "abs": abs,
+    "min": min,
+    "max": max,
+    "round": round,
+    "len": len,
+    "int": int,
+    "float": float,
+    "str": str,
+    "bool": bool
+}
+
+# Bounds on the size of what products and powers may compute, so that an expression cannot build a number or a
+# sequence too large to hold, or to turn into a string. Integers are bounded by their bits. Sequences are bounded by
+# their elements, counting those of the sequences and dicts nested in them as often as they are repeated, as
+# `str([[0] * 1000] * 1000)` is a million elements long even though the outer list only holds a thousand.
+_MAX_BITS = 65_536
+_MAX_ELEMENTS = 65_536
+
+_SEQUENCES = (str, list, tuple)
+
+
+def _elements(value: Any, limit: int) -> int:
+    # Counted no further than past the limit, so that counting costs no more than the bound it checks.
+    if isinstance(value, str):
+        return len(value)
+    count = len(value)
+    for element in value.values() if isinstance(value, dict) else value:
+        if count > limit:
+            break
+        if isinstance(element, (str, list, tuple, dict)):
+            count += _elements(element, limit - count)
+    return count
+
+
+def _power(base: Any, exponent: Any) -> Any:
+    if (isinstance(base, int) and isinstance(exponent, int) and abs(base) > 1 and exponent > 0
+            and base.bit_length() * exponent > _MAX_BITS):
+        raise OverflowError(f"Power exceeds the maximum of {_MAX_BITS} bits.")
+    return base ** exponent
+
+
+def _multiply(left: Any, right: Any) -> Any:
+    if isinstance(left, _SEQUENCES) or isinstance(right, _SEQUENCES):
+        repeated, times = (left, right) if isinstance(left, _SEQUENCES) else (right, left)
+        if isinstance(times, int) and times > 1 and _elements(repeated, _MAX_ELEMENTS // times) * times > _MAX_ELEMENTS:
+            raise OverflowError(f"Repetition exceeds the maximum of {_MAX_ELEMENTS} elements.")
+    elif isinstance(left, int) and isinstance(right, int) and left.bit_length() + right.bit_length() > _MAX_BITS:
+        raise OverflowError(f"Product exceeds the maximum of {_MAX_BITS} bits.")
+    return left * right
+
+
+def _modulo(left: Any, right: Any) -> Any:
+    # On a string, `%` formats rather than computes a remainder, and a format such as '%200000000d' is as long as its
+    # width whatever the values formatted, so only remainders are supported.
+    if isinstance(left, str):
+        raise TypeError("Transform expressions cannot format strings with '%'.")
+    return left % right
+
+
+_ALLOWED_NODES = (
+    ast.Expression, ast.Constant, ast.Name, ast.Load, ast.Attribute, ast.Subscript, ast.Call, ast.BinOp, ast.UnaryOp,
+    ast.BoolOp, ast.Compare, ast.IfExp, ast.Tuple, ast.List,
+    ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow,
+    ast.UAdd, ast.USub, ast.Not, ast.And, ast.Or,
+    ast.Eq, ast.NotEq, ast.Lt, ast.LtE, ast.Gt, ast.GtE, ast.In, ast.NotIn
+)
+
+
+# Operators evaluated through functions that bound what they compute.
+_CHECKED_OPERATORS = {ast.Pow: "_power", ast.Mult: "_multiply", ast.Mod: "_modulo"}
+
+
+class _ExpressionCompiler(ast.NodeTransformer):
+    # Checks that an expression is made up only of arithmetic, comparisons, conditionals, literals, calls of the
+    # allowed functions and lookups within the variables, and rewrites attribute lookups into subscripts, so that
+    # `payload.sensor.value` reads `payload["sensor"]["value"]`. No attribute of any object is ever accessed, which
+    # keeps expressions from reaching anything beyond the message.
+    def generic_visit(self, node: ast.AST) -> ast.AST:
+        if not isinstance(node, _ALLOWED_NODES):
+            raise ValueError(f"Transform expressions cannot contain {type(node).__name__} nodes.")
+        return super().generic_visit(node)
+
+    def visit_Constant(self, node: ast.Constant) -> ast.AST:
+        if node.value is not None and not isinstance(node.value, (int, float, str)):
+            raise ValueError(f"Transform expressions cannot contain the constant {node.value!r}.")
+        return node
+
+    def visit_Name(self, node: ast.Name) -> ast.AST:
+        if node.id not in _VARIABLES:
+            raise ValueError(f"Unknown name '{node.id}' in transform expression, expected one of "
+                             f"{', '.join(_VARIABLES)}.")
+        return node
+
+    def visit_Attribute(self, node: ast.Attribute) -> ast.AST:
+        return ast.copy_location(ast.Subscript(value=self.visit(node.value), slice=ast.Constant(node.attr),
+                                               ctx=ast.Load()), node)
+
+    def visit_Call(self, node: ast.Call) -> ast.AST:
+        if not isinstance(node.func, ast.Name) or node.func.id not in _FUNCTIONS or node.keywords:
+            raise ValueError(f"Transform expressions can only call {', '.join(_FUNCTIONS)} with positional "
+                             f"arguments.")
+        node.args = [self.visit(argument) for argument in node.args]
+        return node
+
+    def visit_BinOp(self, node: ast.BinOp) -> ast.AST:
+        node = self.generic_visit(node)
+        function = _CHECKED_OPERATORS.get(type(node.op))
+        if function is not None:
+            return ast.copy_location(ast.Call(func=ast.Name(function, ast.Load()), args=[node.left, node.right],
+                                              keywords=[]), node)
+        return node
+
+
+def _compile_expression(source: str) -> Callable[[Payload, None | str, float], Any]:
+    # Expressions are compiled into a function once, when the node is built, rather than interpreted per message.
+    try:
+        tree = ast.parse(source, mode="eval")
+    except SyntaxError as error:
+        raise ValueError(f"Invalid transform expression '{source}': {error.msg}.") from None
+    body = _ExpressionCompiler().visit(tree).body
+    arguments = ast.arguments(posonlyargs=[], args=[ast.arg(variable) for variable in _VARIABLES], kwonlyargs=[],
+                              kw_defaults=[], defaults=[])
+    function = ast.fix_missing_locations(ast.Expression(ast.Lambda(args=arguments, body=body)))
+    scope = {"__builtins__": {}, "_power": _power, "_multiply": _multiply, "_modulo": _modulo, **_FUNCTIONS}
+    with warnings.catch_warnings():
+        # Such as for subscripts of literals that always fail, which fail per message like any other.
+        warnings.simplefilter("ignore", SyntaxWarning)
+        code = compile(function, f"<transform {source}>", "eval")
+    return eval(code, scope)
+
+
+def _to_int(value: Any) -> int:
+    # Numeric strings such as '21.5' are truncated like the numbers they represent.
+    if isinstance(value, str):
+        try:
+            return int(value)
+        except ValueError:
+            return int(float(value))
+    return int(value)
+
+
+_BOOLEAN_STRINGS = {"true": True, "1": True, "yes": True, "on": True,
+                    "false": False, "0": False, "no": False, "off": False, "": False}
+
+
+def _to_bool(value: Any) -> bool:
+    if isinstance(value, str):
+        return _BOOLEAN_STRINGS[value.strip().lower()]
+    return bool(value)
+
+
+def _to_str(value: Any) -> str:
+    return value if isinstance(value, str) else json.dumps(value)
+
+
+_CASTS: dict[str, Callable[[Any], Any]] = {
+    "int": _to_int,
+    "float": float,
+    "bool": _to_bool,
+    "str": _to_str
+}
+
+# What evaluating an expression on a payload it does not fit raises, such as a missing field or a division by zero.
+_EVALUATION_ERRORS = (LookupError, TypeError, ValueError, ArithmeticError)
+
+_NO_CHILDREN = frozenset()
+
+_NO_DEFAULT = object()
+
+
+@dataclass(frozen=True)
+class _Output:
+    evaluate: Callable[[Payload, None | str, float], Any]
+    cast: None | Callable[[Any], Any]
+    default: Any
+
+
+def _output(config: str | dict) -> _Output:
+    if isinstance(config, str):
+        config = {"expression": config}
+    config_expression: str = config["expression"]
+    config_type: None | str = config.get("type")
+    if config_type is not None and config_type not in _CASTS:
+        raise ValueError(f"Unknown transform output type provided: '{config_type}', expected one of "
+                         f"{', '.join(_CASTS)}.")
+    return _Output(evaluate=_compile_expression(config_expression),
+                   cast=None if config_type is None else _CASTS[config_type],
+                   default=config.get("default", _NO_DEFAULT))
+
+
+class _EvaluationFailed(Exception):
+    pass
+
+
+class TransformNode(Node):
+    # Computes a new payload from the message's payload parsed as JSON, with either a single expression, whose value
+    # becomes the payload, or named fields of expressions, which make up a dict payload. Expressions are arithmetic
+    # over field paths like `payload.sensor.temperature * 1.8 + 32` or `payload["readings"][0]`, the topic and the
+    # timestamp, and may convert their value into an int, float, bool or str, so that a switch after the node
+    # compares numbers rather than strings.
+    #
+    # An output that cannot be evaluated, because a field is missing or the value does not convert for instance,
+    # takes its default when it has one. Otherwise the message is dropped and counted as failed.
+    #
+    # Payloads are parsed once per message, so transform nodes reading the same message share a single parse.
+    blocking = False
+
+    def __init__(self, output_ports: list[str], config: dict) -> None:
+        super().__init__(output_ports)
+        config_expression: None | str = config.get("expression")
+        config_fields: None | dict[str, str | dict] = config.get("fields")
+        if (config_expression is None) == (config_fields is None):
+            raise ValueError("Transform nodes require either an expression or fields to compute.")
+
+        self.__output: None | _Output = None if config_expression is None else _output(config)
+        self.__fields: list[tuple[str, _Output]] = [
+            (name, _output(field_config)) for name, field_config in (config_fields or {}).items()
+        ]
+        self.__failed = 0
+
+    @property
+    def failed(self) -> int:
+        return self.__failed
+
+    def process(self, message: Message) -> tuple[set[str], Payload | Message]:
+        document = message.json
+        topic = message.topic
+        timestamp = message.timestamp
+        try:
+            if self.__output is not None:
+                return self.children, self.__evaluate(self.__output, document, topic, timestamp)
+            return self.children, {name: self.__evaluate(output, document, topic, timestamp)
+                                   for name, output in self.__fields}
+        except _EvaluationFailed:
+            self.__failed += 1
+            return _NO_CHILDREN, message
+
+    @staticmethod
+    def __evaluate(output: _Output, document: Payload, topic: None | str, timestamp: float) -> Any:
+        try:
+            value = output.evaluate(document, topic, timestamp)
+            return value if output.cast is None else output.cast(value)
+        except _EVALUATION_ERRORS:
+            if output.default is _NO_DEFAULT:
+                raise _EvaluationFailed from None
+            return output.default
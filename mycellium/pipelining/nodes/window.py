@@ -0,0 +1,201 @@
+"""
+Window Node Module
+==================
+
+"""
+
+import math
+from enum import Enum
+from typing import Any
+
+from .node import Node
+from .state import KeyedState, RingBuffer, state_key
+from ..message import Message, Payload
+from ...fields import MISSING, field_getter
+
+
+class _Window(Enum):
+    TUMBLING = "tumbling"
+    SLIDING = "sliding"
+
+
+_AGGREGATES = ("count", "sum", "min", "max", "mean")
+
+_NO_CHILDREN = frozenset()
+
+
+class _WindowState:
+    # Samples of a key with their running aggregates. Those of a tumbling window also cover the samples its ring
+    # buffer no longer holds once more than its capacity fall into it. Those of a sliding window are updated as
+    # samples leave it: the sum is summed afresh after as many evictions as the buffer holds, so that rounding errors
+    # do not accumulate, and the minimum or maximum is only searched for again once the sample holding it leaves.
+    __slots__ = ("samples", "window", "count", "total", "minimum", "maximum", "evictions")
+
+    def __init__(self, capacity: int) -> None:
+        self.samples = RingBuffer(capacity)
+        self.window: None | int = None
+        self.reset()
+
+    def reset(self) -> None:
+        self.samples.clear()
+        self.count = 0
+        self.total = 0.0
+        self.minimum: None | float = math.inf
+        self.maximum: None | float = -math.inf
+        self.evictions = 0
+
+    def add(self, value: float, timestamp: float) -> None:
+        self.samples.append(value, timestamp)
+        self.count += 1
+        self.total += value
+        if self.minimum is not None and value < self.minimum:
+            self.minimum = value
+        if self.maximum is not None and value > self.maximum:
+            self.maximum = value
+
+    def slide(self, value: float, timestamp: float, cutoff: float) -> None:
+        # Add a sample to a sliding window, making room for it and evicting the samples taken at or before the cutoff.
+        samples = self.samples
+        while samples.count and (samples.count == samples.capacity or samples.oldest_time <= cutoff):
+            evicted = samples.pop_oldest()
+            self.count -= 1
+            self.total -= evicted
+            if evicted == self.minimum:
+                self.minimum = None
+            if evicted == self.maximum:
+                self.maximum = None
+            self.evictions += 1
+        if self.evictions >= samples.capacity:
+            self.evictions = 0
+            self.total = math.fsum(math.fsum(view) for view in samples.samples())
+        self.add(value, timestamp)
+
+    def extremes(self) -> tuple[float, float]:
+        if self.minimum is None:
+            self.minimum = min(min(view) for view in self.samples.samples())
+        if self.maximum is None:
+            self.maximum = max(max(view) for view in self.samples.samples())
+        return self.minimum, self.maximum
+
+
+class WindowNode(Node):
+    # Aggregates a numeric value of the messages over a window, per key, and passes the aggregates on as a dict
+    # payload of the window's count, sum, min, max, mean and percentiles, along with its key and the bounds of its
+    # time span. Messages without a numeric value are dropped.
+    #
+    # Windows span `size` samples, or `duration_ms` of message timestamps, in which case `size` bounds the samples
+    # kept for percentiles and sliding windows. Tumbling windows emit their aggregates once, when they close: after
+    # `size` samples, or for time windows, which are aligned to multiples of their duration, when the first sample of
+    # a later window arrives, as nodes are only run on messages. Sliding windows emit the aggregates of the latest
+    # samples on every message.
+    #
+    # Samples are held in ring buffers of `size` entries allocated once per key, for at most `max_keys` keys. State
+    # lives in the node instance, which every executor compiles its own of, so each key must be routed to a single
+    # executor by sharding on the topic or on the key field. A new version of the pipeline starts from empty windows.
+    blocking = False
+
+    def __init__(self, output_ports: list[str], config: dict) -> None:
+        super().__init__(output_ports)
+        config_window: str = config["window"]
+        config_size: int = config["size"]
+        config_duration_ms: None | float = config.get("duration_ms")
+        config_field: None | str = config.get("field")
+        config_key: None | str = config.get("key")
+        config_aggregates: list[str] = config.get("aggregates", list(_AGGREGATES))
+        config_percentiles: list[float] = config.get("percentiles", [])
+        config_max_keys: int = config.get("max_keys", 10_000)
+
+        self.__window = _Window(config_window)
+        if config_size < 1:
+            raise ValueError(f"Window size must be at least 1 sample, got {config_size}.")
+        if config_duration_ms is not None and config_duration_ms <= 0:
+            raise ValueError(f"Window duration must be positive, got {config_duration_ms} ms.")
+        unknown = set(config_aggregates).difference(_AGGREGATES)
+        if unknown:
+            raise ValueError(f"Unknown window aggregates provided: {', '.join(sorted(unknown))}, expected any of "
+                             f"{', '.join(_AGGREGATES)}.")
+        for percentile in config_percentiles:
+            if not 0 < percentile <= 100:
+                raise ValueError(f"Window percentiles must be within (0, 100], got {percentile}.")
+
+        self.__duration = None if config_duration_ms is None else config_duration_ms / 1_000
+        self.__get_value = field_getter(config_field)
+        self.__get_key = field_getter(config_key)
+        self.__keyed = config_key is not None
+        self.__aggregates = frozenset(config_aggregates)
+        self.__percentiles = [(f"p{percentile:g}", percentile / 100) for percentile in config_percentiles]
+        self.__states: KeyedState[_WindowState] = KeyedState(lambda: _WindowState(config_size), config_max_keys)
+
+    @property
+    def num_keys(self) -> int:
+        return len(self.__states)
+
+    def process(self, message: Message) -> tuple[set[str], Payload | Message]:
+        payload = message.payload
+        value = payload if self.__get_value is None else self.__get_value(payload)
+        if value is MISSING or isinstance(value, bool) or not isinstance(value, (int, float)):
+            return _NO_CHILDREN, message
+        value = float(value)
+        key = None
+        if self.__keyed:
+            key = payload if self.__get_key is None else self.__get_key(payload)
+            if key is MISSING:
+                return _NO_CHILDREN, message
+            key = state_key(key)
+
+        state = self.__states.get(key)
+        timestamp = message.timestamp
+        if self.__window is _Window.SLIDING:
+            state.slide(value, timestamp, -math.inf if self.__duration is None else timestamp - self.__duration)
+            return self.children, self.__aggregates_of(state, key, state.samples.oldest_time, timestamp)
+
+        if self.__duration is None:
+            state.add(value, timestamp)
+            if state.count < state.samples.capacity:
+                return _NO_CHILDREN, message
+            aggregates = self.__aggregates_of(state, key, state.samples.oldest_time, timestamp)
+            state.reset()
+            return self.children, aggregates
+
+        # Late samples, whose window has already closed, are counted in the current one.
+        window = math.floor(timestamp / self.__duration)
+        aggregates = None
+        if state.window is None:
+            state.window = window
+        elif window > state.window:
+            start = state.window * self.__duration
+            aggregates = self.__aggregates_of(state, key, start, start + self.__duration)
+            state.reset()
+            state.window = window
+        state.add(value, timestamp)
+        if aggregates is None:
+            return _NO_CHILDREN, message
+        return self.children, aggregates
+
+    def __aggregates_of(self, state: _WindowState, key: Any, start: float, end: float) -> dict[str, Any]:
+        aggregates = self.__aggregates
+        result: dict[str, Any] = {"start": start, "end": end}
+        if self.__keyed:
+            result["key"] = key
+        if "count" in aggregates:
+            result["count"] = state.count
+        if "sum" in aggregates:
+            result["sum"] = state.total
+        if "min" in aggregates or "max" in aggregates:
+            minimum, maximum = state.extremes()
+            if "min" in aggregates:
+                result["min"] = minimum
+            if "max" in aggregates:
+                result["max"] = maximum
+        if "mean" in aggregates:
+            result["mean"] = state.total / state.count
+        if self.__percentiles:
+            self.__add_percentiles(result, state.samples)
+        return result
+
+    def __add_percentiles(self, result: dict[str, Any], samples: RingBuffer) -> None:
+        # Nearest rank percentiles of the samples held, which are the latest `size` of an overfull tumbling window.
+        views = samples.samples()
+        values = sorted(views[0]) if len(views) == 1 else sorted([*views[0], *views[1]])
+        for name, fraction in self.__percentiles:
+            result[name] = values[max(math.ceil(fraction * len(values)) - 1, 0)]
@@ -4,13 +4,181 @@ Pipeline Module
 
 """
 
+import asyncio
+from enum import Enum
+from time import perf_counter_ns
+from typing import Callable
+from concurrent.futures import Executor as ConcurrentExecutor, wait
+
 from .nodes import *
+from ..metrics import Histogram
+
+
+class MergeStrategy(Enum):
+    # How a node with several parents combines the payloads of the parents that routed to it. Parents are
+    # considered in topological order.
+    LIST = "list"
+    DICT = "dict"
+    FIRST = "first"
+
+
+def _payload(result: Payload | Message) -> Payload:
+    return result.payload if isinstance(result, Message) else result
+
+
+def _merge_list(labels: tuple[str, ...], arrivals: list[int], results: list[Payload | Message]) -> Payload:
+    return [_payload(results[parent]) for parent in arrivals]
+
+
+def _merge_dict(labels: tuple[str, ...], arrivals: list[int], results: list[Payload | Message]) -> Payload:
+    return {labels[parent]: _payload(results[parent]) for parent in arrivals}
+
+
+def _merge_first(labels: tuple[str, ...], arrivals: list[int], results: list[Payload | Message]) -> Payload | Message:
+    return results[arrivals[0]]
+
+
+_merge_functions = {
+    MergeStrategy.LIST: _merge_list,
+    MergeStrategy.DICT: _merge_dict,
+    MergeStrategy.FIRST: _merge_first
+}
+
+
+def _node_message(message: Message, result: Payload | Message) -> Message:
+    # Nodes pass their input on unchanged by returning the message itself, rather than its payload, which keeps
+    # the payload undecoded unless a node needs it.
+    if isinstance(result, Message):
+        return result
+    return Message(timestamp=message.timestamp, payload=result, topic=message.topic)
+
+
+def _timed_process(node: Node, message: Message, timer: Histogram) -> tuple[set[str], Payload | Message]:
+    start = perf_counter_ns()
+    outcome = node.process(message)
+    timer.record_ns(perf_counter_ns() - start)
+    return outcome
+
+
+async def _process_async(node: Node, message: Message, pool: None | ConcurrentExecutor,
+                         timer: None | Histogram = None) -> tuple[set[str], Payload | Message]:
+    # Timed nodes are timed from when they are started, including any wait for a thread of the pool.
+    start = 0 if timer is None else perf_counter_ns()
+    if isinstance(node, AsyncNode):
+        outcome = await node.process_async(message)
+    elif node.blocking:
+        outcome = await asyncio.get_running_loop().run_in_executor(pool, node.process, message)
+    else:
+        outcome = node.process(message)
+    if timer is not None:
+        timer.record_ns(perf_counter_ns() - start)
+    return outcome
+
+
+class _ExecutionPlan:
+    # A flat, index based view of a pipeline. Nodes are numbered in topological order, so executing a message is a
+    # single pass over the node indices.
+    __slots__ = ("labels", "nodes", "parents", "children", "parent_counts", "merges", "starting", "routes",
+                 "generations", "timers", "__indices")
+
+    def __init__(self, labels: list[str], nodes: dict[str, Node], starting_node_labels: set[str],
+                 merge_strategies: dict[str, MergeStrategy], generation_sizes: list[int]) -> None:
+        self.__indices: dict[str, int] = {label: index for index, label in enumerate(labels)}
+        self.labels: tuple[str, ...] = tuple(labels)
+        self.nodes: tuple[Node, ...] = tuple(nodes[label] for label in labels)
+        self.parents: tuple[tuple[int, ...], ...] = tuple(
+            tuple(sorted(self.__indices[parent] for parent in node.parents)) for node in self.nodes)
+        self.children: tuple[tuple[int, ...], ...] = tuple(
+            tuple(sorted(self.__indices[child] for child in node.children)) for node in self.nodes)
+        self.parent_counts: tuple[int, ...] = tuple(len(parents) for parents in self.parents)
+        # Merge functions of the nodes with several parents, None for the rest.
+        self.merges: tuple = tuple(
+            _merge_functions[merge_strategies.get(label, MergeStrategy.LIST)] if len(parents) > 1 else None
+            for label, parents in zip(labels, self.parents))
+        self.starting: bytes = bytes(label in starting_node_labels for label in labels)
+        # Per node memo of the child label sets returned by `Node.process` to the child indices they activate.
+        # Nodes return cached frozensets, so routing a message is a single dictionary lookup.
+        self.routes: tuple[dict[frozenset[str], tuple[int, ...]], ...] = tuple({} for _ in labels)
+        # Index ranges of the generations, the nodes whose longest path from a node without parents is equally
+        # long. No edge connects two nodes of the same generation.
+        self.generations: tuple[range, ...] = tuple(
+            range(sum(generation_sizes[:position]), sum(generation_sizes[:position + 1]))
+            for position in range(len(generation_sizes)))
+        # Per node histograms of processing times when the pipeline is instrumented, None otherwise.
+        self.timers: None | tuple[Histogram, ...] = None
+
+    def resolve_route(self, index: int, child_labels: set[str]) -> tuple[int, ...]:
+        child_labels = frozenset(child_labels)
+        child_indices = tuple(sorted(self.__indices[child] for child in child_labels))
+        self.routes[index][child_labels] = child_indices
+        return child_indices
+
+
+class _Run:
+    # The state of one message's run through an execution plan, which every way of executing a pipeline shares:
+    # whether a node has been reached by a parent (or is a starting node), how many of its parents are yet to
+    # execute, which parents routed to the nodes that merge and what each node produced.
+    __slots__ = ("plan", "message", "merges", "parents", "children", "routes", "activated", "unexecuted_parents",
+                 "arrivals", "results")
+
+    def __init__(self, plan: _ExecutionPlan, message: Message) -> None:
+        self.plan = plan
+        self.message = message
+        # The parts of the plan every node looks up, kept at hand.
+        self.merges = plan.merges
+        self.parents = plan.parents
+        self.children = plan.children
+        self.routes = plan.routes
+        self.activated = bytearray(plan.starting)
+        self.unexecuted_parents = list(plan.parent_counts)
+        self.arrivals: list[None | list[int]] = [None] * len(plan.nodes)
+        self.results: list[Payload | Message] = [None] * len(plan.nodes)
+
+    def is_due(self, index: int) -> bool:
+        # Whether the node has been reached and all of its parents have executed.
+        return self.activated[index] == 1 and self.unexecuted_parents[index] == 0
+
+    def input(self, index: int) -> Message:
+        # The message a due node processes: the merge of the parents that routed to it, the result of its only
+        # parent or, for starting nodes, the message itself.
+        merge = self.merges[index]
+        arrivals = self.arrivals[index]
+        if merge is not None and arrivals is not None:
+            return _node_message(self.message, merge(self.plan.labels, arrivals, self.results))
+        parents = self.parents[index]
+        if parents:
+            return _node_message(self.message, self.results[parents[0]])
+        return self.message
+
+    def complete(self, index: int, outcome: tuple[set[str], Payload | Message]) -> None:
+        # Record what the node produced and activate the children it routed to.
+        survived_child_labels, self.results[index] = outcome
+        unexecuted_parents = self.unexecuted_parents
+        for child in self.children[index]:
+            unexecuted_parents[child] -= 1
+        try:
+            survived_children = self.routes[index][survived_child_labels]
+        except (KeyError, TypeError):
+            survived_children = self.plan.resolve_route(index, survived_child_labels)
+        activated = self.activated
+        merges = self.merges
+        arrivals = self.arrivals
+        for child in survived_children:
+            activated[child] = 1
+            if merges[child] is not None:
+                if arrivals[child] is None:
+                    arrivals[child] = [index]
+                else:
+                    arrivals[child].append(index)
 
 
 class Pipeline:
     def __init__(self, starting_node_labels: set[str]) -> None:
         self.__starting_node_labels = starting_node_labels
         self.__nodes: dict[str, Node] = {}
+        self.__merge_strategies: dict[str, MergeStrategy] = {}
+        self.__plan: None | _ExecutionPlan = None
+        self.__node_timer: None | Callable[[str], Histogram] = None
 
     @staticmethod
     def from_dict(structure: dict) -> "Pipeline":
@@ -23,21 +191,28 @@ class Pipeline:
             node_output_ports: list[str] = node_description["output_ports"]
             node_type: str = node_description["type"]
             node_config: dict = node_description["config"]
+            node_merge = MergeStrategy(node_description.get("merge", MergeStrategy.LIST.value))
             # Initialise node and add it to the pipeline
             node = build_node(node_type=node_type, output_ports=node_output_ports, config=node_config)
-            pipline.add_node(node_label, node)
+            pipline.add_node(node_label, node, merge=node_merge)
 
-        # 2. Connect nodes
+        # 2. Connect nodes. Cycles are detected once for the whole graph when it is compiled, rather than with a
+        # search per inserted edge.
         connection_descriptions: list[dict] = structure["connections"]
         for connection_description in connection_descriptions:
             parent_label = connection_description["parent"]
             child_label = connection_description["child"]
             port = connection_description["port"]
-            pipline.connect_nodes(from_node_port=port, from_node_label=parent_label, to_node_label=child_label)
+            pipline.__add_edge(from_node_port=port, from_node_label=parent_label, to_node_label=child_label)
+
+        # 3. Compile the execution plan up front so that the pipeline is ready to execute
+        pipline.compile()
         return pipline
 
-    def add_node(self, node_label: str, node: Node) -> None:
+    def add_node(self, node_label: str, node: Node, merge: MergeStrategy = MergeStrategy.LIST) -> None:
         self.__nodes[node_label] = node
+        self.__merge_strategies[node_label] = merge
+        self.__plan = None
 
     def connect_nodes(self, from_node_port: str, from_node_label: str, to_node_label: str) -> None:
         # Insert node edges, ensuring that each insertion maintains that the graph is a
@@ -46,59 +221,162 @@ class Pipeline:
         if self.__path_exists(to_node_label, from_node_label):
             raise ValueError(f"Edge '{from_node_label}' -> '{to_node_label}' could not be added since it creates a "
                              f"cycle.")
-        self.__nodes[from_node_label].add_child(from_node_port, to_node_label)
-        self.__nodes[to_node_label].add_parent(from_node_label)
+        self.__add_edge(from_node_port, from_node_label, to_node_label)
 
-    def execute(self, message: Message) -> None:
-        # Stores the execution results of the executed ports:
-        execution_results: dict[str] = {}
-        # Stores the keys of the nodes to execute for the current iteration.
-        generation_to_process = self.__starting_node_labels
-        # Stores the keys of the nodes that are waiting on dependent nodes to execute.
-        waiting_node_labels = set()
-
-        # Store propagating the message through the network
-        while True:
-            survived_children = set()
-            for node_label in generation_to_process:
-                parents = self.__nodes[node_label].parents
-                payload = None
-                match len(parents):
-                    case 0:
-                        payload = message.payload
-                    case 1:
-                        parent = parents.pop()
-                        payload = execution_results[parent]
-                    case _:
-                        payload = []
-                        # Combine parent payloads into a list
-                        for parent in parents:
-                            payload.append(execution_results[parent])
-                        message.payload = payload
-                survived_child_labels, next_payload = self.__nodes[node_label].process(message)
-                execution_results[node_label] = next_payload
-                survived_children = survived_children.union(survived_child_labels)
-
-            # For each candidate node, check that all its dependent nodes (parents)
-            # have already executed. If they have, add the candidate to the execution nodes for
-            # the next iteration. Otherwise, add to delayed execution nodes.
-            candidates = survived_children.union(waiting_node_labels)
-            waiting_node_labels.clear()
-            generation_to_process.clear()
-
-            for candidate in candidates:
-                unexecuted_parents = self.__nodes[candidate].parents - execution_results.keys()
-                has_unexecuted_parents = len(unexecuted_parents) != 0
-
-                if has_unexecuted_parents:
-                    waiting_node_labels.add(candidate)
-                else:
-                    generation_to_process.add(candidate)
+    def compile(self) -> _ExecutionPlan:
+        # Order the nodes topologically (Kahn's algorithm), keeping insertion order among independent nodes so that
+        # the order, and therefore merge order, is the same in every process.
+        positions = {label: position for position, label in enumerate(self.__nodes)}
+        unexecuted_parents = {label: len(node.parents) for label, node in self.__nodes.items()}
+        ready = [label for label, count in unexecuted_parents.items() if count == 0]
+        ordered_labels = []
+        generation_sizes = []
+        while ready:
+            generation_sizes.append(len(ready))
+            next_ready = []
+            for node_label in ready:
+                ordered_labels.append(node_label)
+                for child_label in sorted(self.__nodes[node_label].children, key=positions.__getitem__):
+                    unexecuted_parents[child_label] -= 1
+                    if unexecuted_parents[child_label] == 0:
+                        next_ready.append(child_label)
+            ready = next_ready
+
+        if len(ordered_labels) != len(self.__nodes):
+            cyclic_labels = sorted(label for label, count in unexecuted_parents.items() if count > 0)
+            raise ValueError(f"Pipeline could not be compiled since nodes {cyclic_labels} form a cycle.")
+
+        plan = _ExecutionPlan(ordered_labels, self.__nodes, self.__starting_node_labels, self.__merge_strategies,
+                              generation_sizes)
+        if self.__node_timer is not None:
+            plan.timers = tuple(self.__node_timer(label) for label in ordered_labels)
+        self.__plan = plan
+        return plan
+
+    def instrument(self, node_timer: Callable[[str], Histogram]) -> None:
+        # Record the processing time of every node in the histogram the timer returns for its label.
+        self.__node_timer = node_timer
+        if self.__plan is not None:
+            self.__plan.timers = tuple(node_timer(label) for label in self.__plan.labels)
+
+    def execute(self, message: Message, pool: None | ConcurrentExecutor = None) -> None:
+        # All state of a run lives in this call and nodes receive immutable input messages, so a compiled pipeline can
+        # be reused across messages and executed from several threads at once.
+        if pool is not None:
+            self.__execute_generations(message, pool)
+            return
+        plan = self.__plan if self.__plan is not None else self.compile()
+        timers = plan.timers
+        run = _Run(plan, message)
+        activated = run.activated
+        unexecuted_parents = run.unexecuted_parents
+
+        # A node executes once it has been reached and all of its parents have executed. Visiting the nodes in
+        # topological order guarantees every parent has had its turn by then.
+        for index, node in enumerate(plan.nodes):
+            if not activated[index] or unexecuted_parents[index] != 0:
+                continue
+            node_message = run.input(index)
+            if timers is None:
+                run.complete(index, node.process(node_message))
+            else:
+                run.complete(index, _timed_process(node, node_message, timers[index]))
+
+    def __execute_generations(self, message: Message, pool: ConcurrentExecutor) -> None:
+        # Executes the nodes of a generation that are due concurrently on the pool, such as the sinks a switch fans
+        # out to, and waits for all of them before moving on to the next generation. Their results are applied in
+        # index order, so routing and merge order are the same as in a serial run.
+        plan = self.__plan if self.__plan is not None else self.compile()
+        nodes = plan.nodes
+        timers = plan.timers
+        run = _Run(plan, message)
+
+        for generation in plan.generations:
+            due = [index for index in generation if run.is_due(index)]
+            if not due:
+                continue
+            node_messages = [run.input(index) for index in due]
 
-            # Finally, if there are no more nodes to execute on the next iteration, break out of the
-            # loop.
-            if len(generation_to_process) == 0:
-                break
+            if len(due) == 1:
+                outcomes = [nodes[due[0]].process(node_messages[0]) if timers is None
+                            else _timed_process(nodes[due[0]], node_messages[0], timers[due[0]])]
+            else:
+                futures = [pool.submit(nodes[index].process, node_message) if timers is None
+                           else pool.submit(_timed_process, nodes[index], node_message, timers[index])
+                           for index, node_message in zip(due, node_messages)]
+                # Let every node of the generation finish before raising the error of any of them.
+                wait(futures)
+                outcomes = [future.result() for future in futures]
+
+            for index, outcome in zip(due, outcomes):
+                run.complete(index, outcome)
+
+    async def execute_async(self, message: Message, pool: None | ConcurrentExecutor = None) -> None:
+        # The coroutine counterpart of executing generations concurrently. The due nodes of a generation run at the
+        # same time, asynchronous nodes as coroutines on the event loop, blocking nodes on the pool (or the default
+        # executor of the loop) and the rest inline.
+        plan = self.__plan if self.__plan is not None else self.compile()
+        nodes = plan.nodes
+        timers = plan.timers
+        run = _Run(plan, message)
+
+        for generation in plan.generations:
+            due = [index for index in generation if run.is_due(index)]
+            if not due:
+                continue
+            node_messages = [run.input(index) for index in due]
+
+            if len(due) == 1:
+                outcomes = [await _process_async(nodes[due[0]], node_messages[0], pool,
+                                                 None if timers is None else timers[due[0]])]
+            else:
+                # Let every node of the generation finish before raising the error of any of them.
+                outcomes = await asyncio.gather(
+                    *(_process_async(nodes[index], node_message, pool, None if timers is None else timers[index])
+                      for index, node_message in zip(due, node_messages)), return_exceptions=True)
+                for outcome in outcomes:
+                    if isinstance(outcome, BaseException):
+                        raise outcome
+
+            for index, outcome in zip(due, outcomes):
+                run.complete(index, outcome)
+
+    def execute_batch(self, messages: list[Message]) -> None:
+        # Runs the messages through the pipeline node by node rather than message by message, so that each node gets
+        # every message that reached it in a single `Node.process_batch` call. Every message takes the route it would
+        # take through `execute`.
+        plan = self.__plan if self.__plan is not None else self.compile()
+        timers = plan.timers
+        runs = [_Run(plan, message) for message in messages]
+
+        for index, node in enumerate(plan.nodes):
+            reached = [run for run in runs if run.is_due(index)]
+            if not reached:
+                continue
+            batch = [run.input(index) for run in reached]
+
+            if timers is None:
+                outcomes = node.process_batch(batch)
+            else:
+                # The batch is timed as a whole, every message is recorded with an equal share of it.
+                start = perf_counter_ns()
+                outcomes = node.process_batch(batch)
+                elapsed = (perf_counter_ns() - start) // len(batch)
+                timer = timers[index]
+                for _ in batch:
+                    timer.record_ns(elapsed)
+
+            for run, outcome in zip(reached, outcomes):
+                run.complete(index, outcome)
+
+    def close(self) -> None:
+        for node in self.__nodes.values():
+            node.close()
+
+    def __add_edge(self, from_node_port: str, from_node_label: str, to_node_label: str) -> None:
+        self.__nodes[from_node_label].add_child(from_node_port, to_node_label)
+        self.__nodes[to_node_label].add_parent(from_node_label)
+        self.__plan = None
 
     def __path_exists(self, from_node_label: str, to_node_label: str) -> bool:
         return self.__depth_first_search(from_node_label, to_node_label, set())
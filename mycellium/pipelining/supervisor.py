@@ -0,0 +1,100 @@
+"""
+Supervisor Module
+=================
+
+"""
+
+import logging
+import threading
+import multiprocessing
+from typing import Any
+from multiprocessing.queues import JoinableQueue
+
+from .execution import Executor
+from .asynchronous import AsyncExecutor
+from .transport import SharedMemoryQueue
+
+
+_logger = logging.getLogger(__name__)
+
+
+class ExecutionSupervisor:
+    # Starts an executor per task queue and restarts any executor that dies, on the same queue, as ingestion
+    # processes are restarted. Every queue has a single consumer, so until it is replaced a full queue would pause the
+    # ingestors blocked on it for good. The tasks a dead executor got from a shared memory queue and never finished
+    # are released, as their records would otherwise keep the ring buffer from reclaiming any space after them.
+    #
+    # A `JoinableQueue` cannot be consumed again once an executor died on it, as the executor may have died holding
+    # its reader lock, which it holds while waiting for a task, or halfway through reading a task off its pipe. The
+    # tasks the executor never finished are finished for it, so that joining the queue does not wait for them, and
+    # every process is stopped rather than left to pause ingestion for good.
+    def __init__(self, stop_event: multiprocessing.Event, task_queues: list[JoinableQueue | SharedMemoryQueue],
+                 executor_class: type[Executor] | type[AsyncExecutor] = Executor,
+                 executor_options: None | dict[str, Any] = None, check_interval: float = 1.0) -> None:
+        if not task_queues:
+            raise ValueError("At least one task queue is required to execute tasks from.")
+        self.__stop_event = stop_event
+        self.__task_queues = list(task_queues)
+        self.__executor_class = executor_class
+        self.__executor_options = executor_options or {}
+        self.__check_interval = check_interval
+
+        self.__executors: list[Executor | AsyncExecutor] = []
+        self.__restarts = 0
+        self.__released = 0
+        self.__monitor: None | threading.Thread = None
+
+    @property
+    def executors(self) -> list[Executor | AsyncExecutor]:
+        return list(self.__executors)
+
+    @property
+    def restarts(self) -> int:
+        return self.__restarts
+
+    @property
+    def released(self) -> int:
+        # Tasks dead executors never finished, which were finished for them.
+        return self.__released
+
+    def start(self) -> None:
+        for task_queue in self.__task_queues:
+            executor = self.__executor_class(self.__stop_event, task_queue, **self.__executor_options)
+            executor.start()
+            self.__executors.append(executor)
+
+        self.__monitor = threading.Thread(target=self.__supervise, name="execution-supervisor", daemon=True)
+        self.__monitor.start()
+
+    def join(self) -> None:
+        if self.__monitor is not None:
+            self.__monitor.join()
+        for executor in self.__executors:
+            executor.join()
+
+    def __supervise(self) -> None:
+        while not self.__stop_event.wait(self.__check_interval):
+            for position, executor in enumerate(self.__executors):
+                if executor.is_alive():
+                    continue
+                task_queue = self.__task_queues[position]
+                if not isinstance(task_queue, SharedMemoryQueue):
+                    self.__abandon(position, executor, task_queue)
+                    return
+                released = task_queue.release(executor.pid)
+                _logger.warning("Executor %d exited with code %s, releasing %d unfinished tasks and restarting...",
+                                position, executor.exitcode, released)
+                replacement = self.__executor_class(self.__stop_event, task_queue, **self.__executor_options)
+                replacement.start()
+                self.__executors[position] = replacement
+                self.__restarts += 1
+                self.__released += released
+
+    def __abandon(self, position: int, executor: Executor | AsyncExecutor, task_queue: JoinableQueue) -> None:
+        unfinished = executor.unfinished
+        for _ in range(unfinished):
+            task_queue.task_done()
+        self.__released += unfinished
+        _logger.error("Executor %d exited with code %s, its task queue cannot be consumed again, stopping... Task "
+                      "queues in shared memory are recovered from executors that die.", position, executor.exitcode)
+        self.__stop_event.set()
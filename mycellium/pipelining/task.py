@@ -0,0 +1,33 @@
+"""
+Task Module
+===========
+
+"""
+
+from dataclasses import dataclass
+
+from ..encodings import UTF8
+
+
+# The envelope handed from ingestors to executors. Only a reference to the pipeline is carried and executors
+# resolve its structure locally, so the size of a task depends on the payload rather than on the pipeline. Tasks taken
+# from a shared memory queue carry a view of their payload in the queue rather than a copy.
+@dataclass(frozen=True, slots=True)
+class Task:
+    pipeline_id: int
+    pipeline_version: int
+    topic: str
+    payload: bytes | memoryview
+    timestamp: float
+    # How the payload is decoded, as configured for the subscription it arrived through.
+    encoding: str = UTF8
+    # When the ingestor handed the task to the queue, 0.0 for tasks made elsewhere. The ingest timestamp is when the
+    # message arrived, before it was matched against subscriptions.
+    enqueued: float = 0.0
+    # QoS of the subscription, which selects the overload policy of the queue.
+    qos: int = 0
+
+    def __reduce__(self) -> tuple:
+        # Pickle as a plain constructor call rather than a state dictionary to keep queued tasks compact.
+        return Task, (self.pipeline_id, self.pipeline_version, self.topic, self.payload, self.timestamp, self.encoding,
+                      self.enqueued, self.qos)
@@ -0,0 +1,244 @@
+"""
+Transport Module
+================
+
+"""
+
+import os
+import time
+import queue
+import struct
+import multiprocessing
+from collections import deque
+from multiprocessing.shared_memory import SharedMemory
+
+from .task import Task
+from ..encodings import PAYLOAD_ENCODINGS
+
+
+# Write, read and reclaim positions, which only ever grow. A position modulo the capacity is an offset into the data.
+_HEADER = struct.Struct("<QQQ")
+_HEADER_SIZE = 64
+_WRITE_OFFSET = 0
+_READ_OFFSET = 8
+_FREE_OFFSET = 16
+_POSITION = struct.Struct("<Q")
+
+# Record size, state, payload encoding, QoS, topic length, pipeline id, pipeline version, timestamp, enqueue time,
+# payload length and the id of the process that got the task, followed by the topic and the payload. Records are
+# aligned to 8 bytes, so that a padding record always fits at the end of the data.
+_RECORD = struct.Struct("<IBBBHqqddII")
+# The size and state that start every record, all a padding record consists of.
+_PREFIX = struct.Struct("<IB")
+_STATE = struct.Struct("<B")
+_STATE_OFFSET = 4
+_OWNER = struct.Struct("<I")
+_OWNER_OFFSET = _RECORD.size - _OWNER.size
+_ALIGNMENT = 8
+
+_PENDING = 0
+_DONE = 1
+# Fills the end of the data when a record does not fit there, the record is written at the start instead.
+_PADDING = 2
+
+_ENCODING_CODES = {encoding: code for code, encoding in enumerate(PAYLOAD_ENCODINGS)}
+
+_MIN_BACKOFF = 0.000_05
+_MAX_BACKOFF = 0.001
+
+
+def _aligned(size: int) -> int:
+    return (size + _ALIGNMENT - 1) & ~(_ALIGNMENT - 1)
+
+
+class SharedMemoryQueue:
+    # A multi-producer multi-consumer ring buffer of tasks in shared memory, in place of a `JoinableQueue`, which
+    # pickles every task and pushes it through a pipe from a feeder thread. Producers copy the topic and payload of a
+    # task into the buffer once, and consumers get tasks whose payload is a `memoryview` of the buffer rather than a
+    # copy. Producers are serialised by one lock and consumers by another, a semaphore counts the readable tasks.
+    #
+    # The space of a task is reclaimed when the consumer that got it calls `task_done`, so its payload stays valid
+    # until then and must be copied if it is needed afterwards. `task_done` refers to the oldest unfinished task the
+    # calling process got. Producers of a full buffer wait, backing off up to a millisecond, for space to be reclaimed.
+    # The tasks of a consumer that dies before calling `task_done` are finished for it by `release`.
+    #
+    # The queue must be created before the processes using it are forked, and unlinked by its creator once none of
+    # them uses it anymore.
+    def __init__(self, capacity: int = 16 * 1024 * 1024) -> None:
+        if capacity < 1_024:
+            raise ValueError(f"Shared memory queue capacity must be at least 1024 bytes, got {capacity}.")
+        self.__capacity = _aligned(capacity)
+        self.__memory = SharedMemory(create=True, size=_HEADER_SIZE + self.__capacity)
+        self.__buffer = self.__memory.buf
+        _HEADER.pack_into(self.__buffer, 0, 0, 0, 0)
+
+        self.__producer_lock = multiprocessing.Lock()
+        self.__consumer_lock = multiprocessing.Lock()
+        self.__readable = multiprocessing.Semaphore(0)
+        self.__unfinished = multiprocessing.RawValue("Q", 0)
+        self.__finished = multiprocessing.Condition()
+
+        # Positions of the tasks this process got and has not called `task_done` for, oldest first.
+        self.__taken: deque[int] = deque()
+
+    @property
+    def name(self) -> str:
+        return self.__memory.name
+
+    @property
+    def capacity(self) -> int:
+        return self.__capacity
+
+    @property
+    def stats(self) -> dict[str, int]:
+        write, read, free = _HEADER.unpack_from(self.__buffer, 0)
+        return {
+            "capacity": self.__capacity,
+            "used": write - free,
+            "readable": write - read,
+            "unfinished": self.__unfinished.value
+        }
+
+    def qsize(self) -> int:
+        # The number of tasks not taken yet, as of `JoinableQueue.qsize`.
+        return self.__readable.get_value()
+
+    def put(self, task: Task, block: bool = True, timeout: None | float = None) -> None:
+        topic = task.topic.encode()
+        payload = task.payload
+        size = _aligned(_RECORD.size + len(topic) + len(payload))
+        if size > self.__capacity:
+            raise ValueError(f"Task of {size} bytes exceeds the shared memory queue capacity of {self.__capacity}.")
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        if not self.__producer_lock.acquire(block, timeout):
+            raise queue.Full
+        try:
+            write = self.__reserve(size, block, deadline)
+            offset = write % self.__capacity
+            if offset + size > self.__capacity:
+                # The record does not fit before the end of the data.
+                _PREFIX.pack_into(self.__buffer, _HEADER_SIZE + offset, self.__capacity - offset, _PADDING)
+                write += self.__capacity - offset
+                offset = 0
+
+            start = _HEADER_SIZE + offset
+            _RECORD.pack_into(self.__buffer, start, size, _PENDING, _ENCODING_CODES[task.encoding], task.qos,
+                              len(topic), task.pipeline_id, task.pipeline_version, task.timestamp, task.enqueued,
+                              len(payload), 0)
+            start += _RECORD.size
+            self.__buffer[start:start + len(topic)] = topic
+            start += len(topic)
+            self.__buffer[start:start + len(payload)] = payload
+            _POSITION.pack_into(self.__buffer, _WRITE_OFFSET, write + size)
+        finally:
+            self.__producer_lock.release()
+
+        with self.__finished:
+            self.__unfinished.value += 1
+        self.__readable.release()
+
+    def put_nowait(self, task: Task) -> None:
+        self.put(task, block=False)
+
+    def get(self, block: bool = True, timeout: None | float = None) -> Task:
+        if not self.__readable.acquire(block, timeout):
+            raise queue.Empty
+        with self.__consumer_lock:
+            read = _POSITION.unpack_from(self.__buffer, _READ_OFFSET)[0]
+            size, state = _PREFIX.unpack_from(self.__buffer, _HEADER_SIZE + read % self.__capacity)
+            if state == _PADDING:
+                read += size
+                size = _PREFIX.unpack_from(self.__buffer, _HEADER_SIZE)[0]
+            _POSITION.pack_into(self.__buffer, _READ_OFFSET, read + size)
+            _OWNER.pack_into(self.__buffer, _HEADER_SIZE + read % self.__capacity + _OWNER_OFFSET, os.getpid())
+        self.__taken.append(read)
+
+        # The record is not reclaimed before `task_done`, so it is read outside the lock.
+        start = _HEADER_SIZE + read % self.__capacity
+        (_, _, encoding, qos, topic_size, pipeline_id, pipeline_version, timestamp, enqueued, payload_size,
+         _) = _RECORD.unpack_from(self.__buffer, start)
+        start += _RECORD.size
+        topic = str(self.__buffer[start:start + topic_size], "utf-8")
+        start += topic_size
+        return Task(pipeline_id=pipeline_id, pipeline_version=pipeline_version, topic=topic,
+                    payload=self.__buffer[start:start + payload_size], timestamp=timestamp,
+                    encoding=PAYLOAD_ENCODINGS[encoding], enqueued=enqueued, qos=qos)
+
+    def get_nowait(self) -> Task:
+        return self.get(block=False)
+
+    def task_done(self) -> None:
+        if not self.__taken:
+            raise ValueError("task_done() called more times than tasks were taken by this process.")
+        position = self.__taken.popleft()
+        with self.__consumer_lock:
+            _STATE.pack_into(self.__buffer, _HEADER_SIZE + position % self.__capacity + _STATE_OFFSET, _DONE)
+            self.__reclaim()
+        self.__finish(1)
+
+    def release(self, pid: int) -> int:
+        # Finishes the tasks a process got and never called `task_done` for, because it died, so that their space is
+        # reclaimed and `join` does not wait for them. Returns the number of tasks released.
+        released = 0
+        with self.__consumer_lock:
+            position = _POSITION.unpack_from(self.__buffer, _FREE_OFFSET)[0]
+            read = _POSITION.unpack_from(self.__buffer, _READ_OFFSET)[0]
+            while position < read:
+                start = _HEADER_SIZE + position % self.__capacity
+                size, state = _PREFIX.unpack_from(self.__buffer, start)
+                if state == _PENDING and _OWNER.unpack_from(self.__buffer, start + _OWNER_OFFSET)[0] == pid:
+                    _STATE.pack_into(self.__buffer, start + _STATE_OFFSET, _DONE)
+                    released += 1
+                position += size
+            self.__reclaim()
+        if released:
+            self.__finish(released)
+        return released
+
+    def join(self) -> None:
+        with self.__finished:
+            while self.__unfinished.value > 0:
+                self.__finished.wait()
+
+    def close(self) -> None:
+        # Views of the buffer handed out with payloads must have been released.
+        self.__buffer = None
+        self.__memory.close()
+
+    def unlink(self) -> None:
+        self.__memory.unlink()
+
+    def __reclaim(self) -> None:
+        # Reclaim the space of the finished tasks at the start of the taken ones, others finish out of order. Called
+        # with the consumer lock held.
+        free = _POSITION.unpack_from(self.__buffer, _FREE_OFFSET)[0]
+        read = _POSITION.unpack_from(self.__buffer, _READ_OFFSET)[0]
+        while free < read:
+            size, state = _PREFIX.unpack_from(self.__buffer, _HEADER_SIZE + free % self.__capacity)
+            if state == _PENDING:
+                break
+            free += size
+        _POSITION.pack_into(self.__buffer, _FREE_OFFSET, free)
+
+    def __finish(self, count: int) -> None:
+        with self.__finished:
+            self.__unfinished.value -= count
+            if self.__unfinished.value == 0:
+                self.__finished.notify_all()
+
+    def __reserve(self, size: int, block: bool, deadline: None | float) -> int:
+        # Wait until the record, and the padding before it should it not fit before the end of the data, fits
+        # between the write position and the space consumers have not reclaimed yet.
+        backoff = _MIN_BACKOFF
+        while True:
+            write = _POSITION.unpack_from(self.__buffer, _WRITE_OFFSET)[0]
+            free = _POSITION.unpack_from(self.__buffer, _FREE_OFFSET)[0]
+            offset = write % self.__capacity
+            needed = size if offset + size <= self.__capacity else self.__capacity - offset + size
+            if write + needed - free <= self.__capacity:
+                return write
+            if not block or (deadline is not None and time.monotonic() >= deadline):
+                raise queue.Full
+            time.sleep(backoff if deadline is None else max(min(backoff, deadline - time.monotonic()), 0))
+            backoff = min(backoff * 2, _MAX_BACKOFF)
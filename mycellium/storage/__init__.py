@@ -0,0 +1,217 @@
+"""
+Storage Subpackage
+==================
+
+Records of workspaces, MQTT clients, subscriptions and pipelines, kept by a pluggable repository. The records live in
+memory unless `configure_storage` is given another repository, such as a `CachedRepository` in front of a
+`SQLiteRepository` to persist them.
+
+"""
+
+from .records import *
+from .repository import Repository
+from .memory import InMemoryRepository
+from .sqlite import SQLiteRepository
+from .cache import CachedRepository
+from .notifications import ChangeNotifier
+from ..encodings import UTF8
+
+
+_repository: Repository = InMemoryRepository()
+
+
+def configure_storage(repository: Repository) -> None:
+    # Must be called before the ingestion and execution processes are started, so that they inherit the repository.
+    # A repository without any workspaces, such as a new database, is seeded with the default records.
+    global _repository
+    _repository = repository
+    if not repository.fetch_workspaces():
+        _seed(repository)
+
+
+def current_repository() -> Repository:
+    return _repository
+
+
+def storage_revision() -> int:
+    # Changes whenever records change, for running processes to find out when to reload what they derived from them.
+    # Only changes made in the same process show up for an `InMemoryRepository`, since each process has its own copy.
+    return _repository.revision
+
+
+# --------------------------------------------------
+#   Workspace
+# --------------------------------------------------
+
+def fetch_workspaces() -> list[WorkspaceRecord]:
+    return _repository.fetch_workspaces()
+
+
+def fetch_workspace(workspace_id: int) -> None | WorkspaceRecord:
+    return _repository.fetch_workspace(workspace_id)
+
+
+def create_workspace(name: str = "") -> WorkspaceRecord:
+    return _repository.create_workspace(name)
+
+
+def delete_workspace(workspace_id: int) -> None:
+    _repository.delete_workspace(workspace_id)
+
+
+def update_workspace(workspace_id: int, name: None | str = None) -> WorkspaceRecord:
+    return _repository.update_workspace(workspace_id, name=name)
+
+
+# --------------------------------------------------
+#   Ingestion - MQTT
+# --------------------------------------------------
+
+def fetch_clients(workspace_id: int) -> list[ClientRecord]:
+    return _repository.fetch_clients(workspace_id)
+
+
+def fetch_client(client_id: int) -> None | ClientRecord:
+    return _repository.fetch_client(client_id)
+
+
+def create_client(workspace_id: int, broker_host: str, broker_port: int) -> ClientRecord:
+    return _repository.create_client(workspace_id, broker_host, broker_port)
+
+
+def delete_client(client_id: int) -> None:
+    _repository.delete_client(client_id)
+
+
+def update_client(client_id: int, broker_host: None | str = None, broker_port: None | int = None) -> ClientRecord:
+    return _repository.update_client(client_id, broker_host=broker_host, broker_port=broker_port)
+
+
+def fetch_subscriptions(client_id: int) -> list[SubscriptionRecord]:
+    return _repository.fetch_subscriptions(client_id)
+
+
+def fetch_subscription(client_id: int, topic: str) -> None | SubscriptionRecord:
+    return _repository.fetch_subscription(client_id, topic)
+
+
+def match_subscriptions(client_id: int, topic: str) -> list[SubscriptionRecord]:
+    return _repository.match_subscriptions(client_id, topic)
+
+
+def create_subscription(client_id: int, topic: str, qos: int, pipeline_id: None | int = None,
+                        encoding: str = UTF8) -> SubscriptionRecord:
+    return _repository.create_subscription(client_id, topic, qos, pipeline_id=pipeline_id, encoding=encoding)
+
+
+def delete_subscription(subscription_id: int) -> None:
+    _repository.delete_subscription(subscription_id)
+
+
+def update_subscription(subscription_id: int, topic: None | str = None, qos: None | int = None,
+                        pipeline_id: None | int = None, encoding: None | str = None) -> SubscriptionRecord:
+    return _repository.update_subscription(subscription_id, topic=topic, qos=qos, pipeline_id=pipeline_id,
+                                           encoding=encoding)
+
+
+def fetch_subscription_pipeline(subscription_id: int) -> None | PipelineRecord:
+    return _repository.fetch_subscription_pipeline(subscription_id)
+
+
+# --------------------------------------------------
+#   Pipelining
+# --------------------------------------------------
+
+def fetch_pipeline(pipeline_id: int) -> None | PipelineRecord:
+    return _repository.fetch_pipeline(pipeline_id)
+
+
+def create_pipeline(structure: dict) -> PipelineRecord:
+    return _repository.create_pipeline(structure)
+
+
+def delete_pipeline(pipeline_id: int) -> None:
+    _repository.delete_pipeline(pipeline_id)
+
+
+def update_pipeline(pipeline_id: int, structure: dict) -> PipelineRecord:
+    return _repository.update_pipeline(pipeline_id, structure)
+
+
+def _seed(repository: Repository) -> None:
+    workspace = repository.create_workspace(name="default")
+    client = repository.create_client(workspace_id=workspace.id, broker_host="localhost", broker_port=1883)
+    pipeline = repository.create_pipeline(
+        structure={
+            "starting_nodes": ["switch0"],
+            "nodes": {
+                "switch0": {
+                    "output_ports": ["1", "2", "3"],
+                    "type": "switch",
+                    "config": {
+                        "conditions": {
+                            "1": {
+                                "comparison": "eq",
+                                "value": 1
+                            },
+                            "2": {
+                                "comparison": "eq",
+                                "value": 2
+                            },
+                            "3": {
+                                "comparison": "eq",
+                                "value": "apples"
+                            }
+                        }
+                    }
+                },
+                "debug0": {
+                    "output_ports": [],
+                    "type": "debug",
+                    "config": {
+                        "output": "Hello from debug0",
+                        "show_payload": True
+                    }
+                },
+                "debug1": {
+                    "output_ports": [],
+                    "type": "debug",
+                    "config": {
+                        "output": "Hello from debug1",
+                        "show_payload": True
+                    }
+                },
+                "mqtt0": {
+                    "output_ports": [],
+                    "type": "mqtt",
+                    "config": {
+                        "broker_host": "localhost",
+                        "broker_port": 1883,
+                        "topic": "topic/example",
+                        "qos": 0
+                    }
+                }
+            },
+            "connections": [
+                {
+                    "parent": "switch0",
+                    "child": "debug0",
+                    "port": "1",
+                },
+                {
+                    "parent": "switch0",
+                    "child": "debug1",
+                    "port": "2",
+                },
+                {
+                    "parent": "switch0",
+                    "child": "mqtt0",
+                    "port": "3",
+                }
+            ]
+        }
+    )
+    repository.create_subscription(client_id=client.id, topic="topic/hello", qos=0, pipeline_id=pipeline.id)
+
+
+_seed(_repository)
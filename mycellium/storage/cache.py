@@ -0,0 +1,189 @@
+"""
+Storage Cache Module
+====================
+
+"""
+
+import time
+from typing import Any, Callable
+
+from .records import *
+from .repository import Repository
+from .notifications import ChangeNotifier
+from ..encodings import UTF8
+from ..topics import TopicTrie
+
+
+_MISSING = object()
+
+
+class CachedRepository(Repository):
+    # A read-through cache in front of another repository, typically a `SQLiteRepository`. Every lookup, including
+    # those that found nothing, is remembered, so that once warm the message path is served from memory. The revision
+    # of the backend is checked at most once per `revalidate_interval` seconds, and the whole cache is dropped when it
+    # changed. Like the connections of the backend, each process fills its own copy of the cache.
+    #
+    # Writes made through any copy of the cache in a process forked from the one that created it are also announced
+    # through a shared `ChangeNotifier`, so that the other processes pick them up on their next lookup instead of
+    # after the revalidation interval.
+    def __init__(self, backend: Repository, revalidate_interval: float = 1.0,
+                 notifier: None | ChangeNotifier = None) -> None:
+        self.__backend = backend
+        self.__revalidate_interval = revalidate_interval
+        self.__notifier = ChangeNotifier() if notifier is None else notifier
+        self.__notified_revision = self.__notifier.revision
+
+        self.__entries: dict[tuple, Any] = {}
+        # Per client tries of subscription topic filters, to resolve concrete topics including wildcards.
+        self.__subscription_filters: dict[int, TopicTrie] = {}
+        self.__revision = backend.revision
+        self.__next_revalidation = time.monotonic() + revalidate_interval
+
+        self.__hits = 0
+        self.__misses = 0
+        self.__invalidations = 0
+
+    @property
+    def backend(self) -> Repository:
+        return self.__backend
+
+    @property
+    def notifier(self) -> ChangeNotifier:
+        return self.__notifier
+
+    @property
+    def revision(self) -> int:
+        self.__revalidate()
+        return self.__revision
+
+    @property
+    def stats(self) -> dict[str, int]:
+        return {
+            "hits": self.__hits,
+            "misses": self.__misses,
+            "invalidations": self.__invalidations,
+            "entries": len(self.__entries)
+        }
+
+    def invalidate(self) -> None:
+        self.__entries.clear()
+        self.__subscription_filters.clear()
+        self.__invalidations += 1
+
+    # --------------------------------------------------
+    #   Workspace
+    # --------------------------------------------------
+
+    def fetch_workspaces(self) -> list[WorkspaceRecord]:
+        return list(self.__read(("workspaces",), self.__backend.fetch_workspaces))
+
+    def fetch_workspace(self, workspace_id: int) -> None | WorkspaceRecord:
+        return self.__read(("workspace", workspace_id), self.__backend.fetch_workspace, workspace_id)
+
+    def create_workspace(self, name: str = "") -> WorkspaceRecord:
+        return self.__write(self.__backend.create_workspace, name)
+
+    def delete_workspace(self, workspace_id: int) -> None:
+        self.__write(self.__backend.delete_workspace, workspace_id)
+
+    def update_workspace(self, workspace_id: int, name: None | str = None) -> WorkspaceRecord:
+        return self.__write(self.__backend.update_workspace, workspace_id, name)
+
+    # --------------------------------------------------
+    #   Ingestion - MQTT
+    # --------------------------------------------------
+
+    def fetch_clients(self, workspace_id: int) -> list[ClientRecord]:
+        return list(self.__read(("clients", workspace_id), self.__backend.fetch_clients, workspace_id))
+
+    def fetch_client(self, client_id: int) -> None | ClientRecord:
+        return self.__read(("client", client_id), self.__backend.fetch_client, client_id)
+
+    def create_client(self, workspace_id: int, broker_host: str, broker_port: int) -> ClientRecord:
+        return self.__write(self.__backend.create_client, workspace_id, broker_host, broker_port)
+
+    def delete_client(self, client_id: int) -> None:
+        self.__write(self.__backend.delete_client, client_id)
+
+    def update_client(self, client_id: int, broker_host: None | str = None,
+                      broker_port: None | int = None) -> ClientRecord:
+        return self.__write(self.__backend.update_client, client_id, broker_host, broker_port)
+
+    def fetch_subscriptions(self, client_id: int) -> list[SubscriptionRecord]:
+        return list(self.__read(("subscriptions", client_id), self.__backend.fetch_subscriptions, client_id))
+
+    def fetch_subscription(self, client_id: int, topic: str) -> None | SubscriptionRecord:
+        return self.__read(("subscription", client_id, topic), self.__backend.fetch_subscription, client_id, topic)
+
+    def match_subscriptions(self, client_id: int, topic: str) -> list[SubscriptionRecord]:
+        self.__revalidate()
+        topic_filters = self.__subscription_filters.get(client_id)
+        if topic_filters is None:
+            topic_filters = self.__subscription_filters[client_id] = TopicTrie()
+            for subscription in self.fetch_subscriptions(client_id):
+                topic_filters.insert(subscription.topic, subscription)
+        return topic_filters.match(topic)
+
+    def create_subscription(self, client_id: int, topic: str, qos: int, pipeline_id: None | int = None,
+                            encoding: str = UTF8) -> SubscriptionRecord:
+        return self.__write(self.__backend.create_subscription, client_id, topic, qos, pipeline_id, encoding)
+
+    def delete_subscription(self, subscription_id: int) -> None:
+        self.__write(self.__backend.delete_subscription, subscription_id)
+
+    def update_subscription(self, subscription_id: int, topic: None | str = None, qos: None | int = None,
+                            pipeline_id: None | int = None, encoding: None | str = None) -> SubscriptionRecord:
+        return self.__write(self.__backend.update_subscription, subscription_id, topic, qos, pipeline_id, encoding)
+
+    def fetch_subscription_pipeline(self, subscription_id: int) -> None | PipelineRecord:
+        return self.__read(("subscription_pipeline", subscription_id), self.__backend.fetch_subscription_pipeline,
+                           subscription_id)
+
+    # --------------------------------------------------
+    #   Pipelining
+    # --------------------------------------------------
+
+    def fetch_pipeline(self, pipeline_id: int) -> None | PipelineRecord:
+        return self.__read(("pipeline", pipeline_id), self.__backend.fetch_pipeline, pipeline_id)
+
+    def create_pipeline(self, structure: dict) -> PipelineRecord:
+        return self.__write(self.__backend.create_pipeline, structure)
+
+    def delete_pipeline(self, pipeline_id: int) -> None:
+        self.__write(self.__backend.delete_pipeline, pipeline_id)
+
+    def update_pipeline(self, pipeline_id: int, structure: dict) -> PipelineRecord:
+        return self.__write(self.__backend.update_pipeline, pipeline_id, structure)
+
+    def __revalidate(self) -> None:
+        notified_revision = self.__notifier.revision
+        now = time.monotonic()
+        if notified_revision == self.__notified_revision and now < self.__next_revalidation:
+            return
+        self.__notified_revision = notified_revision
+        self.__next_revalidation = now + self.__revalidate_interval
+        revision = self.__backend.revision
+        if revision != self.__revision:
+            self.__revision = revision
+            self.invalidate()
+
+    def __read(self, key: tuple, load: Callable, *arguments) -> Any:
+        self.__revalidate()
+        value = self.__entries.get(key, _MISSING)
+        if value is _MISSING:
+            self.__misses += 1
+            value = self.__entries[key] = load(*arguments)
+        else:
+            self.__hits += 1
+        return value
+
+    def __write(self, write: Callable, *arguments) -> Any:
+        # Writes go straight to the backend. Rather than patching the affected entries, the cache of this process is
+        # dropped, writes being rare compared to lookups.
+        try:
+            return write(*arguments)
+        finally:
+            self.__revision = self.__backend.revision
+            self.__notified_revision = self.__notifier.notify()
+            self.__next_revalidation = time.monotonic() + self.__revalidate_interval
+            self.invalidate()
@@ -0,0 +1,228 @@
+"""
+In-Memory Storage Module
+========================
+
+"""
+
+import itertools
+from dataclasses import replace
+
+from .records import *
+from .repository import Repository
+from ..encodings import UTF8, validate_encoding
+from ..topics import TopicTrie
+
+
+class InMemoryRepository(Repository):
+    # Records are held in hash indexes keyed by every field they are looked up by, so each lookup on the message
+    # path is O(1). Secondary indexes map to insertion ordered dictionaries of record ids, so that listings keep
+    # creation order and removals are O(1) as well. Every process holds its own copy of the records, forked from the
+    # parent, so changes made by one process are not seen by the others, and executors never hot reload a pipeline
+    # changed elsewhere. Sharing changes requires the SQLite repository.
+    def __init__(self) -> None:
+        self.__workspaces: dict[int, WorkspaceRecord] = {}
+        self.__clients: dict[int, ClientRecord] = {}
+        self.__subscriptions: dict[int, SubscriptionRecord] = {}
+        self.__pipelines: dict[int, PipelineRecord] = {}
+
+        self.__clients_by_workspace: dict[int, dict[int, None]] = {}
+        self.__subscriptions_by_client: dict[int, dict[int, None]] = {}
+        self.__subscriptions_by_topic: dict[tuple[int, str], int] = {}
+        # Per client tries of subscription topic filters, to resolve concrete topics including wildcards.
+        self.__subscription_filters: dict[int, TopicTrie] = {}
+        self.__subscription_pipelines: dict[int, int] = {}
+
+        self.__workspace_ids = itertools.count()
+        self.__client_ids = itertools.count()
+        self.__subscription_ids = itertools.count()
+        self.__pipeline_ids = itertools.count()
+        self.__revision = 0
+
+    @property
+    def revision(self) -> int:
+        return self.__revision
+
+    # --------------------------------------------------
+    #   Workspace
+    # --------------------------------------------------
+
+    def fetch_workspaces(self) -> list[WorkspaceRecord]:
+        return list(self.__workspaces.values())
+
+    def fetch_workspace(self, workspace_id: int) -> None | WorkspaceRecord:
+        return self.__workspaces.get(workspace_id)
+
+    def create_workspace(self, name: str = "") -> WorkspaceRecord:
+        self.__revision += 1
+        workspace = WorkspaceRecord(id=next(self.__workspace_ids), name=name)
+        self.__workspaces[workspace.id] = workspace
+        self.__clients_by_workspace[workspace.id] = {}
+        return workspace
+
+    def delete_workspace(self, workspace_id: int) -> None:
+        self.__revision += 1
+        self.__require(self.__workspaces, workspace_id, "Workspace")
+        for client_id in list(self.__clients_by_workspace[workspace_id]):
+            self.delete_client(client_id)
+        del self.__clients_by_workspace[workspace_id]
+        del self.__workspaces[workspace_id]
+
+    def update_workspace(self, workspace_id: int, name: None | str = None) -> WorkspaceRecord:
+        self.__revision += 1
+        workspace = self.__require(self.__workspaces, workspace_id, "Workspace")
+        if name is not None:
+            workspace = replace(workspace, name=name)
+        self.__workspaces[workspace_id] = workspace
+        return workspace
+
+    # --------------------------------------------------
+    #   Ingestion - MQTT
+    # --------------------------------------------------
+
+    def fetch_clients(self, workspace_id: int) -> list[ClientRecord]:
+        client_ids = self.__clients_by_workspace.get(workspace_id, {})
+        return [self.__clients[client_id] for client_id in client_ids]
+
+    def fetch_client(self, client_id: int) -> None | ClientRecord:
+        return self.__clients.get(client_id)
+
+    def create_client(self, workspace_id: int, broker_host: str, broker_port: int) -> ClientRecord:
+        self.__revision += 1
+        self.__require(self.__workspaces, workspace_id, "Workspace")
+        client = ClientRecord(id=next(self.__client_ids), workspace_id=workspace_id, broker_host=broker_host,
+                              broker_port=broker_port)
+        self.__clients[client.id] = client
+        self.__clients_by_workspace[workspace_id][client.id] = None
+        self.__subscriptions_by_client[client.id] = {}
+        self.__subscription_filters[client.id] = TopicTrie()
+        return client
+
+    def delete_client(self, client_id: int) -> None:
+        self.__revision += 1
+        client = self.__require(self.__clients, client_id, "Client")
+        for subscription_id in list(self.__subscriptions_by_client[client_id]):
+            self.delete_subscription(subscription_id)
+        del self.__subscriptions_by_client[client_id]
+        del self.__subscription_filters[client_id]
+        del self.__clients_by_workspace[client.workspace_id][client_id]
+        del self.__clients[client_id]
+
+    def update_client(self, client_id: int, broker_host: None | str = None,
+                      broker_port: None | int = None) -> ClientRecord:
+        self.__revision += 1
+        client = self.__require(self.__clients, client_id, "Client")
+        if broker_host is not None:
+            client = replace(client, broker_host=broker_host)
+        if broker_port is not None:
+            client = replace(client, broker_port=broker_port)
+        self.__clients[client_id] = client
+        return client
+
+    def fetch_subscriptions(self, client_id: int) -> list[SubscriptionRecord]:
+        subscription_ids = self.__subscriptions_by_client.get(client_id, {})
+        return [self.__subscriptions[subscription_id] for subscription_id in subscription_ids]
+
+    def fetch_subscription(self, client_id: int, topic: str) -> None | SubscriptionRecord:
+        subscription_id = self.__subscriptions_by_topic.get((client_id, topic))
+        return None if subscription_id is None else self.__subscriptions[subscription_id]
+
+    def match_subscriptions(self, client_id: int, topic: str) -> list[SubscriptionRecord]:
+        topic_filters = self.__subscription_filters.get(client_id)
+        if topic_filters is None:
+            return []
+        return [self.__subscriptions[subscription_id] for subscription_id in topic_filters.match(topic)]
+
+    def create_subscription(self, client_id: int, topic: str, qos: int, pipeline_id: None | int = None,
+                            encoding: str = UTF8) -> SubscriptionRecord:
+        self.__revision += 1
+        validate_encoding(encoding)
+        self.__require(self.__clients, client_id, "Client")
+        if (client_id, topic) in self.__subscriptions_by_topic:
+            raise ValueError(f"Client '{client_id}' is already subscribed to topic '{topic}'.")
+        if pipeline_id is not None:
+            self.__require(self.__pipelines, pipeline_id, "Pipeline")
+
+        subscription = SubscriptionRecord(id=next(self.__subscription_ids), client_id=client_id, topic=topic, qos=qos,
+                                          encoding=encoding)
+        self.__subscription_filters[client_id].insert(topic, subscription.id)
+        self.__subscriptions[subscription.id] = subscription
+        self.__subscriptions_by_client[client_id][subscription.id] = None
+        self.__subscriptions_by_topic[(client_id, topic)] = subscription.id
+        if pipeline_id is not None:
+            self.__subscription_pipelines[subscription.id] = pipeline_id
+        return subscription
+
+    def delete_subscription(self, subscription_id: int) -> None:
+        self.__revision += 1
+        subscription = self.__require(self.__subscriptions, subscription_id, "Subscription")
+        del self.__subscriptions_by_topic[(subscription.client_id, subscription.topic)]
+        self.__subscription_filters[subscription.client_id].remove(subscription.topic, subscription_id)
+        del self.__subscriptions_by_client[subscription.client_id][subscription_id]
+        self.__subscription_pipelines.pop(subscription_id, None)
+        del self.__subscriptions[subscription_id]
+
+    def update_subscription(self, subscription_id: int, topic: None | str = None, qos: None | int = None,
+                            pipeline_id: None | int = None, encoding: None | str = None) -> SubscriptionRecord:
+        self.__revision += 1
+        if encoding is not None:
+            validate_encoding(encoding)
+        subscription = self.__require(self.__subscriptions, subscription_id, "Subscription")
+        if pipeline_id is not None:
+            self.__require(self.__pipelines, pipeline_id, "Pipeline")
+        if topic is not None and topic != subscription.topic:
+            if (subscription.client_id, topic) in self.__subscriptions_by_topic:
+                raise ValueError(f"Client '{subscription.client_id}' is already subscribed to topic '{topic}'.")
+            topic_filters = self.__subscription_filters[subscription.client_id]
+            topic_filters.insert(topic, subscription_id)
+            topic_filters.remove(subscription.topic, subscription_id)
+            del self.__subscriptions_by_topic[(subscription.client_id, subscription.topic)]
+            self.__subscriptions_by_topic[(subscription.client_id, topic)] = subscription_id
+            subscription = replace(subscription, topic=topic)
+        if qos is not None:
+            subscription = replace(subscription, qos=qos)
+        if encoding is not None:
+            subscription = replace(subscription, encoding=encoding)
+
+        self.__subscriptions[subscription_id] = subscription
+        if pipeline_id is not None:
+            self.__subscription_pipelines[subscription_id] = pipeline_id
+        return subscription
+
+    def fetch_subscription_pipeline(self, subscription_id: int) -> None | PipelineRecord:
+        pipeline_id = self.__subscription_pipelines.get(subscription_id)
+        return None if pipeline_id is None else self.__pipelines.get(pipeline_id)
+
+    # --------------------------------------------------
+    #   Pipelining
+    # --------------------------------------------------
+
+    def fetch_pipeline(self, pipeline_id: int) -> None | PipelineRecord:
+        return self.__pipelines.get(pipeline_id)
+
+    def create_pipeline(self, structure: dict) -> PipelineRecord:
+        self.__revision += 1
+        pipeline = PipelineRecord(id=next(self.__pipeline_ids), structure=structure)
+        self.__pipelines[pipeline.id] = pipeline
+        return pipeline
+
+    def delete_pipeline(self, pipeline_id: int) -> None:
+        self.__revision += 1
+        self.__require(self.__pipelines, pipeline_id, "Pipeline")
+        if pipeline_id in self.__subscription_pipelines.values():
+            raise ValueError(f"Pipeline '{pipeline_id}' is still used by a subscription.")
+        del self.__pipelines[pipeline_id]
+
+    def update_pipeline(self, pipeline_id: int, structure: dict) -> PipelineRecord:
+        self.__revision += 1
+        # Every change of structure gets a new version, so that compiled copies of the old one can be told apart.
+        pipeline = self.__require(self.__pipelines, pipeline_id, "Pipeline")
+        pipeline = PipelineRecord(id=pipeline_id, structure=structure, version=pipeline.version + 1)
+        self.__pipelines[pipeline_id] = pipeline
+        return pipeline
+
+    @staticmethod
+    def __require(records: dict, record_id: int, kind: str):
+        record = records.get(record_id)
+        if record is None:
+            raise LookupError(f"{kind} '{record_id}' does not exist.")
+        return record
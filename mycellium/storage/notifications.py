@@ -0,0 +1,24 @@
+"""
+Storage Notifications Module
+============================
+
+"""
+
+import multiprocessing
+
+
+class ChangeNotifier:
+    # A change counter in shared memory. Writes bump it, and processes forked after it was created find out about
+    # changes made by any of them by comparing it with the last value they saw, at the cost of a memory read.
+    def __init__(self) -> None:
+        self.__revision = multiprocessing.RawValue("Q", 0)
+        self.__lock = multiprocessing.Lock()
+
+    @property
+    def revision(self) -> int:
+        return self.__revision.value
+
+    def notify(self) -> int:
+        with self.__lock:
+            self.__revision.value += 1
+            return self.__revision.value
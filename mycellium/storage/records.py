@@ -0,0 +1,40 @@
+"""
+Storage Records Module
+======================
+
+"""
+
+from dataclasses import dataclass
+
+from ..encodings import UTF8
+
+
+@dataclass(frozen=True)
+class WorkspaceRecord:
+    id: int
+    name: str
+
+
+@dataclass(frozen=True)
+class ClientRecord:
+    id: int
+    workspace_id: int
+    broker_host: str
+    broker_port: int
+
+
+@dataclass(frozen=True)
+class SubscriptionRecord:
+    id: int
+    client_id: int
+    topic: str
+    qos: int
+    # How payloads arriving through the subscription are decoded.
+    encoding: str = UTF8
+
+
+@dataclass(frozen=True)
+class PipelineRecord:
+    id: int
+    structure: dict
+    version: int = 0
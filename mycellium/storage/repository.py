@@ -0,0 +1,118 @@
+"""
+Storage Repository Module
+=========================
+
+"""
+
+from abc import ABC, abstractmethod
+
+from .records import *
+from ..encodings import UTF8
+
+
+class Repository(ABC):
+    # The interface every storage backend implements. `revision` changes whenever any record is written, which lets
+    # per-process caches find out cheaply whether what they hold is still current.
+    @property
+    @abstractmethod
+    def revision(self) -> int:
+        pass
+
+    # --------------------------------------------------
+    #   Workspace
+    # --------------------------------------------------
+
+    @abstractmethod
+    def fetch_workspaces(self) -> list[WorkspaceRecord]:
+        pass
+
+    @abstractmethod
+    def fetch_workspace(self, workspace_id: int) -> None | WorkspaceRecord:
+        pass
+
+    @abstractmethod
+    def create_workspace(self, name: str = "") -> WorkspaceRecord:
+        pass
+
+    @abstractmethod
+    def delete_workspace(self, workspace_id: int) -> None:
+        pass
+
+    @abstractmethod
+    def update_workspace(self, workspace_id: int, name: None | str = None) -> WorkspaceRecord:
+        pass
+
+    # --------------------------------------------------
+    #   Ingestion - MQTT
+    # --------------------------------------------------
+
+    @abstractmethod
+    def fetch_clients(self, workspace_id: int) -> list[ClientRecord]:
+        pass
+
+    @abstractmethod
+    def fetch_client(self, client_id: int) -> None | ClientRecord:
+        pass
+
+    @abstractmethod
+    def create_client(self, workspace_id: int, broker_host: str, broker_port: int) -> ClientRecord:
+        pass
+
+    @abstractmethod
+    def delete_client(self, client_id: int) -> None:
+        pass
+
+    @abstractmethod
+    def update_client(self, client_id: int, broker_host: None | str = None,
+                      broker_port: None | int = None) -> ClientRecord:
+        pass
+
+    @abstractmethod
+    def fetch_subscriptions(self, client_id: int) -> list[SubscriptionRecord]:
+        pass
+
+    @abstractmethod
+    def fetch_subscription(self, client_id: int, topic: str) -> None | SubscriptionRecord:
+        pass
+
+    @abstractmethod
+    def match_subscriptions(self, client_id: int, topic: str) -> list[SubscriptionRecord]:
+        pass
+
+    @abstractmethod
+    def create_subscription(self, client_id: int, topic: str, qos: int, pipeline_id: None | int = None,
+                            encoding: str = UTF8) -> SubscriptionRecord:
+        pass
+
+    @abstractmethod
+    def delete_subscription(self, subscription_id: int) -> None:
+        pass
+
+    @abstractmethod
+    def update_subscription(self, subscription_id: int, topic: None | str = None, qos: None | int = None,
+                            pipeline_id: None | int = None, encoding: None | str = None) -> SubscriptionRecord:
+        pass
+
+    @abstractmethod
+    def fetch_subscription_pipeline(self, subscription_id: int) -> None | PipelineRecord:
+        pass
+
+    # --------------------------------------------------
+    #   Pipelining
+    # --------------------------------------------------
+
+    @abstractmethod
+    def fetch_pipeline(self, pipeline_id: int) -> None | PipelineRecord:
+        pass
+
+    @abstractmethod
+    def create_pipeline(self, structure: dict) -> PipelineRecord:
+        pass
+
+    @abstractmethod
+    def delete_pipeline(self, pipeline_id: int) -> None:
+        pass
+
+    @abstractmethod
+    def update_pipeline(self, pipeline_id: int, structure: dict) -> PipelineRecord:
+        pass
@@ -0,0 +1,373 @@
+"""
+SQLite Storage Module
+=====================
+
+"""
+
+import os
+import json
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Iterator
+
+from .records import *
+from .repository import Repository
+from ..encodings import UTF8, validate_encoding
+from ..topics import topic_matches, validate_topic_filter
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS revision (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    value INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS sequences (
+    name TEXT PRIMARY KEY,
+    next_id INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS workspaces (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS clients (
+    id INTEGER PRIMARY KEY,
+    workspace_id INTEGER NOT NULL REFERENCES workspaces (id) ON DELETE CASCADE,
+    broker_host TEXT NOT NULL,
+    broker_port INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS clients_by_workspace ON clients (workspace_id);
+CREATE TABLE IF NOT EXISTS pipelines (
+    id INTEGER PRIMARY KEY,
+    structure TEXT NOT NULL,
+    version INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS subscriptions (
+    id INTEGER PRIMARY KEY,
+    client_id INTEGER NOT NULL REFERENCES clients (id) ON DELETE CASCADE,
+    topic TEXT NOT NULL,
+    qos INTEGER NOT NULL,
+    pipeline_id INTEGER REFERENCES pipelines (id),
+    encoding TEXT NOT NULL DEFAULT 'utf-8',
+    UNIQUE (client_id, topic)
+);
+CREATE INDEX IF NOT EXISTS subscriptions_by_pipeline ON subscriptions (pipeline_id);
+INSERT OR IGNORE INTO revision (id, value) VALUES (0, 0);
+"""
+
+# Statements are only ever run with bound parameters, so each is prepared once and then reused from the statement
+# cache of the connection.
+_SELECT_REVISION = "SELECT value FROM revision WHERE id = 0"
+_BUMP_REVISION = "UPDATE revision SET value = value + 1 WHERE id = 0"
+_SELECT_NEXT_ID = "SELECT next_id FROM sequences WHERE name = ?"
+_UPSERT_NEXT_ID = ("INSERT INTO sequences (name, next_id) VALUES (?, ?) "
+                   "ON CONFLICT (name) DO UPDATE SET next_id = excluded.next_id")
+
+_SELECT_WORKSPACES = "SELECT id, name FROM workspaces ORDER BY id"
+_SELECT_WORKSPACE = "SELECT id, name FROM workspaces WHERE id = ?"
+_INSERT_WORKSPACE = "INSERT INTO workspaces (id, name) VALUES (?, ?)"
+_DELETE_WORKSPACE = "DELETE FROM workspaces WHERE id = ?"
+_UPDATE_WORKSPACE = "UPDATE workspaces SET name = ? WHERE id = ?"
+
+_SELECT_CLIENTS = "SELECT id, workspace_id, broker_host, broker_port FROM clients WHERE workspace_id = ? ORDER BY id"
+_SELECT_CLIENT = "SELECT id, workspace_id, broker_host, broker_port FROM clients WHERE id = ?"
+_INSERT_CLIENT = "INSERT INTO clients (id, workspace_id, broker_host, broker_port) VALUES (?, ?, ?, ?)"
+_DELETE_CLIENT = "DELETE FROM clients WHERE id = ?"
+_UPDATE_CLIENT = "UPDATE clients SET broker_host = ?, broker_port = ? WHERE id = ?"
+
+_SELECT_SUBSCRIPTIONS = ("SELECT id, client_id, topic, qos, encoding FROM subscriptions WHERE client_id = ? "
+                         "ORDER BY id")
+_SELECT_SUBSCRIPTION = ("SELECT id, client_id, topic, qos, encoding FROM subscriptions "
+                        "WHERE client_id = ? AND topic = ?")
+_SELECT_SUBSCRIPTION_BY_ID = "SELECT id, client_id, topic, qos, encoding FROM subscriptions WHERE id = ?"
+_INSERT_SUBSCRIPTION = ("INSERT INTO subscriptions (id, client_id, topic, qos, pipeline_id, encoding) "
+                        "VALUES (?, ?, ?, ?, ?, ?)")
+_DELETE_SUBSCRIPTION = "DELETE FROM subscriptions WHERE id = ?"
+_UPDATE_SUBSCRIPTION = "UPDATE subscriptions SET topic = ?, qos = ?, pipeline_id = ?, encoding = ? WHERE id = ?"
+_SELECT_SUBSCRIPTION_COLUMNS = "SELECT name FROM pragma_table_info('subscriptions')"
+_ADD_SUBSCRIPTION_ENCODING = "ALTER TABLE subscriptions ADD COLUMN encoding TEXT NOT NULL DEFAULT 'utf-8'"
+_SELECT_SUBSCRIPTION_PIPELINE_ID = "SELECT pipeline_id FROM subscriptions WHERE id = ?"
+_SELECT_SUBSCRIPTION_PIPELINE = ("SELECT pipelines.id, pipelines.structure, pipelines.version FROM subscriptions "
+                                 "JOIN pipelines ON pipelines.id = subscriptions.pipeline_id "
+                                 "WHERE subscriptions.id = ?")
+_SELECT_PIPELINE_IN_USE = "SELECT 1 FROM subscriptions WHERE pipeline_id = ? LIMIT 1"
+
+_SELECT_PIPELINE = "SELECT id, structure, version FROM pipelines WHERE id = ?"
+_INSERT_PIPELINE = "INSERT INTO pipelines (id, structure, version) VALUES (?, ?, 0)"
+_DELETE_PIPELINE = "DELETE FROM pipelines WHERE id = ?"
+_UPDATE_PIPELINE = "UPDATE pipelines SET structure = ?, version = version + 1 WHERE id = ?"
+
+
+# Connections inherited from a parent process are kept referenced rather than closed, since SQLite must not release
+# the locks and files of a connection that the parent is still using.
+_inherited_connections: list[sqlite3.Connection] = []
+
+
+def _pipeline_record(row: tuple) -> PipelineRecord:
+    return PipelineRecord(id=row[0], structure=json.loads(row[1]), version=row[2])
+
+
+class SQLiteRepository(Repository):
+    # Records are persisted in a SQLite database in WAL mode, so that the processes reading it are not blocked by a
+    # process writing to it. Connections do not survive a fork, so every process lazily opens its own. Every write
+    # transaction bumps a revision counter, which caches compare against to find out whether they are stale.
+    def __init__(self, path: str, timeout: float = 5.0, cached_statements: int = 128) -> None:
+        self.__path = path
+        self.__timeout = timeout
+        self.__cached_statements = cached_statements
+
+        self.__lock = threading.RLock()
+        self.__connection: None | sqlite3.Connection = None
+        self.__connection_pid: None | int = None
+
+        # Create the schema right away, rather than on the first lookup.
+        with self.__lock:
+            self.__connect()
+
+    @property
+    def path(self) -> str:
+        return self.__path
+
+    @property
+    def revision(self) -> int:
+        return self.__fetch_one(_SELECT_REVISION, ())[0]
+
+    def close(self) -> None:
+        with self.__lock:
+            if self.__connection is not None and self.__connection_pid == os.getpid():
+                self.__connection.close()
+            self.__connection = None
+            self.__connection_pid = None
+
+    # --------------------------------------------------
+    #   Workspace
+    # --------------------------------------------------
+
+    def fetch_workspaces(self) -> list[WorkspaceRecord]:
+        return [WorkspaceRecord(*row) for row in self.__fetch_all(_SELECT_WORKSPACES, ())]
+
+    def fetch_workspace(self, workspace_id: int) -> None | WorkspaceRecord:
+        row = self.__fetch_one(_SELECT_WORKSPACE, (workspace_id,))
+        return None if row is None else WorkspaceRecord(*row)
+
+    def create_workspace(self, name: str = "") -> WorkspaceRecord:
+        with self.__write() as connection:
+            workspace = WorkspaceRecord(id=self.__next_id(connection, "workspaces"), name=name)
+            connection.execute(_INSERT_WORKSPACE, (workspace.id, workspace.name))
+        return workspace
+
+    def delete_workspace(self, workspace_id: int) -> None:
+        with self.__write() as connection:
+            self.__require(connection, _SELECT_WORKSPACE, workspace_id, "Workspace")
+            # Clients and their subscriptions are removed by the cascading foreign keys.
+            connection.execute(_DELETE_WORKSPACE, (workspace_id,))
+
+    def update_workspace(self, workspace_id: int, name: None | str = None) -> WorkspaceRecord:
+        with self.__write() as connection:
+            workspace = WorkspaceRecord(*self.__require(connection, _SELECT_WORKSPACE, workspace_id, "Workspace"))
+            if name is not None:
+                workspace = WorkspaceRecord(id=workspace_id, name=name)
+                connection.execute(_UPDATE_WORKSPACE, (name, workspace_id))
+        return workspace
+
+    # --------------------------------------------------
+    #   Ingestion - MQTT
+    # --------------------------------------------------
+
+    def fetch_clients(self, workspace_id: int) -> list[ClientRecord]:
+        return [ClientRecord(*row) for row in self.__fetch_all(_SELECT_CLIENTS, (workspace_id,))]
+
+    def fetch_client(self, client_id: int) -> None | ClientRecord:
+        row = self.__fetch_one(_SELECT_CLIENT, (client_id,))
+        return None if row is None else ClientRecord(*row)
+
+    def create_client(self, workspace_id: int, broker_host: str, broker_port: int) -> ClientRecord:
+        with self.__write() as connection:
+            self.__require(connection, _SELECT_WORKSPACE, workspace_id, "Workspace")
+            client = ClientRecord(id=self.__next_id(connection, "clients"), workspace_id=workspace_id,
+                                  broker_host=broker_host, broker_port=broker_port)
+            connection.execute(_INSERT_CLIENT, (client.id, workspace_id, broker_host, broker_port))
+        return client
+
+    def delete_client(self, client_id: int) -> None:
+        with self.__write() as connection:
+            self.__require(connection, _SELECT_CLIENT, client_id, "Client")
+            connection.execute(_DELETE_CLIENT, (client_id,))
+
+    def update_client(self, client_id: int, broker_host: None | str = None,
+                      broker_port: None | int = None) -> ClientRecord:
+        with self.__write() as connection:
+            client = ClientRecord(*self.__require(connection, _SELECT_CLIENT, client_id, "Client"))
+            client = ClientRecord(
+                id=client_id,
+                workspace_id=client.workspace_id,
+                broker_host=client.broker_host if broker_host is None else broker_host,
+                broker_port=client.broker_port if broker_port is None else broker_port
+            )
+            connection.execute(_UPDATE_CLIENT, (client.broker_host, client.broker_port, client_id))
+        return client
+
+    def fetch_subscriptions(self, client_id: int) -> list[SubscriptionRecord]:
+        return [SubscriptionRecord(*row) for row in self.__fetch_all(_SELECT_SUBSCRIPTIONS, (client_id,))]
+
+    def fetch_subscription(self, client_id: int, topic: str) -> None | SubscriptionRecord:
+        row = self.__fetch_one(_SELECT_SUBSCRIPTION, (client_id, topic))
+        return None if row is None else SubscriptionRecord(*row)
+
+    def match_subscriptions(self, client_id: int, topic: str) -> list[SubscriptionRecord]:
+        # Topic filters cannot be matched with an index, so this scans the subscriptions of the client. Wrap the
+        # repository in a `CachedRepository` to resolve topics through a trie in memory instead.
+        return [subscription for subscription in self.fetch_subscriptions(client_id)
+                if topic_matches(subscription.topic, topic)]
+
+    def create_subscription(self, client_id: int, topic: str, qos: int, pipeline_id: None | int = None,
+                            encoding: str = UTF8) -> SubscriptionRecord:
+        validate_topic_filter(topic)
+        validate_encoding(encoding)
+        with self.__write() as connection:
+            self.__require(connection, _SELECT_CLIENT, client_id, "Client")
+            if connection.execute(_SELECT_SUBSCRIPTION, (client_id, topic)).fetchone() is not None:
+                raise ValueError(f"Client '{client_id}' is already subscribed to topic '{topic}'.")
+            if pipeline_id is not None:
+                self.__require(connection, _SELECT_PIPELINE, pipeline_id, "Pipeline")
+
+            subscription = SubscriptionRecord(id=self.__next_id(connection, "subscriptions"), client_id=client_id,
+                                              topic=topic, qos=qos, encoding=encoding)
+            connection.execute(_INSERT_SUBSCRIPTION, (subscription.id, client_id, topic, qos, pipeline_id, encoding))
+        return subscription
+
+    def delete_subscription(self, subscription_id: int) -> None:
+        with self.__write() as connection:
+            self.__require(connection, _SELECT_SUBSCRIPTION_BY_ID, subscription_id, "Subscription")
+            connection.execute(_DELETE_SUBSCRIPTION, (subscription_id,))
+
+    def update_subscription(self, subscription_id: int, topic: None | str = None, qos: None | int = None,
+                            pipeline_id: None | int = None, encoding: None | str = None) -> SubscriptionRecord:
+        if topic is not None:
+            validate_topic_filter(topic)
+        if encoding is not None:
+            validate_encoding(encoding)
+        with self.__write() as connection:
+            subscription = SubscriptionRecord(
+                *self.__require(connection, _SELECT_SUBSCRIPTION_BY_ID, subscription_id, "Subscription"))
+            if pipeline_id is not None:
+                self.__require(connection, _SELECT_PIPELINE, pipeline_id, "Pipeline")
+            else:
+                pipeline_id = connection.execute(_SELECT_SUBSCRIPTION_PIPELINE_ID, (subscription_id,)).fetchone()[0]
+            if topic is not None and topic != subscription.topic:
+                if connection.execute(_SELECT_SUBSCRIPTION, (subscription.client_id, topic)).fetchone() is not None:
+                    raise ValueError(f"Client '{subscription.client_id}' is already subscribed to topic '{topic}'.")
+
+            subscription = SubscriptionRecord(
+                id=subscription_id,
+                client_id=subscription.client_id,
+                topic=subscription.topic if topic is None else topic,
+                qos=subscription.qos if qos is None else qos,
+                encoding=subscription.encoding if encoding is None else encoding
+            )
+            connection.execute(_UPDATE_SUBSCRIPTION, (subscription.topic, subscription.qos, pipeline_id,
+                                                      subscription.encoding, subscription_id))
+        return subscription
+
+    def fetch_subscription_pipeline(self, subscription_id: int) -> None | PipelineRecord:
+        row = self.__fetch_one(_SELECT_SUBSCRIPTION_PIPELINE, (subscription_id,))
+        return None if row is None else _pipeline_record(row)
+
+    # --------------------------------------------------
+    #   Pipelining
+    # --------------------------------------------------
+
+    def fetch_pipeline(self, pipeline_id: int) -> None | PipelineRecord:
+        row = self.__fetch_one(_SELECT_PIPELINE, (pipeline_id,))
+        return None if row is None else _pipeline_record(row)
+
+    def create_pipeline(self, structure: dict) -> PipelineRecord:
+        with self.__write() as connection:
+            pipeline = PipelineRecord(id=self.__next_id(connection, "pipelines"), structure=structure)
+            connection.execute(_INSERT_PIPELINE, (pipeline.id, json.dumps(structure)))
+        return pipeline
+
+    def delete_pipeline(self, pipeline_id: int) -> None:
+        with self.__write() as connection:
+            self.__require(connection, _SELECT_PIPELINE, pipeline_id, "Pipeline")
+            if connection.execute(_SELECT_PIPELINE_IN_USE, (pipeline_id,)).fetchone() is not None:
+                raise ValueError(f"Pipeline '{pipeline_id}' is still used by a subscription.")
+            connection.execute(_DELETE_PIPELINE, (pipeline_id,))
+
+    def update_pipeline(self, pipeline_id: int, structure: dict) -> PipelineRecord:
+        # Every change of structure gets a new version, so that compiled copies of the old one can be told apart.
+        with self.__write() as connection:
+            pipeline = _pipeline_record(self.__require(connection, _SELECT_PIPELINE, pipeline_id, "Pipeline"))
+            connection.execute(_UPDATE_PIPELINE, (json.dumps(structure), pipeline_id))
+        return PipelineRecord(id=pipeline_id, structure=structure, version=pipeline.version + 1)
+
+    # --------------------------------------------------
+    #   Connection
+    # --------------------------------------------------
+
+    def __connect(self) -> sqlite3.Connection:
+        # Must be called while holding the lock.
+        if self.__connection is None or self.__connection_pid != os.getpid():
+            if self.__connection is not None:
+                _inherited_connections.append(self.__connection)
+            # Autocommit mode, transactions are started explicitly by `__write`.
+            connection = sqlite3.connect(self.__path, timeout=self.__timeout, isolation_level=None,
+                                         check_same_thread=False, cached_statements=self.__cached_statements)
+            connection.execute("PRAGMA journal_mode = WAL")
+            connection.execute("PRAGMA synchronous = NORMAL")
+            connection.execute("PRAGMA foreign_keys = ON")
+            connection.executescript(_SCHEMA)
+            self.__migrate(connection)
+            self.__connection = connection
+            self.__connection_pid = os.getpid()
+        return self.__connection
+
+    @staticmethod
+    def __migrate(connection: sqlite3.Connection) -> None:
+        # Databases created before subscriptions had a payload encoding lack its column. Another process may add it
+        # at the same time, in which case adding it fails.
+        columns = {row[0] for row in connection.execute(_SELECT_SUBSCRIPTION_COLUMNS)}
+        if "encoding" not in columns:
+            try:
+                connection.execute(_ADD_SUBSCRIPTION_ENCODING)
+            except sqlite3.OperationalError:
+                if "encoding" not in {row[0] for row in connection.execute(_SELECT_SUBSCRIPTION_COLUMNS)}:
+                    raise
+
+    def __fetch_one(self, statement: str, parameters: tuple) -> None | tuple:
+        with self.__lock:
+            return self.__connect().execute(statement, parameters).fetchone()
+
+    def __fetch_all(self, statement: str, parameters: tuple) -> list[tuple]:
+        with self.__lock:
+            return self.__connect().execute(statement, parameters).fetchall()
+
+    @contextmanager
+    def __write(self) -> Iterator[sqlite3.Connection]:
+        with self.__lock:
+            connection = self.__connect()
+            # Take the write lock up front, so that concurrent writers wait for each other instead of failing when
+            # upgrading a read transaction.
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                yield connection
+                connection.execute(_BUMP_REVISION)
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+            connection.execute("COMMIT")
+
+    @staticmethod
+    def __next_id(connection: sqlite3.Connection, name: str) -> int:
+        # Identifiers start at 0 and are never reused, like those of the in-memory repository.
+        row = connection.execute(_SELECT_NEXT_ID, (name,)).fetchone()
+        next_id = 0 if row is None else row[0]
+        connection.execute(_UPSERT_NEXT_ID, (name, next_id + 1))
+        return next_id
+
+    @staticmethod
+    def __require(connection: sqlite3.Connection, statement: str, record_id: int, kind: str) -> tuple:
+        row = connection.execute(statement, (record_id,)).fetchone()
+        if row is None:
+            raise LookupError(f"{kind} '{record_id}' does not exist.")
+        return row
@@ -0,0 +1,146 @@
+"""
+Topics Module
+=============
+
+Matching of MQTT topics against topic filters with the single level (``+``) and multi level (``#``) wildcards.
+
+"""
+
+from typing import Any, Iterator
+
+SINGLE_LEVEL_WILDCARD = "+"
+MULTI_LEVEL_WILDCARD = "#"
+
+
+def validate_topic_filter(topic_filter: str) -> list[str]:
+    levels = topic_filter.split("/")
+    for position, level in enumerate(levels):
+        if MULTI_LEVEL_WILDCARD in level and (level != MULTI_LEVEL_WILDCARD or position != len(levels) - 1):
+            raise ValueError(f"Invalid topic filter '{topic_filter}', '#' must be the last level on its own.")
+        if SINGLE_LEVEL_WILDCARD in level and level != SINGLE_LEVEL_WILDCARD:
+            raise ValueError(f"Invalid topic filter '{topic_filter}', '+' must occupy a whole level.")
+    return levels
+
+
+class _TrieNode:
+    __slots__ = ("children", "values")
+
+    def __init__(self) -> None:
+        self.children: None | dict[str, "_TrieNode"] = None
+        self.values: None | list[Any] = None
+
+
+class TopicTrie:
+    # Topic filters are stored level by level, with wildcards as ordinary children. Matching a topic walks the exact,
+    # `+` and `#` children of each visited node, so the cost grows with the depth of the topic rather than with the
+    # number of stored filters.
+    def __init__(self) -> None:
+        self.__root = _TrieNode()
+        self.__size = 0
+
+    def __len__(self) -> int:
+        return self.__size
+
+    def insert(self, topic_filter: str, value: Any) -> None:
+        node = self.__root
+        for level in validate_topic_filter(topic_filter):
+            if node.children is None:
+                node.children = {}
+            child = node.children.get(level)
+            if child is None:
+                child = node.children[level] = _TrieNode()
+            node = child
+        if node.values is None:
+            node.values = []
+        node.values.append(value)
+        self.__size += 1
+
+    def remove(self, topic_filter: str, value: Any) -> bool:
+        # Remove the value stored under the filter and prune the branch nodes left empty. Returns whether the value
+        # was found.
+        path = [self.__root]
+        for level in topic_filter.split("/"):
+            children = path[-1].children
+            if children is None or level not in children:
+                return False
+            path.append(children[level])
+
+        node = path[-1]
+        if node.values is None or value not in node.values:
+            return False
+        node.values.remove(value)
+        if not node.values:
+            node.values = None
+        self.__size -= 1
+
+        levels = topic_filter.split("/")
+        for position in range(len(levels), 0, -1):
+            node = path[position]
+            if node.values is not None or node.children:
+                break
+            parent = path[position - 1]
+            del parent.children[levels[position - 1]]
+            if not parent.children:
+                parent.children = None
+        return True
+
+    def match(self, topic: str) -> list[Any]:
+        matches = []
+        levels = topic.split("/")
+        # Wildcards at the first level do not match topics starting with '$', such as '$SYS' topics.
+        is_system_topic = topic.startswith("$")
+        nodes = [self.__root]
+        for position, level in enumerate(levels):
+            allow_wildcards = position != 0 or not is_system_topic
+            next_nodes = []
+            for node in nodes:
+                children = node.children
+                if children is None:
+                    continue
+                if allow_wildcards:
+                    multi_level = children.get(MULTI_LEVEL_WILDCARD)
+                    if multi_level is not None and multi_level.values is not None:
+                        matches.extend(multi_level.values)
+                    single_level = children.get(SINGLE_LEVEL_WILDCARD)
+                    if single_level is not None:
+                        next_nodes.append(single_level)
+                exact = children.get(level)
+                if exact is not None:
+                    next_nodes.append(exact)
+            nodes = next_nodes
+            if not nodes:
+                return matches
+
+        for node in nodes:
+            if node.values is not None:
+                matches.extend(node.values)
+            # A trailing '#' also matches its parent level, e.g. 'sensors/#' matches 'sensors'.
+            if node.children is not None:
+                multi_level = node.children.get(MULTI_LEVEL_WILDCARD)
+                if multi_level is not None and multi_level.values is not None:
+                    matches.extend(multi_level.values)
+        return matches
+
+    def __iter__(self) -> Iterator[Any]:
+        stack = [self.__root]
+        while stack:
+            node = stack.pop()
+            if node.values is not None:
+                yield from node.values
+            if node.children is not None:
+                stack.extend(node.children.values())
+
+
+def topic_matches(topic_filter: str, topic: str) -> bool:
+    filter_levels = topic_filter.split("/")
+    topic_levels = topic.split("/")
+    if topic.startswith("$") and filter_levels[0] in (SINGLE_LEVEL_WILDCARD, MULTI_LEVEL_WILDCARD):
+        return False
+    for position, filter_level in enumerate(filter_levels):
+        if filter_level == MULTI_LEVEL_WILDCARD:
+            return True
+        if position >= len(topic_levels):
+            return False
+        if filter_level != SINGLE_LEVEL_WILDCARD and filter_level != topic_levels[position]:
+            return False
+    return len(filter_levels) == len(topic_levels)